@@ -1,10 +1,23 @@
+import argparse
 import os
 import csv
-import re
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+from pgn_scanner import scan_pgn
+
+# Number of moves, illegal move and result of every game (games_analysis.csv), for any number of game roots
+# and .tar.gz archives in one pass: games are parsed on all cores and rows are written as they come.
+#
+# eg  python3 analyze_games.py games_o3 games_gpt4o.tar.gz games.tar.gz --workers 8
 
 GAMES_DIR = 'games_o3'
 OUTPUT_CSV = 'games_analysis.csv'
 
+BATCH_SIZE = 64 # games per task: parsing a game is too fast to be worth a round trip to a worker on its own
+PROGRESS_EVERY = 1000
+
 CSV_COLUMNS = [
     'subfolder',
     'gpt_model',
@@ -17,44 +30,29 @@ CSV_COLUMNS = [
 ]
 
 def parse_metainformation(path):
+    with open(path, 'r') as f:
+        return parse_metainformation_text(f.read())
+
+def parse_metainformation_text(text):
     gpt_model = None
     reasoning_effort = 'low'
-    with open(path, 'r') as f:
-        for line in f:
-            if line.startswith('model_gpt:'):
-                gpt_model = line.split(':', 1)[1].strip()
-            elif line.startswith('reasoning_effort:'):
-                reasoning_effort = line.split(':', 1)[1].strip()
+    for line in text.splitlines():
+        if line.startswith('model_gpt:'):
+            gpt_model = line.split(':', 1)[1].strip()
+        elif line.startswith('reasoning_effort:'):
+            reasoning_effort = line.split(':', 1)[1].strip()
     return gpt_model, reasoning_effort
 
 def parse_pgn(path):
-    result = None
-    illegal_move = 'no'
-    illegal_move_detail = ''
-    moves = ''
     with open(path, 'r') as f:
-        lines = f.readlines()
-    for line in lines:
-        if line.startswith('[Result '):
-            result = line.split('"')[1]
-        if line.startswith('[UnknownSAN '):
-            illegal_move = 'yes'
-            # Extract the illegal move detail from the header
-            match = re.match(r'\[UnknownSAN\s+"([^"]+)"\]', line.strip())
-            if match:
-                illegal_move_detail = match.group(1)
-            else:
-                # Fallback: try to extract after the space
-                illegal_move_detail = line.split(' ', 1)[1].strip('[]"\n')
-        if not line.startswith('[') and line.strip():
-            moves += ' ' + line.strip()
-    # Count moves: each move number (e.g., 1., 2., ...) is a full move (white+black)
-    move_numbers = re.findall(r'\b\d+\.', moves)
-    # Count individual moves (not just full moves)
-    move_tokens = re.findall(r'\b[a-hRNBQKO0-9][^\s]*', moves)
-    # Remove move numbers and results from tokens
-    move_tokens = [tok for tok in move_tokens if not re.match(r'\d+\.', tok) and tok not in ['1-0', '0-1', '1/2-1/2', '*']]
-    number_of_moves = len(move_tokens)
+        return parse_pgn_text(f.read())
+
+def parse_pgn_text(text):
+    summary = scan_pgn(text)
+    result = summary['result']
+    illegal_move = 'no' if summary['unknown_san'] is None else 'yes'
+    illegal_move_detail = summary['unknown_san'] or ''
+    number_of_moves = summary['nplies']
     # Determine result
     if illegal_move == 'yes':
         result_of_game = 'defeat (illegal move)'
@@ -66,34 +64,165 @@ def parse_pgn(path):
         result_of_game = 'unknown'
     return number_of_moves, illegal_move, illegal_move_detail, result_of_game
 
-def main():
-    rows = []
-    for subfolder in os.listdir(GAMES_DIR):
-        subpath = os.path.join(GAMES_DIR, subfolder)
-        if not os.path.isdir(subpath):
-            continue
-        meta_path = os.path.join(subpath, 'metainformation.txt')
-        pgn_path = os.path.join(subpath, 'game.pgn')
+def make_row(subfolder, gpt_model, reasoning_effort, pgn_result):
+    number_of_moves, illegal_move, illegal_move_detail, result_of_game = pgn_result
+    return [
+        subfolder,
+        gpt_model or '',
+        reasoning_effort,
+        number_of_moves,
+        illegal_move,
+        illegal_move_detail,
+        result_of_game,
+        ''  # comments
+    ]
+
+# games of a SQLite game store (see gptchess/game_store.py)
+def store_rows(store_path):
+    with sqlite3.connect(store_path) as db:
+        games = db.execute('SELECT game_id, model_gpt, reasoning_effort, pgn FROM games WHERE pgn IS NOT NULL').fetchall()
+    return [make_row(game_id, gpt_model, reasoning_effort or 'low', parse_pgn_text(pgn))
+            for game_id, gpt_model, reasoning_effort, pgn in games]
+
+# row of a game folder on disk (files=None) or read from an archive; None if the game is incomplete
+def game_row(folder, files=None):
+    if files is None:
+        meta_path = os.path.join(folder, 'metainformation.txt')
+        pgn_path = os.path.join(folder, 'game.pgn')
         if not (os.path.exists(meta_path) and os.path.exists(pgn_path)):
-            continue
+            return None
         gpt_model, reasoning_effort = parse_metainformation(meta_path)
-        number_of_moves, illegal_move, illegal_move_detail, result_of_game = parse_pgn(pgn_path)
-        row = [
-            subfolder,
-            gpt_model or '',
-            reasoning_effort,
-            number_of_moves,
-            illegal_move,
-            illegal_move_detail,
-            result_of_game,
-            ''  # comments
-        ]
-        rows.append(row)
-    with open(OUTPUT_CSV, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(CSV_COLUMNS)
-        writer.writerows(rows)
-    print(f'Analysis complete. Output written to {OUTPUT_CSV}')
+        return make_row(os.path.basename(folder), gpt_model, reasoning_effort, parse_pgn(pgn_path))
+    if not ('game.pgn' in files and 'metainformation.txt' in files):
+        return None
+    gpt_model, reasoning_effort = parse_metainformation_text(files['metainformation.txt'])
+    return make_row(os.path.basename(folder), gpt_model, reasoning_effort, parse_pgn_text(files['game.pgn']))
+
+# runs in the worker processes: (folder, row, error) of every game of the batch
+def analyze_batch(batch):
+    results = []
+    for folder, files in batch:
+        try:
+            results.append((folder, game_row(folder, files), None))
+        except Exception as e:
+            results.append((folder, None, repr(e)))
+    return results
+
+# (folder, files) of every game of the sources: folders of game folders (files are read by the workers)
+# or .tar.gz archives of them (read as a stream, see games_archive.py)
+def iter_games(sources):
+    from games_archive import iter_archive
+    for source in sources:
+        if source.endswith(('.tar.gz', '.tgz')):
+            yield from iter_archive(source, names=('metainformation.txt', 'game.pgn'))
+            continue
+        for entry in sorted(os.scandir(source), key=lambda entry: entry.name):
+            if entry.is_dir():
+                yield entry.path, None
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class CsvOutput:
+
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(CSV_COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+# requires pyarrow; one row group per write
+class ParquetOutput:
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit('Parquet output requires pyarrow (pip install pyarrow)')
+        self.pa = pa
+        self.schema = pa.schema([(column, pa.int64() if column == 'number of moves played' else pa.string())
+                                 for column in CSV_COLUMNS])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        if rows:
+            columns = [self.pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(self.schema)]
+            self.writer.write_table(self.pa.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+def open_output(path):
+    return ParquetOutput(path) if path.endswith('.parquet') else CsvOutput(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Number of moves, illegal moves and result of every game')
+    parser.add_argument('sources', nargs='*', default=[GAMES_DIR], help='folders of game folders, or .tar.gz archives of them')
+    parser.add_argument('--store', default=None, help='SQLite game store to analyze instead of the sources')
+    parser.add_argument('--output', default=OUTPUT_CSV, help='.csv, or .parquet (requires pyarrow)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of parsing processes')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='games per task sent to a worker')
+    args = parser.parse_args()
+
+    output = open_output(args.output)
+    start = time.monotonic()
+    ngames, nskipped, errors = 0, 0, []
+
+    def collect(results):
+        nonlocal ngames, nskipped
+        rows = []
+        for folder, row, error in results:
+            if error is not None:
+                errors.append((folder, error))
+                print(f'error in {folder}: {error}')
+            elif row is None:
+                nskipped += 1
+            else:
+                rows.append(row)
+        output.write(rows)
+        previous, ngames = ngames, ngames + len(rows)
+        if ngames // PROGRESS_EVERY > previous // PROGRESS_EVERY:
+            elapsed = time.monotonic() - start
+            print(f'{ngames} games analyzed ({ngames / elapsed:.0f} games/s, {len(errors)} errors)')
+
+    try:
+        if args.store:
+            collect([(row[0], row, None) for row in store_rows(args.store)])
+        else:
+            # at most a few batches per worker in flight: archives are never held in memory as a whole
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                pending = set()
+                for batch in batches(iter_games(args.sources), args.batch_size):
+                    pending.add(pool.submit(analyze_batch, batch))
+                    if len(pending) >= 2 * args.workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future.result())
+                for future in as_completed(pending):
+                    collect(future.result())
+    finally:
+        output.close()
+
+    print(f'Analysis complete: {ngames} games, {nskipped} incomplete folders skipped, {len(errors)} errors '
+          f'in {time.monotonic() - start:.1f}s. Output written to {args.output}')
+    for folder, error in errors:
+        print(f'  {folder}: {error}')
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
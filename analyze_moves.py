@@ -0,0 +1,182 @@
+import argparse
+import csv
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import util
+
+import chess
+import chess.engine
+import chess.pgn
+
+# Engine analysis of every move played by the LLM: centipawn loss (CPL) per move,
+# average centipawn loss (ACPL) and inaccuracy/mistake/blunder counts per game.
+# Games are sharded over a pool of processes, each one with its own Stockfish.
+#
+# eg  python3 analyze_moves.py --depth 12 'games*'
+
+GAMES_PATTERN = 'games*'
+STOCKFISH_PATH = os.getenv('STOCKFISH_PATH', '/opt/homebrew/bin/stockfish')
+MOVES_CSV = 'games_moves_analysis.csv'
+GAMES_CSV = 'games_acpl.csv'
+
+ENGINE_PLAYERS = ['Stockfish', 'RANDOM chess engine']
+
+# centipawn loss thresholds (as on lichess)
+INACCURACY = 50
+MISTAKE = 100
+BLUNDER = 300
+
+MATE_SCORE = 10000
+MAX_EVAL = 1000 # evaluations are clamped to +-10 pawns, so that a lost mate does not count as a 100-pawn loss
+
+MOVES_COLUMNS = [
+    'folder_name',
+    'ply',
+    'color',
+    'move',
+    'best_move',
+    'eval_before',
+    'eval_after',
+    'cpl',
+    'classification'
+]
+
+GAMES_COLUMNS = [
+    'folder_name',
+    'llm',
+    'color',
+    'nmoves_llm',
+    'acpl',
+    'inaccuracies',
+    'mistakes',
+    'blunders'
+]
+
+def classify(cpl):
+    if cpl >= BLUNDER:
+        return 'blunder'
+    if cpl >= MISTAKE:
+        return 'mistake'
+    if cpl >= INACCURACY:
+        return 'inaccuracy'
+    return ''
+
+def llm_color(game):
+    if game.headers.get('White') not in ENGINE_PLAYERS:
+        return chess.WHITE
+    if game.headers.get('Black') not in ENGINE_PLAYERS:
+        return chess.BLACK
+    return None
+
+def clamp(score):
+    return max(-MAX_EVAL, min(MAX_EVAL, score))
+
+# worker process state: one engine per process, started once
+_engine = None
+_limit = None
+
+def init_worker(engine_path, depth, nodes):
+    global _engine, _limit
+    _engine = chess.engine.SimpleEngine.popen_uci(engine_path)
+    _limit = chess.engine.Limit(depth=depth, nodes=nodes)
+    # Stockfish quits with the worker (pool workers exit through the hooks of multiprocessing, not atexit)
+    util.Finalize(None, quit_engine, exitpriority=10)
+
+def quit_engine():
+    global _engine
+    if _engine is not None:
+        _engine.quit()
+        _engine = None
+
+# evaluation (in centipawns, from the side to move) and best move of a position
+def evaluate(board):
+    if board.is_checkmate():
+        return -MATE_SCORE, None
+    if board.is_game_over():
+        return 0, None
+    info = _engine.analyse(board, _limit)
+    pv = info.get('pv')
+    return info['score'].relative.score(mate_score=MATE_SCORE), pv[0] if pv else None
+
+def analyze_game(pgn_path):
+    with open(pgn_path) as f:
+        game = chess.pgn.read_game(f)
+    folder_name = os.path.dirname(pgn_path)
+    if game is None:
+        return folder_name, [], None
+    color = llm_color(game)
+    if color is None:
+        return folder_name, [], None
+
+    moves = []
+    board = game.board()
+    for ply, move in enumerate(game.mainline_moves(), 1):
+        if board.turn != color:
+            board.push(move)
+            continue
+        eval_before, best_move = evaluate(board)
+        san = board.san(move)
+        best_san = board.san(best_move) if best_move is not None else ''
+        board.push(move)
+        eval_after = -evaluate(board)[0]
+        cpl = max(0, clamp(eval_before) - clamp(eval_after)) if move != best_move else 0
+        moves.append([folder_name, ply, 'white' if color == chess.WHITE else 'black', san, best_san,
+                      eval_before, eval_after, cpl, classify(cpl)])
+
+    llm = game.headers.get('White') if color == chess.WHITE else game.headers.get('Black')
+    cpls = [m[7] for m in moves]
+    summary = [
+        folder_name,
+        llm,
+        'white' if color == chess.WHITE else 'black',
+        len(cpls),
+        round(sum(cpls) / len(cpls), 1) if cpls else '',
+        sum(1 for m in moves if m[8] == 'inaccuracy'),
+        sum(1 for m in moves if m[8] == 'mistake'),
+        sum(1 for m in moves if m[8] == 'blunder')
+    ]
+    return folder_name, moves, summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Centipawn loss of the LLM moves of all the games')
+    parser.add_argument('patterns', nargs='*', default=[GAMES_PATTERN], help='game roots (glob patterns)')
+    parser.add_argument('--depth', type=int, default=None, help='fixed depth per position')
+    parser.add_argument('--nodes', type=int, default=None, help='fixed node budget per position')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of engine processes')
+    parser.add_argument('--engine-path', default=STOCKFISH_PATH)
+    parser.add_argument('--output-dir', default='.', help='where the CSV files are written (next to games_db.csv)')
+    args = parser.parse_args()
+    if args.depth is None and args.nodes is None:
+        args.depth = 12
+
+    pgn_paths = sorted(path for pattern in args.patterns
+                       for path in glob.glob(os.path.join(pattern, '*', 'game.pgn')))
+    print(f'{len(pgn_paths)} games to analyze')
+
+    with open(os.path.join(args.output_dir, MOVES_CSV), 'w', newline='') as moves_file, \
+         open(os.path.join(args.output_dir, GAMES_CSV), 'w', newline='') as games_file:
+        moves_writer = csv.writer(moves_file)
+        games_writer = csv.writer(games_file)
+        moves_writer.writerow(MOVES_COLUMNS)
+        games_writer.writerow(GAMES_COLUMNS)
+
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                 initargs=(args.engine_path, args.depth, args.nodes)) as pool:
+            futures = {pool.submit(analyze_game, path): path for path in pgn_paths}
+            for i, future in enumerate(as_completed(futures), 1):
+                try:
+                    folder_name, moves, summary = future.result()
+                except Exception as e:
+                    print(f'[{i}/{len(pgn_paths)}] error in {futures[future]}: {e!r}')
+                    continue
+                moves_writer.writerows(moves)
+                if summary is not None:
+                    games_writer.writerow(summary)
+                if i % 100 == 0:
+                    print(f'[{i}/{len(pgn_paths)}] games analyzed')
+
+    print(f'Analysis complete. Output written to {MOVES_CSV} and {GAMES_CSV}')
+
+if __name__ == '__main__':
+    main()
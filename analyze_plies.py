@@ -0,0 +1,99 @@
+import argparse
+import csv
+import glob
+import json
+import os
+from collections import defaultdict
+
+# Latency and token usage per move, from the per-ply events written by play_game (plies.jsonl of every game):
+# p50/p95 of the API call time and tokens per LLM move, and of the engine time per engine move,
+# by model and reasoning effort.
+#
+# eg  python3 analyze_plies.py 'games*'
+
+GAMES_PATTERN = 'games*'
+PLIES_FILE = 'plies.jsonl'
+OUTPUT_CSV = 'games_plies_stats.csv'
+
+METRICS = ['api_seconds', 'prompt_tokens', 'completion_tokens', 'reasoning_tokens']
+
+CSV_COLUMNS = [
+    'model',
+    'reasoning_effort',
+    'games',
+    'llm_moves',
+    'illegal_moves',
+    'api_seconds_p50',
+    'api_seconds_p95',
+    'prompt_tokens_p50',
+    'prompt_tokens_p95',
+    'completion_tokens_p50',
+    'completion_tokens_p95',
+    'reasoning_tokens_p50',
+    'reasoning_tokens_p95',
+    'engine_seconds_p50',
+    'engine_seconds_p95'
+]
+
+# nearest-rank percentile, None for no values
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values) + 0.5) - 1))]
+
+def read_events(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def aggregate(paths):
+    groups = defaultdict(lambda: {'games': 0, 'llm_moves': 0, 'illegal_moves': 0, 'engine_seconds': [],
+                                  **{metric: [] for metric in METRICS}})
+    for path in paths:
+        events = read_events(path)
+        llm_events = [e for e in events if e['player'] == 'llm']
+        if not llm_events:
+            continue
+        # the engine moves of a game are counted with the model it played against
+        key = (llm_events[0]['model'], llm_events[0].get('reasoning_effort'))
+        group = groups[key]
+        group['games'] += 1
+        for event in events:
+            if event['player'] == 'engine':
+                group['engine_seconds'].append(event['engine_seconds'])
+                continue
+            group['llm_moves'] += 1
+            group['illegal_moves'] += 0 if event['legal'] else 1
+            for metric in METRICS:
+                if event.get(metric) is not None:
+                    group[metric].append(event[metric])
+    return groups
+
+def main():
+    parser = argparse.ArgumentParser(description='p50/p95 latency and tokens per move, by model and reasoning effort')
+    parser.add_argument('patterns', nargs='*', default=[GAMES_PATTERN], help='game roots (glob patterns)')
+    parser.add_argument('--output', default=OUTPUT_CSV)
+    args = parser.parse_args()
+
+    paths = sorted(path for pattern in args.patterns
+                   for path in glob.glob(os.path.join(pattern, '*', PLIES_FILE)))
+    groups = aggregate(paths)
+
+    rows = []
+    for (model, reasoning_effort), group in sorted(groups.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+        row = [model, reasoning_effort or '', group['games'], group['llm_moves'], group['illegal_moves']]
+        for metric in METRICS + ['engine_seconds']:
+            row += [percentile(group[metric], 50), percentile(group[metric], 95)]
+        rows.append(row)
+        print(f"{model} ({reasoning_effort or '-'}): {group['games']} games, {group['llm_moves']} moves, "
+              f"API p50 {row[5]}s p95 {row[6]}s, prompt tokens p50 {row[7]} p95 {row[8]}, "
+              f"reasoning tokens p50 {row[11]} p95 {row[12]}")
+
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(rows)
+    print(f'{len(paths)} games analyzed. Output written to {args.output}')
+
+if __name__ == '__main__':
+    main()
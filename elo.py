@@ -0,0 +1,117 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+# Elo of every model at once (Bradley-Terry on the Elo scale), from the games of games_db*.csv: the opponents
+# are the Stockfish levels, anchored at the Elo of their skill level (skill_to_elo, written in the PGN
+# headers), so each model's rating is the one that best explains its results against them. Ratings can be
+# broken down by any columns of the games (color, temperature, base prompt, ...), and confidence intervals
+# come from a vectorised bootstrap: the replicates are fitted all together with NumPy, so thousands of them
+# take seconds instead of one compute_score/fsolve per model and per slice.
+#
+# eg  python3 elo.py games_db.csv games_db_gpt4o.csv --by color temperature --bootstrap 2000
+#
+# and from a notebook:  fit_elo(df, by=['color'], bootstrap=1000)
+
+ENGINE_PLAYERS = ['Stockfish', 'RANDOM chess engine']
+OUTPUT_CSV = 'elo_ratings.csv'
+
+SCORES = {'1-0': 1.0, '0-1': 0.0, '1/2-1/2': 0.5}
+ELO_SCALE = np.log(10) / 400
+PRIOR_GAMES = 1.0 # virtual draw(s) against the average opponent, so that 100% or 0% scores get a finite rating
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-6
+
+# one row per game of a model against an anchored engine: model, color, opponent Elo and score of the model
+# (games with an illegal move count as lost, unless legal_only, where they are left out)
+def model_games(df, legal_only=False):
+    df = df.copy()
+    model_white = ~df['white'].isin(ENGINE_PLAYERS)
+    df['model'] = df['white'].where(model_white, df['black'])
+    df['color'] = np.where(model_white, 'white', 'black')
+    df['opponent_elo'] = pd.to_numeric(df['black_elo'].where(model_white, df['white_elo']), errors='coerce')
+    white_score = df['result'].map(SCORES)
+    df['score'] = white_score.where(model_white, 1 - white_score)
+    has_illegal = df['has_illegal'].astype(str) == 'True'
+    if legal_only:
+        df = df[~has_illegal]
+    else:
+        df.loc[has_illegal, 'score'] = 0.0
+    # engine vs engine, random engine (no Elo) and unfinished games without an illegal move
+    return df[~df['model'].isin(ENGINE_PLAYERS) & df['opponent_elo'].notna() & df['score'].notna()]
+
+# ratings (shape (B, P)) of P players for B weightings of the same G games (weights: shape (B, G)),
+# by Newton's method on the log-likelihood, all players and weightings at once
+def fit_ratings(player, opponent_elo, score, weights, nplayers):
+    onehot = np.zeros((len(player), nplayers))
+    onehot[np.arange(len(player)), player] = 1.0
+    mean_opponent = (opponent_elo @ onehot) / np.maximum(onehot.sum(axis=0), 1) # center of the prior
+    ratings = np.tile(mean_opponent, (len(weights), 1))
+    for _ in range(MAX_ITERATIONS):
+        expected = 1 / (1 + np.exp(ELO_SCALE * (opponent_elo - ratings @ onehot.T)))
+        prior_expected = 1 / (1 + np.exp(ELO_SCALE * (mean_opponent - ratings)))
+        gradient = (weights * (score - expected)) @ onehot + PRIOR_GAMES * (0.5 - prior_expected)
+        hessian = (weights * expected * (1 - expected)) @ onehot + PRIOR_GAMES * prior_expected * (1 - prior_expected)
+        step = np.clip(gradient / (ELO_SCALE * hessian), -400, 400)
+        ratings += step
+        if np.max(np.abs(step)) < TOLERANCE:
+            break
+    return ratings
+
+# Elo per model (and per value of the `by` columns), with the bootstrap interval of level `confidence`
+def fit_elo(df, by=(), bootstrap=1000, confidence=0.95, legal_only=False, seed=0, batch=250):
+    games = model_games(df, legal_only)
+    keys = ['model'] + list(by)
+    groups = games.groupby(keys, sort=True, dropna=False)
+    player = groups.ngroup().to_numpy()
+    nplayers = groups.ngroups
+    opponent_elo = games['opponent_elo'].to_numpy(dtype=float)
+    score = games['score'].to_numpy(dtype=float)
+
+    result = groups.agg(games=('score', 'size'), score=('score', 'mean'), opponent_elo=('opponent_elo', 'mean')).reset_index()
+    result['elo'] = fit_ratings(player, opponent_elo, score, np.ones((1, len(player))), nplayers)[0]
+
+    if bootstrap:
+        # resampling the games of each player: multinomial counts, drawn as Poisson(1) weights per game
+        # (the usual large-sample equivalent), for `batch` replicates at a time
+        rng = np.random.default_rng(seed)
+        replicates = []
+        for start in range(0, bootstrap, batch):
+            weights = rng.poisson(1.0, size=(min(batch, bootstrap - start), len(player))).astype(float)
+            replicates.append(fit_ratings(player, opponent_elo, score, weights, nplayers))
+        replicates = np.concatenate(replicates)
+        alpha = (1 - confidence) / 2
+        result['elo_low'], result['elo_high'] = np.quantile(replicates, [alpha, 1 - alpha], axis=0)
+        result['elo_std'] = replicates.std(axis=0)
+    return result
+
+def read_games_db(paths):
+    return pd.concat([pd.read_csv(path, index_col=0) for path in paths], ignore_index=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Elo of every model against anchored Stockfish levels, with bootstrap intervals')
+    parser.add_argument('games_db', nargs='+', help='games_db*.csv files')
+    parser.add_argument('--by', nargs='*', default=[], help='columns to break the ratings down by, eg color temperature base_pgn_prompt')
+    parser.add_argument('--bootstrap', type=int, default=1000, help='bootstrap replicates (0: none)')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--legal-only', action='store_true', help='leave out the games with an illegal move (instead of counting them as lost)')
+    parser.add_argument('--query', default=None, help='pandas query on the games first, eg "random_engine == False and nstarting_move <= 2"')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=OUTPUT_CSV)
+    args = parser.parse_args()
+
+    df = read_games_db(args.games_db)
+    if args.query:
+        df = df.query(args.query)
+    start = time.monotonic()
+    result = fit_elo(df, by=args.by, bootstrap=args.bootstrap, confidence=args.confidence,
+                     legal_only=args.legal_only, seed=args.seed)
+    print(result.round(1).assign(score=result['score'].round(3)).to_string(index=False))
+    result.to_csv(args.output, index=False)
+    print(f'{len(result)} ratings, {args.bootstrap} bootstrap replicates in {time.monotonic() - start:.1f}s. '
+          f'Output written to {args.output}')
+
+if __name__ == '__main__':
+    main()
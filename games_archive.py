@@ -0,0 +1,92 @@
+import argparse
+import csv
+import os
+import tarfile
+import time
+
+from analyze_games import parse_metainformation_text
+from index_games import DB_COLUMNS, db_row_text
+
+# Games read straight out of the published .tar.gz archives (games.tar.gz, games_gpt4o.tar.gz, ...), without
+# extracting them: the archive is read as a stream, the files of each game folder are grouped as they come
+# (tar stores a folder's files one after the other) and every game is parsed as soon as it is complete, so
+# memory stays constant whatever the size of the archive.
+#
+# From a notebook:
+#   df = read_archive('games_gpt4o.tar.gz')                     # same columns as games_db.csv (+ model, effort)
+#   for chunk in read_archive('games.tar.gz', chunksize=500): ...
+#
+# eg  python3 games_archive.py games_gpt4o.tar.gz --output games_db_gpt4o.csv
+
+GAME_FILES = ('metainformation.txt', 'log.txt', 'game.pgn', 'session.txt')
+
+RECORD_COLUMNS = DB_COLUMNS + ['gpt_model', 'reasoning_effort']
+
+# (game folder, {file name: text}) of every game folder of the archive, with the files in `names`
+def iter_archive(path, names=GAME_FILES):
+    folder, files = None, {}
+    with tarfile.open(path, 'r|gz') as archive:
+        for member in archive:
+            archive.members = [] # the stream would keep every TarInfo otherwise
+            if not member.isfile() or os.path.basename(member.name) not in names:
+                continue # folders, other files, and the ._ files of macOS archives
+            member_folder = os.path.dirname(member.name)
+            if member_folder != folder:
+                if files:
+                    yield folder, files
+                folder, files = member_folder, {}
+            files[os.path.basename(member.name)] = archive.extractfile(member).read().decode('utf-8', errors='replace')
+    if files:
+        yield folder, files
+
+# one row per game (RECORD_COLUMNS), for games with both a game.pgn and a metainformation.txt
+def record_row(folder, files):
+    gpt_model, reasoning_effort = parse_metainformation_text(files['metainformation.txt'])
+    return db_row_text(folder, files['game.pgn'], files['metainformation.txt']) + [gpt_model, reasoning_effort]
+
+def iter_rows(path):
+    for folder, files in iter_archive(path, names=('metainformation.txt', 'game.pgn')):
+        if 'game.pgn' in files and 'metainformation.txt' in files:
+            yield record_row(folder, files)
+
+def iter_records(path):
+    for row in iter_rows(path):
+        yield dict(zip(RECORD_COLUMNS, row))
+
+def _chunks(path, chunksize):
+    import pandas as pd
+    rows = []
+    for row in iter_rows(path):
+        rows.append(row)
+        if len(rows) == chunksize:
+            yield pd.DataFrame(rows, columns=RECORD_COLUMNS)
+            rows = []
+    if rows:
+        yield pd.DataFrame(rows, columns=RECORD_COLUMNS)
+
+# DataFrame of the games of an archive, or an iterator of DataFrames of `chunksize` games
+def read_archive(path, chunksize=None):
+    if chunksize is not None:
+        return _chunks(path, chunksize)
+    import pandas as pd
+    return pd.DataFrame(list(iter_rows(path)), columns=RECORD_COLUMNS)
+
+def main():
+    parser = argparse.ArgumentParser(description='games_db.csv rows of the games of .tar.gz archives, without extracting them')
+    parser.add_argument('archives', nargs='+')
+    parser.add_argument('--output', default='games_db_archive.csv')
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    ngames = 0
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([''] + RECORD_COLUMNS)
+        for path in args.archives:
+            for row in iter_rows(path):
+                writer.writerow([ngames] + row)
+                ngames += 1
+    print(f'{ngames} games in {time.monotonic() - start:.1f}s. Output written to {args.output}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import argparse
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from elo import ENGINE_PLAYERS, SCORES, read_games_db
+
+# Aggregate cube of the games of games_db*.csv, persisted in SQLite (games_cube.sqlite): one cell per
+# model x color x opponent Elo x temperature x random_engine x nstarting_move x base prompt, with additive
+# counts (games, wins/draws/losses from the model's side, illegal moves, plies). Every table or chart of the
+# notebooks is a roll-up of these cells (a GROUP BY over a few hundred rows) instead of a df.query scan of
+# all the games. Updates only add the games (folder_name) that are not in the cube yet.
+#
+# eg  python3 games_cube.py update games_db.csv games_db_gpt4o.csv
+#     python3 games_cube.py query --by model color --filter random_engine=0 nstarting_move=1
+#
+# and from a notebook:  GamesCube().query(by=['model', 'temperature'], model=['gpt-4', 'gpt-4o'])
+
+CUBE_PATH = 'games_cube.sqlite'
+
+# dimension -> SQL type (booleans are 0/1; opponent_elo is '?' for the random engine)
+DIMENSIONS = {
+    'model': 'TEXT',
+    'color': 'TEXT',
+    'opponent_elo': 'TEXT',
+    'temperature': 'REAL',
+    'random_engine': 'INTEGER',
+    'nstarting_move': 'INTEGER',
+    'base_pgn_prompt': 'INTEGER',
+}
+# unfinished: no result and no illegal move; a game with an illegal move is counted in illegal, not in losses
+MEASURES = ['games', 'wins', 'draws', 'losses', 'unfinished', 'illegal', 'plies', 'plies_sq']
+
+
+def as_bool(values):
+    return values.astype(str) == 'True'
+
+# one row per game: dimensions and per-game measures (0/1 counts), from games_db rows
+def game_cells(df):
+    model_white = ~df['white'].isin(ENGINE_PLAYERS)
+    has_illegal = as_bool(df['has_illegal'])
+    white_score = df['result'].map(SCORES)
+    score = white_score.where(model_white, 1 - white_score).where(~has_illegal)
+    plies = pd.to_numeric(df['nmoves'], errors='coerce').fillna(0)
+    cells = pd.DataFrame({
+        'folder_name': df['folder_name'],
+        'model': df['white'].where(model_white, df['black']),
+        'color': np.where(model_white, 'white', 'black'),
+        'opponent_elo': df['black_elo'].where(model_white, df['white_elo']).astype(str),
+        'temperature': pd.to_numeric(df['temperature'], errors='coerce').fillna(0.0),
+        'random_engine': as_bool(df['random_engine']).astype(int),
+        'nstarting_move': pd.to_numeric(df['nstarting_move'], errors='coerce').fillna(1).astype(int),
+        'base_pgn_prompt': as_bool(df['base_pgn_prompt']).astype(int),
+        'games': 1,
+        'wins': (score == 1.0).astype(int),
+        'draws': (score == 0.5).astype(int),
+        'losses': (score == 0.0).astype(int),
+        'unfinished': (score.isna() & ~has_illegal).astype(int),
+        'illegal': has_illegal.astype(int),
+        'plies': plies.astype(int),
+        'plies_sq': (plies ** 2).astype(int),
+    })
+    return cells[~cells['model'].isin(ENGINE_PLAYERS)] # engine vs engine
+
+
+class GamesCube:
+
+    def __init__(self, path=CUBE_PATH):
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None)
+        dimensions = ', '.join(f'{name} {sql_type} NOT NULL' for name, sql_type in DIMENSIONS.items())
+        measures = ', '.join(f'{name} INTEGER NOT NULL DEFAULT 0' for name in MEASURES)
+        self._db.execute(f'CREATE TABLE IF NOT EXISTS cells ({dimensions}, {measures}, PRIMARY KEY ({", ".join(DIMENSIONS)}))')
+        self._db.execute('CREATE TABLE IF NOT EXISTS folders (folder_name TEXT PRIMARY KEY)')
+
+    # adds the games of the DataFrame (games_db rows) that are not in the cube yet; returns their number
+    def add(self, df):
+        known = {row[0] for row in self._db.execute('SELECT folder_name FROM folders')}
+        new = df[~df['folder_name'].isin(known)].drop_duplicates('folder_name')
+        if new.empty:
+            return 0
+        cells = game_cells(new).groupby(list(DIMENSIONS), as_index=False)[MEASURES].sum()
+        columns = list(DIMENSIONS) + MEASURES
+        updates = ', '.join(f'{name} = {name} + excluded.{name}' for name in MEASURES)
+        self._db.execute('BEGIN')
+        try:
+            self._db.executemany(f'INSERT INTO cells ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))}) '
+                                 f'ON CONFLICT ({", ".join(DIMENSIONS)}) DO UPDATE SET {updates}',
+                                 cells[columns].itertuples(index=False, name=None))
+            self._db.executemany('INSERT INTO folders VALUES (?)', ((folder,) for folder in new['folder_name']))
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+        return len(new)
+
+    def update(self, games_db_paths):
+        return self.add(read_games_db(games_db_paths))
+
+    # games removed from games_db*.csv are only dropped by a rebuild
+    def rebuild(self, games_db_paths):
+        self._db.execute('DELETE FROM cells')
+        self._db.execute('DELETE FROM folders')
+        return self.update(games_db_paths)
+
+    # measures summed over the cells matching the filters (dimension=value, or dimension=[values]), by `by`,
+    # with score (wins + draws/2 over finished games), illegal_rate and mean_plies
+    def query(self, by=(), **filters):
+        conditions, params = [], []
+        for name, value in filters.items():
+            if name not in DIMENSIONS:
+                raise ValueError(f'unknown dimension {name}, expected one of {", ".join(DIMENSIONS)}')
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            conditions.append(f'{name} IN ({", ".join("?" * len(values))})')
+            params += [int(v) if isinstance(v, bool) else v for v in values]
+        by = list(by)
+        sql = f'SELECT {", ".join(by + [f"SUM({name}) AS {name}" for name in MEASURES])} FROM cells'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        if by:
+            sql += f' GROUP BY {", ".join(by)} ORDER BY {", ".join(by)}'
+        result = pd.read_sql_query(sql, self._db, params=params)
+        result = result[result['games'].fillna(0) > 0].reset_index(drop=True)
+        finished = result['wins'] + result['draws'] + result['losses']
+        result['score'] = (result['wins'] + 0.5 * result['draws']) / finished.where(finished > 0)
+        result['illegal_rate'] = result['illegal'] / result['games']
+        result['mean_plies'] = result['plies'] / result['games']
+        result['std_plies'] = np.sqrt(np.maximum(result['plies_sq'] / result['games'] - result['mean_plies'] ** 2, 0))
+        return result.drop(columns=['plies_sq'])
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM folders').fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+def parse_filter(text):
+    name, _, value = text.partition('=')
+    sql_type = DIMENSIONS.get(name)
+    cast = {'REAL': float, 'INTEGER': int}.get(sql_type, str)
+    return name, [cast(v) for v in value.split(',')]
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate cube of the games of games_db*.csv')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    update_parser = subparsers.add_parser('update', help='add the new games of games_db*.csv files to the cube')
+    update_parser.add_argument('games_db', nargs='+')
+    update_parser.add_argument('--rebuild', action='store_true', help='start from an empty cube')
+    query_parser = subparsers.add_parser('query', help='roll the cube up')
+    query_parser.add_argument('--by', nargs='*', default=['model'], choices=list(DIMENSIONS))
+    query_parser.add_argument('--filter', nargs='*', default=[], help='dimension=value[,value...], eg model=gpt-4o color=white')
+    query_parser.add_argument('--output', default=None, help='CSV file for the result')
+    for subparser in (update_parser, query_parser):
+        subparser.add_argument('--cube', default=CUBE_PATH)
+    args = parser.parse_args()
+
+    cube = GamesCube(args.cube)
+    start = time.monotonic()
+    if args.command == 'update':
+        ngames = cube.rebuild(args.games_db) if args.rebuild else cube.update(args.games_db)
+        print(f'{ngames} new games added in {time.monotonic() - start:.1f}s ({len(cube)} games in {args.cube})')
+    else:
+        result = cube.query(by=args.by, **dict(parse_filter(text) for text in args.filter))
+        print(result.round(3).to_string(index=False))
+        if args.output:
+            result.to_csv(args.output, index=False)
+    cube.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+# Asyncio variant of play_game: many games share one event loop and the async OpenAI client,
+# so a single process can keep hundreds of games in flight (the limit is the API quota).
+# The game itself is the one of play_game (game.game_plies): only its model and Stockfish calls are made here.
+# Stockfish is blocking (UCI over a pipe): every engine call is sent to a thread pool executor
+# so that it never stalls the event loop (and so are the searches of the ponderers, see ponder.py).
+# Games are checkpointed after every ply as with play_game (see checkpoint.py): running the same jobs again
+# skips the games already finished and resumes the interrupted ones from their last ply.
+#
+# eg  python3 async_game.py --concurrency 200 --repetitions 50
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import AsyncOpenAI
+
+from game import (ChessEngineConfig, GPTConfig, BASE_PGN, OUTPUT_DIR, STOCKFISH_PATH, setup_directory, model_endpoint, new_engine,
+                  close_logger, game_plies, ModelCall, new_ponderer, close_ponderer)
+from checkpoint import load_checkpoint
+from engine_pool import EnginePool
+from llm_cache import get_cache
+from request_scheduler import scheduled_async, format_scheduler_stats, queue_depth
+from client_registry import get_async_client, close_async_clients, credentials
+from tournament import make_jobs, games_per_hour, job_directory, job_state
+from game_store import use_game_store
+
+
+# the client of the provider, shared by all the games of the event loop (see client_registry.py)
+def create_async_ai_client(gpt_config: GPTConfig) -> AsyncOpenAI:
+    return get_async_client(*credentials(gpt_config.use_deepseek, gpt_config.base_url))
+
+
+async def call_model_async(ai_client: AsyncOpenAI, kind, kwargs, cache=None):
+    create = scheduled_async(ai_client, model_endpoint(ai_client, kind))
+    if cache is not None:
+        return await cache.call_async(ai_client, kind, kwargs, create)
+    return await create(**kwargs)
+
+
+# Same game as play_game (same prompts, same files in the game's directory), but every API call is awaited
+# and every Stockfish call runs in `executor`.
+# ai_client: AsyncOpenAI client, shared between games (created from gpt_config if None)
+# state: checkpoint of the game to go on with (see game.resume_game), None for a new game
+async def play_game_async(chess_config: ChessEngineConfig, gpt_config: GPTConfig, base_pgn=BASE_PGN, nmove=1, white_piece=True,
+                          dir_name=None, ai_client=None, executor=None, engine_pool=None, state=None):
+    loop = asyncio.get_running_loop()
+
+    def run_engine(fn, *args):
+        return loop.run_in_executor(executor, fn, *args)
+
+    if ai_client is None:
+        ai_client = create_async_ai_client(gpt_config)
+
+    if dir_name is None:
+        dir_name = setup_directory()
+
+    ponderer = None
+    try:
+        ponderer = await run_engine(new_ponderer, chess_config, engine_pool, executor)
+        if engine_pool is None:
+            stockfish = await run_engine(new_engine, chess_config)
+            return await play_game_with_engine_async(stockfish, run_engine, chess_config, gpt_config, base_pgn, nmove, white_piece, dir_name,
+                                                     ai_client, state, ponderer)
+
+        stockfish = await run_engine(engine_pool.checkout, chess_config)
+        try:
+            pgn = await play_game_with_engine_async(stockfish, run_engine, chess_config, gpt_config, base_pgn, nmove, white_piece, dir_name,
+                                                    ai_client, state, ponderer)
+        except BaseException:
+            engine_pool.checkin(stockfish, broken=True)
+            raise
+        engine_pool.checkin(stockfish)
+        return pgn
+    finally:
+        await run_engine(close_ponderer, ponderer, engine_pool)
+        close_logger(dir_name) # log.txt, session.txt and plies.jsonl of the game are written at the end
+
+# async counterpart of game.resume_game
+async def resume_game_async(dir_name, ai_client=None, executor=None, engine_pool=None, state=None):
+    if state is None:
+        state = load_checkpoint(dir_name)
+    if state is None:
+        raise ValueError(f"no checkpoint in {dir_name}")
+    if state["finished"]:
+        return None
+    return await play_game_async(ChessEngineConfig(**state["chess_config"]), GPTConfig(**state["gpt_config"]), state["base_pgn"],
+                                 state["nmove"], state["white_piece"], dir_name, ai_client, executor, engine_pool, state)
+
+
+# Async driver of the game (see game.game_plies): the model calls are awaited, the Stockfish calls run off the
+# event loop with run_engine
+# ponderer: searches, in the same executor, the replies to the likely moves of GPT during its requests (None: no pondering)
+async def play_game_with_engine_async(stockfish, run_engine, chess_config: ChessEngineConfig, gpt_config: GPTConfig, base_pgn, nmove,
+                                      white_piece, dir_name, ai_client, state=None, ponderer=None):
+    cache = get_cache(gpt_config.cache_path) if gpt_config.cache_path else None
+    plies = game_plies(stockfish, chess_config, gpt_config, base_pgn, nmove, white_piece, dir_name, state, ponderer)
+    result = None
+    while True:
+        try:
+            call = plies.send(result)
+        except StopIteration as stop:
+            return stop.value
+        if isinstance(call, ModelCall):
+            result = await call_model_async(ai_client, call.kind, call.kwargs, cache)
+        else:
+            result = await run_engine(call.fn, *call.args)
+
+
+# Play all the jobs (see tournament.make_jobs) on one event loop, with at most `max_concurrency` games in flight.
+# One AsyncOpenAI client (and thus one connection pool) is shared by all the games of the same provider,
+# and Stockfish processes are reused from one game to the next. Each job plays in the directory of tournament.py
+# (see job_directory): the jobs finished by a previous run are skipped, the interrupted ones resumed.
+async def run_games_async(jobs, max_concurrency=200, output_dir=OUTPUT_DIR, engine_threads=32, engine_path=STOCKFISH_PATH):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    nengines = 2 if any(job.chess_config.ponder_moves > 0 for job in jobs) else 1 # a game that ponders has a second engine
+    executor = ThreadPoolExecutor(max_workers=engine_threads * nengines)
+    engine_pool = EnginePool(size=max_concurrency * nengines, path=engine_path)
+    clients = {}
+    results = []
+    start = time.monotonic()
+
+    async def run(job):
+        key = (job.gpt_config.use_deepseek, job.gpt_config.base_url)
+        if key not in clients:
+            clients[key] = create_async_ai_client(job.gpt_config)
+        async with semaphore:
+            game_start = time.monotonic()
+            dir_name = job_directory(job, output_dir)
+            state = job_state(dir_name)
+            error = None
+            try:
+                if state is None:
+                    await play_game_async(job.chess_config, job.gpt_config, base_pgn=job.base_pgn, nmove=job.nmove,
+                                          white_piece=job.white_piece, dir_name=dir_name, ai_client=clients[key],
+                                          executor=executor, engine_pool=engine_pool)
+                elif not state["finished"]:
+                    await resume_game_async(dir_name, clients[key], executor, engine_pool, state)
+            except Exception as e: # one broken game should not take the other ones down
+                error = repr(e)
+        status = "done" if state is None else "skipped" if state["finished"] else "resumed"
+        results.append({"job": job, "dir_name": dir_name, "duration": time.monotonic() - game_start, "error": error, "status": status})
+        nplayed = sum(1 for r in results if r["status"] != "skipped")
+        print(f"[{len(results)}/{len(jobs)}] {dir_name} {'error: ' + error if error else status} "
+              f"-- {games_per_hour(nplayed, time.monotonic() - start):.1f} games/hour, {queue_depth()} requests waiting for the API budget")
+
+    try:
+        await asyncio.gather(*(run(job) for job in jobs))
+    finally:
+        executor.shutdown(wait=False)
+        engine_pool.close()
+        await close_async_clients()
+
+    elapsed = time.monotonic() - start
+    nplayed = sum(1 for r in results if r["status"] != "skipped")
+    print(f"Complete: {nplayed} games ({len(results) - nplayed} already finished) in {elapsed / 60:.1f} min, "
+          f"{games_per_hour(nplayed, elapsed):.1f} games/hour")
+    print(f"API: {format_scheduler_stats()}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play many GPT vs Stockfish games concurrently in one process")
+    parser.add_argument("--concurrency", type=int, default=200, help="maximum number of games in flight")
+    parser.add_argument("--repetitions", type=int, default=1, help="number of games per configuration")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--engine-path", default=STOCKFISH_PATH, help="Stockfish binary (default: $STOCKFISH_PATH)")
+    parser.add_argument("--store", default=None, help="SQLite game store to write the games to, instead of --output-dir")
+    parser.add_argument("--ponder", type=int, default=0, help="number of likely GPT moves whose engine replies are searched while GPT thinks")
+    args = parser.parse_args()
+    if args.store is not None:
+        use_game_store(args.store)
+
+    chess_configs = [ChessEngineConfig(skill_level=skill, engine_depth=15, engine_path=args.engine_path, ponder_moves=args.ponder)
+                     for skill in (1, 3, 5)]
+    gpt_configs = [GPTConfig(model_gpt="gpt-3.5-turbo-instruct", temperature=0.0, max_tokens=5)]
+
+    jobs = make_jobs(chess_configs, gpt_configs, repetitions=args.repetitions)
+    asyncio.run(run_games_async(jobs, max_concurrency=args.concurrency, output_dir=args.output_dir,
+                                engine_path=args.engine_path))
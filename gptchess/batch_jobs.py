@@ -0,0 +1,177 @@
+# Batch jobs (OpenAI Batch API) for large probe grids: the requests are written to a JSONL file, one line per
+# request ({"custom_id", "method", "url", "body"}), uploaded and run as a single job within the completion
+# window, at a lower price than synchronous calls and outside of their rate limits. The output JSONL (one line
+# per request, in any order, with the custom_id of its request) is then joined back onto the grid rows.
+# LocalBatchClient is a file-based stand-in for the files and batches endpoints: it runs the requests itself
+# through any client (eg one pointed at replay_server.py), so that the whole path can be tested offline.
+#
+#   path = write_jsonl("batch_input.jsonl", completion_requests(prompts, model="gpt-3.5-turbo-instruct", temperature=0.0, max_tokens=5))
+#   batch = wait_batch(client, submit_batch(client, path).id)
+#   texts = batch_texts(client, batch, len(prompts))   # None for the requests that failed
+
+import json
+import os
+import time
+import uuid
+from types import SimpleNamespace
+
+from openai.types import Batch, BatchRequestCounts, FileObject
+
+COMPLETIONS_ENDPOINT = "/v1/completions"
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+POLL_SECONDS = 30
+
+
+def custom_id(i):
+    return f"row-{i}"
+
+# one request per prompt, custom_id row-<position of the prompt>
+def completion_requests(prompts, **body):
+    return [{"custom_id": custom_id(i), "method": "POST", "url": COMPLETIONS_ENDPOINT, "body": dict(body, prompt=prompt)}
+            for i, prompt in enumerate(prompts)]
+
+def write_jsonl(path, lines):
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(json.dumps(line) + "\n")
+    return path
+
+def read_jsonl(text):
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def submit_batch(ai_client, path, endpoint=COMPLETIONS_ENDPOINT):
+    with open(path, "rb") as f:
+        input_file = ai_client.files.create(file=f, purpose="batch")
+    return ai_client.batches.create(input_file_id=input_file.id, endpoint=endpoint, completion_window="24h")
+
+# polls the batch until it is completed, failed, expired or cancelled
+def wait_batch(ai_client, batch_id, poll_seconds=POLL_SECONDS, verbose=True):
+    while True:
+        batch = ai_client.batches.retrieve(batch_id)
+        if verbose:
+            counts = batch.request_counts
+            done = f" {counts.completed + counts.failed}/{counts.total}" if counts is not None else ""
+            print(f"batch {batch.id}: {batch.status}{done}")
+        if batch.status in FINAL_STATUSES:
+            return batch
+        time.sleep(poll_seconds)
+
+# custom_id -> response body of the requests that succeeded (an expired batch still has the outputs of the
+# requests it ran); the failures are printed
+def batch_outputs(ai_client, batch):
+    outputs = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in read_jsonl(ai_client.files.content(file_id).text):
+            response = line.get("response") or {}
+            if line.get("error") is None and response.get("status_code") == 200:
+                outputs[line["custom_id"]] = response["body"]
+            else:
+                print(f"{line['custom_id']}: {line.get('error') or response.get('body')}")
+    return outputs
+
+# completion text of each of the nrequests requests of completion_requests, None if it failed
+def batch_texts(ai_client, batch, nrequests):
+    outputs = batch_outputs(ai_client, batch)
+    texts = []
+    for i in range(nrequests):
+        body = outputs.get(custom_id(i))
+        texts.append(body["choices"][0]["text"] if body is not None else None)
+    return texts
+
+
+class LocalFiles:
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def create(self, file, purpose):
+        data = file.read() if hasattr(file, "read") else file
+        file_id = "file-" + uuid.uuid4().hex
+        with open(os.path.join(self.directory, file_id), "wb") as f:
+            f.write(data)
+        return FileObject(id=file_id, bytes=len(data), created_at=int(time.time()), filename=getattr(file, "name", file_id),
+                          object="file", purpose=purpose, status="processed")
+
+    def content(self, file_id):
+        with open(os.path.join(self.directory, file_id), "rb") as f:
+            data = f.read()
+        return SimpleNamespace(content=data, text=data.decode())
+
+    def write(self, lines):
+        data = "".join(json.dumps(line) + "\n" for line in lines).encode()
+        return self.create(data, purpose="batch_output").id
+
+
+class LocalBatches:
+
+    def __init__(self, directory, files, ai_client):
+        self.directory = directory
+        self.files = files
+        self.ai_client = ai_client
+
+    def _path(self, batch_id):
+        return os.path.join(self.directory, batch_id + ".json")
+
+    def _save(self, batch):
+        with open(self._path(batch.id), "w") as f:
+            f.write(batch.model_dump_json())
+        return batch
+
+    def create(self, input_file_id, endpoint, completion_window, metadata=None):
+        return self._save(Batch(id="batch_" + uuid.uuid4().hex, completion_window=completion_window,
+                                created_at=int(time.time()), endpoint=endpoint, input_file_id=input_file_id,
+                                object="batch", status="validating", metadata=metadata))
+
+    def _endpoint(self, url):
+        if url == "/v1/completions":
+            return self.ai_client.completions.create
+        if url == "/v1/chat/completions":
+            return self.ai_client.chat.completions.create
+        if url == "/v1/responses":
+            return self.ai_client.responses.create
+        raise ValueError(f"unsupported batch endpoint {url}")
+
+    # the requests of the batch are run, one after the other, at its first retrieval
+    def _run(self, batch):
+        outputs, errors = [], []
+        for request in read_jsonl(self.files.content(batch.input_file_id).text):
+            line = {"id": "batch_req_" + uuid.uuid4().hex, "custom_id": request["custom_id"]}
+            try:
+                body = self._endpoint(request["url"])(**request["body"]).model_dump()
+            except Exception as e:
+                errors.append(dict(line, response=None, error={"code": type(e).__name__, "message": str(e)}))
+                continue
+            outputs.append(dict(line, response={"status_code": 200, "request_id": line["id"], "body": body}, error=None))
+        now = int(time.time())
+        return batch.model_copy(update={
+            "status": "completed",
+            "output_file_id": self.files.write(outputs) if outputs else None,
+            "error_file_id": self.files.write(errors) if errors else None,
+            "in_progress_at": now,
+            "completed_at": now,
+            "request_counts": BatchRequestCounts(total=len(outputs) + len(errors), completed=len(outputs), failed=len(errors)),
+        })
+
+    def retrieve(self, batch_id):
+        with open(self._path(batch_id)) as f:
+            batch = Batch.model_validate_json(f.read())
+        if batch.status not in FINAL_STATUSES:
+            batch = self._save(self._run(batch))
+        return batch
+
+    def cancel(self, batch_id):
+        with open(self._path(batch_id)) as f:
+            batch = Batch.model_validate_json(f.read())
+        return self._save(batch.model_copy(update={"status": "cancelled", "cancelled_at": int(time.time())}))
+
+
+# files and batches endpoints of a client, kept in `directory`; requests are run with ai_client
+class LocalBatchClient:
+
+    def __init__(self, directory, ai_client):
+        os.makedirs(directory, exist_ok=True)
+        self.files = LocalFiles(directory)
+        self.batches = LocalBatches(directory, self.files, ai_client)
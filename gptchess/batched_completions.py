@@ -0,0 +1,79 @@
+# Several prompts per request to the legacy completions endpoint (gpt-3.5-turbo-instruct): `prompt` can be a
+# list, and the choices of the response come back with the index of their prompt. The prompt-variation grids
+# send their cells in packs of at most `max_prompts` prompts and `max_request_tokens` tokens (prompt tokens,
+# estimated, plus max_tokens for each completion) instead of one request per cell.
+# Cells already in the LLM cache (temperature 0) are not sent, and every new answer is cached as the
+# single-prompt request it stands for, so batched and unbatched runs share their cache entries.
+#
+#   texts = complete_batch(client, prompts, model="gpt-3.5-turbo-instruct", temperature=0.0, max_tokens=5, cache=cache)
+#   moves = [extract_move_chatgpt(choices[0]) for choices in texts]
+
+from llm_cache import cacheable, request_key
+from request_scheduler import scheduled
+from transcript import count_tokens
+
+MAX_PROMPTS_PER_REQUEST = 20
+# budget of a request: tokens of its prompts plus the completion tokens they may use
+MAX_TOKENS_PER_REQUEST = 20000
+
+
+def request_tokens(prompt, model, max_tokens, n=1):
+    return count_tokens(prompt, model) + n * max_tokens
+
+# positions of the prompts packed in each request, in order; a prompt over the token budget goes alone
+def pack_prompts(prompts, model, max_tokens, n=1, max_prompts=MAX_PROMPTS_PER_REQUEST,
+                 max_request_tokens=MAX_TOKENS_PER_REQUEST):
+    packs, pack, ntokens = [], [], 0
+    for i, prompt in enumerate(prompts):
+        tokens = request_tokens(prompt, model, max_tokens, n)
+        if pack and (len(pack) == max_prompts or ntokens + tokens > max_request_tokens):
+            packs.append(pack)
+            pack, ntokens = [], 0
+        pack.append(i)
+        ntokens += tokens
+    if pack:
+        packs.append(pack)
+    return packs
+
+# single-prompt response of choice `choice` of a batched response, as the cache stores it
+def single_response(response, choice):
+    return response.model_copy(update={"choices": [choice.model_copy(update={"index": 0})], "usage": None})
+
+# texts of the n choices of every prompt, in the order of `prompts`
+def complete_batch(ai_client, prompts, model, temperature, max_tokens, n=1, cache=None,
+                   max_prompts=MAX_PROMPTS_PER_REQUEST, max_request_tokens=MAX_TOKENS_PER_REQUEST, **kwargs):
+    texts = [None] * len(prompts)
+    base_url = getattr(ai_client, "base_url", None)
+
+    def single_request(prompt):
+        request = dict(model=model, prompt=prompt, temperature=temperature, max_tokens=max_tokens, **kwargs)
+        if n != 1:
+            request["n"] = n
+        return request
+
+    use_cache = cache is not None and cacheable("completions", single_request(""))
+    pending = []
+    for i, prompt in enumerate(prompts):
+        response = cache.get(request_key("completions", single_request(prompt), base_url)) if use_cache else None
+        if response is None:
+            pending.append(i)
+        else:
+            texts[i] = [choice.text for choice in response.choices]
+
+    create = scheduled(ai_client, ai_client.completions.create) # budgets and retries (see request_scheduler)
+    pending_prompts = [prompts[i] for i in pending]
+    for pack in pack_prompts(pending_prompts, model, max_tokens, n, max_prompts, max_request_tokens):
+        batch = [pending[j] for j in pack]
+        request = single_request([prompts[i] for i in batch])
+        response = create(**request)
+        choices = [[] for _ in batch]
+        for choice in sorted(response.choices, key=lambda choice: choice.index):
+            choices[choice.index // n].append(choice) # choices of prompt k have indices k*n .. k*n+n-1
+        for i, prompt_choices in zip(batch, choices):
+            if len(prompt_choices) != n:
+                raise ValueError(f"{len(prompt_choices)} choices instead of {n} for prompt {i} of the batch")
+            texts[i] = [choice.text for choice in prompt_choices]
+            if use_cache:
+                cache.put(request_key("completions", single_request(prompts[i]), base_url), "completions", model,
+                          single_response(response, prompt_choices[0]))
+    return texts
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+# Throughput benchmark of the harness itself: play_game against an instant synthetic model that plays random
+# legal moves, so that all the time is spent in play_game (SAN parsing, board updates, prompts, logging)
+# and in Stockfish. Each case (prompt mode x engine setting x game length) reports plies/second and the
+# time per ply of every phase; results are appended to a JSONL file and compared with the previous run
+# of the same case, to catch regressions.
+#
+# eg  python3 bench.py --games 5
+#     python3 bench.py --modes completion chat --depths 1 10 --times --lengths 20 --max-slowdown 0.2
+
+import argparse
+import contextlib
+import datetime
+import functools
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+
+import chess
+import chess.pgn
+from stockfish import Stockfish
+
+import engine_pool
+import game
+import prompt_strategy
+import transcript
+from engine_pool import EnginePool
+from game import ChessEngineConfig, GPTConfig, BASE_PGN, BASE_PGN_BLACK, STOCKFISH_PATH
+from replay_server import prompt_moves, request_text
+
+RESULTS_FILE = "bench_results.jsonl"
+
+# GPT configuration of each prompt mode
+MODES = {
+    "completion": GPTConfig(model_gpt="gpt-3.5-turbo-instruct", temperature=0.0, max_tokens=5),
+    "chat": GPTConfig(model_gpt="gpt-4o", temperature=0.0, max_tokens=6, chat_gpt=True,
+                      system_role_message="You are a chess player. Complete the game using PGN notation."),
+    "deepseek": GPTConfig(model_gpt="deepseek-reasoner", chat_gpt=True, use_deepseek=True),
+    "oseries": GPTConfig(model_gpt="o3", chat_gpt=True, oseries=True),
+}
+
+FEN_IN_PROMPT = re.compile(r'\[FEN "([^"]+)"\]|Current position \(FEN\): (\S+ \S+ \S+ \S+ \S+ \S+)')
+TAG = re.compile(r"<[^>]+>")
+
+
+# position described by a prompt (or messages): the FEN of the "window" strategy, or the moves so far
+def prompt_board(text):
+    match = FEN_IN_PROMPT.search(text)
+    if match and match.group(2):
+        return chess.Board(match.group(2))
+    board = chess.Board(match.group(1)) if match else chess.Board()
+    for san in prompt_moves(TAG.sub(" ", text[match.end():] if match else text)):
+        board.push_san(san)
+    return board
+
+
+# In-process stand-in for the OpenAI client: answers instantly with a random legal move, in the format of
+# each endpoint, and resigns (answers with something that is not a move) after `max_moves` moves
+# tagged: moves in <played_move> tags, as asked to DeepSeek and the o-series
+class SyntheticClient:
+
+    base_url = "http://synthetic/v1" # no API budget for the request scheduler
+
+    def __init__(self, max_moves=None, seed=None, tagged=False):
+        self.max_moves = max_moves
+        self.tagged = tagged
+        self.nmoves = 0
+        self.random = random.Random(seed)
+        self.completions = SimpleNamespace(create=self.create_completion)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_chat))
+        self.responses = SimpleNamespace(create=self.create_response)
+
+    def move(self, text):
+        self.nmoves += 1
+        if self.max_moves is not None and self.nmoves > self.max_moves:
+            move = "resigns"
+        else:
+            board = prompt_board(text)
+            move = board.san(self.random.choice(list(board.legal_moves)))
+        return f"<played_move>{move}</played_move>" if self.tagged else move
+
+    def create_completion(self, model, prompt, **kwargs):
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(text=" " + self.move(prompt), index=0)])
+
+    def create_chat(self, model, messages, **kwargs):
+        message = SimpleNamespace(role="assistant", content=self.move(request_text(messages)), reasoning_content="")
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(message=message, index=0)])
+
+    def create_response(self, model, input, **kwargs):
+        return SimpleNamespace(model=model, output_text=self.move(request_text(input)))
+
+
+# Exclusive time spent in each phase: a phase called from another one (eg log_msg from extract_san)
+# is not counted twice
+class PhaseTimer:
+
+    def __init__(self):
+        self.seconds = {}
+        self._stack = [] # [phase, start, time spent in nested phases]
+
+    def timed(self, phase, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            self._stack.append([phase, time.perf_counter(), 0.0])
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _, start, nested = self._stack.pop()
+                elapsed = time.perf_counter() - start
+                self.seconds[phase] = self.seconds.get(phase, 0.0) + elapsed - nested
+                if self._stack:
+                    self._stack[-1][2] += elapsed
+        return wrapper
+
+    # (object, attribute) -> phase, patched for the duration of the block
+    @contextlib.contextmanager
+    def patch(self, targets):
+        saved = [(obj, name, getattr(obj, name)) for (obj, name) in targets]
+        try:
+            for (obj, name), phase in targets.items():
+                setattr(obj, name, self.timed(phase, getattr(obj, name)))
+            yield self
+        finally:
+            for obj, name, fn in saved:
+                setattr(obj, name, fn)
+
+
+PHASES = {
+    (game, "call_model"): "model", # the synthetic model itself (replays the prompt to find the position)
+    (game, "response_text"): "parse",
+    (game, "extract_san"): "parse",
+    (game, "engine_move"): "engine",
+    (engine_pool, "configure_engine"): "engine",
+    (Stockfish, "make_moves_from_current_position"): "engine",
+    (Stockfish, "get_board_visual"): "engine",
+    (Stockfish, "get_parameters"): "engine",
+    (Stockfish, "set_position"): "engine",
+    (prompt_strategy.FullHistory, "build"): "prompt",
+    (prompt_strategy.FullHistory, "size"): "prompt",
+    (prompt_strategy.FullHistory, "add_last_move"): "prompt",
+    (transcript.ChatTranscript, "append"): "prompt",
+    (transcript.ChatTranscript, "add_move"): "prompt",
+    (game, "append_chat_turn"): "prompt",
+    (game, "log_msg"): "io",
+    (game, "record_session"): "io",
+    (game, "save_game"): "io",
+    (game, "save_metainformation_experiment"): "io",
+    (game, "close_logger"): "io",
+}
+
+
+def count_plies(dir_name):
+    path = os.path.join(dir_name, "game.pgn")
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        pgn = chess.pgn.read_game(f)
+    return len(list(pgn.mainline_moves())) if pgn is not None else 0
+
+
+# games: number of games of the case (alternating colors)
+def run_case(mode, chess_config, max_moves, games, pool, output_dir, seed=0):
+    gpt_config = MODES[mode]
+    timer = PhaseTimer()
+    plies = 0
+    start = time.perf_counter()
+    with timer.patch(PHASES), open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(games):
+            white_piece = i % 2 == 0
+            dir_name = os.path.join(output_dir, "game" + str(uuid.uuid4()))
+            os.makedirs(dir_name)
+            game.play_game(chess_config, gpt_config, base_pgn=BASE_PGN if white_piece else BASE_PGN_BLACK,
+                           white_piece=white_piece, dir_name=dir_name, engine_pool=pool,
+                           ai_client=SyntheticClient(max_moves, seed=seed + i, tagged=gpt_config.use_deepseek or gpt_config.oseries))
+            plies += count_plies(dir_name)
+    wall = time.perf_counter() - start
+    phases = dict(timer.seconds)
+    phases["board"] = wall - sum(phases.values()) # SAN parsing, board updates, game-over checks, PGN strings
+    return {
+        "games": games,
+        "plies": plies,
+        "wall": round(wall, 4),
+        "plies_per_s": round(plies / wall, 2) if wall > 0 else 0.0,
+        "ms_per_ply": {phase: round(1000 * seconds / max(plies, 1), 4) for phase, seconds in sorted(phases.items())},
+    }
+
+
+def case_name(mode, chess_config, max_moves):
+    engine = f"depth{chess_config.engine_depth}" if chess_config.engine_time is None else f"time{chess_config.engine_time}ms"
+    return f"{mode}/{engine}/{max_moves}moves"
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# last stored result of every case
+def previous_results(path):
+    previous = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                previous[record["case"]] = record
+    return previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of play_game against an instant synthetic model")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--depths", nargs="*", type=int, default=[1, 10], help="engine_depth values")
+    parser.add_argument("--times", nargs="*", type=int, default=[10], help="engine_time values (ms)")
+    parser.add_argument("--lengths", nargs="+", type=int, default=[10, 40], help="moves of the model before it resigns")
+    parser.add_argument("--games", type=int, default=3, help="games per case")
+    parser.add_argument("--engine-path", default=STOCKFISH_PATH)
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSONL file the results are appended to")
+    parser.add_argument("--max-slowdown", type=float, default=None,
+                        help="exit with an error if plies/s dropped by more than this fraction since the previous run")
+    args = parser.parse_args()
+
+    engines = [ChessEngineConfig(skill_level=20, engine_depth=depth, engine_path=args.engine_path) for depth in args.depths]
+    engines += [ChessEngineConfig(skill_level=20, engine_time=ms, engine_path=args.engine_path) for ms in args.times]
+
+    previous = previous_results(args.results)
+    meta = {"date": datetime.datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+            "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()}
+    pool = EnginePool(size=1, path=args.engine_path)
+    pool.checkin(pool.checkout(engines[0])) # Stockfish startup is not part of the first case
+    regressions = []
+    with tempfile.TemporaryDirectory() as output_dir, open(args.results, "a") as results:
+        for mode, chess_config, max_moves in itertools.product(args.modes, engines, args.lengths):
+            name = case_name(mode, chess_config, max_moves)
+            record = dict(case=name, **meta, **run_case(mode, chess_config, max_moves, args.games, pool, output_dir))
+            results.write(json.dumps(record) + "\n")
+            change = ""
+            if name in previous and previous[name]["plies_per_s"] > 0:
+                ratio = record["plies_per_s"] / previous[name]["plies_per_s"] - 1
+                change = f" ({ratio:+.0%} vs {previous[name]['commit']})"
+                if args.max_slowdown is not None and ratio < -args.max_slowdown:
+                    regressions.append(name)
+            phases = " ".join(f"{phase}={ms:.2f}" for phase, ms in record["ms_per_ply"].items())
+            print(f"{name:<32} {record['plies']:>5} plies {record['plies_per_s']:>9.1f} plies/s{change}  ms/ply: {phases}")
+    pool.close()
+
+    print(f"Results appended to {args.results}")
+    if regressions:
+        print(f"Slower than the previous run: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
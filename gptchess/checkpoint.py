@@ -0,0 +1,127 @@
+# Crash-safe checkpoints of a game in progress: after every ply, the state of the game (configuration, moves,
+# PGN, chat transcript, whose turn it is) is saved, so that a game killed at ply 120 (crash, timeout, Ctrl-C) goes
+# on from ply 120 with game.resume_game instead of replaying (and paying for) the whole game.
+# A checkpoint only saves what changed since the previous one (see Checkpointer): the new moves, the end of the
+# PGN, the new messages of the transcript and the values that changed, so that the cost of a checkpoint does not
+# grow with the game. The checkpoints of a game are the lines of checkpoint.jsonl in the game's directory (a line
+# cut by a crash is ignored; GAME_CHECKPOINT_FSYNC=1 to also sync them to disk at every ply); with a game store
+# (see game_store.py), they are rows of the store.
+# The files of the game stay buffered (see game_logger.py): the checkpoint records how many bytes of each file
+# had been logged, and on resume what was logged after the checkpoint is cut off, so that a ply is never logged
+# twice. Checkpoints can be turned off with GAME_CHECKPOINTS=0.
+#
+#   state = load_checkpoint("games_o3/game<uuid>")   # None if the game has no checkpoint
+#   is_finished("games_o3/game<uuid>")
+
+import json
+import os
+
+from game_logger import get_logger, get_game_store
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+CHECKPOINTS = os.getenv("GAME_CHECKPOINTS", "1") != "0"
+CHECKPOINT_FSYNC = os.getenv("GAME_CHECKPOINT_FSYNC", "0") == "1"
+
+# values of the state that only grow (lists, strings): a checkpoint saves what was added to them
+APPENDED = ("moves", "pgn", "transcript", "transcript_sans")
+
+
+def checkpoint_path(dir_name):
+    return os.path.join(dir_name, CHECKPOINT_FILE)
+
+# appends a checkpoint (what changed since the previous one, see Checkpointer) to those of the game;
+# new: first checkpoint of the game, the previous ones (of an earlier attempt) are dropped
+def save_checkpoint(dir_name, record, new=False):
+    store = get_game_store()
+    if store is not None:
+        store.save_checkpoint(dir_name, record, new)
+        return
+    with open(checkpoint_path(dir_name), "w" if new else "a") as f:
+        f.write(json.dumps(record) + "\n")
+        if CHECKPOINT_FSYNC:
+            f.flush()
+            os.fsync(f.fileno())
+
+# state of the game at its last checkpoint
+def fold_checkpoints(records):
+    state = {}
+    for record in records:
+        for key, value in record.items():
+            state[key] = state[key] + value if key in APPENDED and key in state else value
+    return state
+
+def load_checkpoint(dir_name):
+    store = get_game_store()
+    if store is not None:
+        records = store.load_checkpoint(dir_name)
+    else:
+        try:
+            with open(checkpoint_path(dir_name)) as f:
+                records = [record for record in map(parse_record, f) if record is not None]
+        except FileNotFoundError:
+            return None
+    return fold_checkpoints(records) if records else None
+
+# None for a line cut by a crash
+def parse_record(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+def is_finished(dir_name):
+    state = load_checkpoint(dir_name)
+    return state is not None and state["finished"]
+
+
+# Checkpoints of one game, each one with only what changed since the previous one; the first one saves the whole
+# state and drops the previous checkpoints (of an earlier attempt, a resumed game starts a fresh checkpoint.jsonl
+# without the line cut by the crash)
+class Checkpointer:
+
+    def __init__(self, dir_name):
+        self.dir_name = dir_name
+        self.saved = None
+
+    def save(self, state):
+        # a value of APPENDED that shrank (should not happen) is saved again with the whole state
+        if self.saved is None or any(len(state[key]) < self.saved.get(key, 0) for key in APPENDED if key in state):
+            save_checkpoint(self.dir_name, state, new=True)
+        else:
+            record = {}
+            for key, value in state.items():
+                if key in APPENDED:
+                    if len(value) > self.saved[key]:
+                        record[key] = value[self.saved[key]:]
+                elif key not in self.saved or self.saved[key] != value:
+                    record[key] = value
+            save_checkpoint(self.dir_name, record)
+        self.saved = {key: len(value) if key in APPENDED else value for key, value in state.items()}
+
+
+# bytes logged to each file of the game so far, to be saved with the checkpoint
+def logged_sizes(dir_name):
+    return dict(get_logger(dir_name).sizes)
+
+# cuts the files of the game back to their sizes at the checkpoint (files created after it are removed), and
+# returns the names of the files kept: what was still buffered when the game was killed is lost
+def restore_files(dir_name, sizes):
+    logger = get_logger(dir_name)
+    store = get_game_store()
+    if store is not None: # the files are those of the row written when the process stopped, if any
+        for file_name, text in (store.game_files(dir_name) or {}).items():
+            # metainformation.txt is written again, with the metadata (columns) of the row
+            if file_name in sizes and file_name != "metainformation.txt":
+                logger.write(file_name, text.encode()[:sizes[file_name]].decode(errors="ignore"))
+        return set(logger.sizes)
+    for file_name in os.listdir(dir_name):
+        if file_name.startswith(CHECKPOINT_FILE):
+            continue
+        path = os.path.join(dir_name, file_name)
+        if file_name not in sizes:
+            os.remove(path)
+            continue
+        size = min(os.path.getsize(path), sizes[file_name])
+        os.truncate(path, size)
+        logger.sizes[file_name] = size
+    return set(logger.sizes)
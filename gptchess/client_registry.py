@@ -0,0 +1,91 @@
+# One OpenAI client (and thus one HTTP connection pool, with keep-alive) per provider and per process, shared by
+# every game, grid script and move extraction instead of a new client (new TLS handshakes) per game or per call.
+# The pool and the timeouts can be tuned with $LLM_POOL_CONNECTIONS (connections open at the same time),
+# $LLM_POOL_KEEPALIVE (idle connections kept), $LLM_KEEPALIVE_EXPIRY, $LLM_TIMEOUT and $LLM_CONNECT_TIMEOUT (seconds).
+# Clients do not retry by themselves: retries belong to the request scheduler (see request_scheduler.py).
+#
+#   client = get_client(*credentials(use_deepseek=False, base_url=None))
+#   client = get_async_client(api_key, base_url)   # one per event loop; await close_async_clients() at the end
+
+import asyncio
+import os
+import threading
+from dataclasses import dataclass
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    max_connections: int = int(os.getenv("LLM_POOL_CONNECTIONS", "100"))
+    max_keepalive_connections: int = int(os.getenv("LLM_POOL_KEEPALIVE", "20"))
+    keepalive_expiry: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+    timeout: float = float(os.getenv("LLM_TIMEOUT", "600")) # o-series answers can take minutes
+    connect_timeout: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+
+    def limits(self):
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive_connections,
+                            keepalive_expiry=self.keepalive_expiry)
+
+    def timeouts(self):
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+# (api_key, base_url) of a provider: DeepSeek, or OpenAI (or a local server such as replay_server.py, which needs no key)
+def credentials(use_deepseek=False, base_url=None):
+    if use_deepseek:
+        api_key = os.getenv('DEEPSEEK_API_KEY')
+        if not api_key:
+            raise ValueError("DEEPSEEK_API_KEY environment variable not set")
+        return api_key, base_url or DEEPSEEK_BASE_URL
+
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key and not base_url:
+        raise ValueError("OPENAI_API_KEY environment variable not set")
+    return api_key or "none", base_url
+
+
+_clients = {}
+_async_clients = {}
+_lock = threading.Lock()
+
+def client_key(api_key, base_url, pool):
+    return api_key, str(base_url or os.getenv("OPENAI_BASE_URL") or ""), pool
+
+def get_client(api_key=None, base_url=None, pool: PoolConfig = None) -> OpenAI:
+    pool = pool or PoolConfig()
+    key = client_key(api_key, base_url, pool)
+    with _lock:
+        if key not in _clients:
+            _clients[key] = OpenAI(api_key=api_key, base_url=base_url, max_retries=0, timeout=pool.timeouts(),
+                                   http_client=DefaultHttpxClient(limits=pool.limits(), timeout=pool.timeouts()))
+        return _clients[key]
+
+# the connections of an async client belong to the event loop that opened them: one client per loop
+def get_async_client(api_key=None, base_url=None, pool: PoolConfig = None) -> AsyncOpenAI:
+    pool = pool or PoolConfig()
+    key = (asyncio.get_running_loop(),) + client_key(api_key, base_url, pool)
+    with _lock:
+        if key not in _async_clients:
+            _async_clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0, timeout=pool.timeouts(),
+                                              http_client=DefaultAsyncHttpxClient(limits=pool.limits(), timeout=pool.timeouts()))
+        return _async_clients[key]
+
+def close_clients():
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+# closes the async clients of the running event loop
+async def close_async_clients():
+    loop = asyncio.get_running_loop()
+    with _lock:
+        keys = [key for key in _async_clients if key[0] is loop]
+        clients = [_async_clients.pop(key) for key in keys]
+    for client in clients:
+        await client.close()
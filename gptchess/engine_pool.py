@@ -0,0 +1,80 @@
+import threading
+from contextlib import contextmanager
+
+from stockfish import Stockfish
+
+from game import ChessEngineConfig, STOCKFISH_PATH, configure_engine
+
+
+# Pool of long-lived Stockfish processes shared by games (thread-safe).
+# Starting Stockfish (and loading its NNUE network) costs more than a short game, so a game checks out an
+# already running engine, which is reset with `ucinewgame` and reconfigured for the game (see configure_engine),
+# and gives it back at the end of the game.
+#
+#   pool = EnginePool(size=4)
+#   with pool.engine(chess_config) as stockfish:
+#       ...
+class EnginePool:
+
+    def __init__(self, size=4, path=STOCKFISH_PATH):
+        self.size = size # maximum number of Stockfish processes
+        self.path = path
+        self._idle = []
+        self._nengines = 0
+        self._cond = threading.Condition()
+
+    # blocks until an engine is available (at most `size` engines are running)
+    def checkout(self, chess_config: ChessEngineConfig):
+        if chess_config.engine_path != self.path:
+            raise ValueError(f"engine pool runs {self.path}, not {chess_config.engine_path}")
+
+        with self._cond:
+            while not self._idle and self._nengines >= self.size:
+                self._cond.wait()
+            stockfish = self._idle.pop() if self._idle else None
+            if stockfish is None:
+                self._nengines += 1
+
+        if stockfish is None:
+            try:
+                stockfish = Stockfish(self.path, depth=chess_config.engine_depth)
+            except BaseException:
+                self._discard()
+                raise
+
+        try:
+            configure_engine(stockfish, chess_config)
+        except BaseException:
+            self._discard()
+            raise
+        return stockfish
+
+    # broken=True when the game failed: the engine may be in the middle of a search, so it is not reused
+    def checkin(self, stockfish, broken=False):
+        if broken:
+            self._discard()
+            return
+        with self._cond:
+            self._idle.append(stockfish)
+            self._cond.notify()
+
+    def _discard(self):
+        with self._cond:
+            self._nengines -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def engine(self, chess_config: ChessEngineConfig):
+        stockfish = self.checkout(chess_config)
+        try:
+            yield stockfish
+        except BaseException:
+            self.checkin(stockfish, broken=True)
+            raise
+        self.checkin(stockfish)
+
+    # idle engines quit when they are garbage collected (Stockfish.__del__ sends `quit`)
+    def close(self):
+        with self._cond:
+            self._nengines -= len(self._idle)
+            self._idle.clear()
@@ -0,0 +1,802 @@
+
+import io
+import json
+import random
+import time
+from contextlib import contextmanager
+from stockfish import Stockfish
+
+import os
+from openai import OpenAI
+import chess
+import chess.pgn
+from dataclasses import dataclass, asdict
+
+from parsing_moves_gpt import extract_move_chatgpt, extract_move_deepseek
+from transcript import ChatTranscript, move_str
+from prompt_strategy import make_prompt_strategy
+from llm_cache import get_cache
+from request_scheduler import scheduled
+from client_registry import get_client, credentials
+from game_logger import get_logger, close_logger, get_game_store, DEBUG, INFO
+from checkpoint import Checkpointer, load_checkpoint, logged_sizes, restore_files, CHECKPOINTS
+from ponder import Ponderer
+
+import uuid
+
+from typing import Optional
+
+# TODO: The 'openai.organization' option isn't read in the client API. You will need to pass it when you instantiate the client, e.g. 'OpenAI(organization="")'
+# openai.organization = ""
+
+BASE_PGN = """[Event "FIDE World Championship Match 2024"]
+[Site "Los Angeles, USA"]
+[Date "2024.12.01"]
+[Round "5"]
+[White "Carlsen, Magnus"]
+[Black "Nepomniachtchi, Ian"]
+[Result "1-0"]
+[WhiteElo "2885"]
+[WhiteTitle "GM"]
+[WhiteFideId "1503014"]
+[BlackElo "2812"]
+[BlackTitle "GM"]
+[BlackFideId "4168119"]
+[TimeControl "40/7200:20/3600:900+30"]
+[UTCDate "2024.11.27"]
+[UTCTime "09:01:25"]
+[Variant "Standard"]
+
+1."""
+
+BASE_PGN_BLACK = """[Event "FIDE World Championship Match 2024"]
+[Site "Los Angeles, USA"]
+[Date "2024.12.01"]
+[Round "5"]
+[White "Nepomniachtchi, Ian"]
+[Black "Carlsen, Magnus"]
+[Result "0-1"]
+[WhiteElo "2812"]
+[WhiteTitle "GM"]
+[WhiteFideId "1503014"]
+[BlackElo "2885"]
+[BlackTitle "GM"]
+[BlackFideId "4168119"]
+[TimeControl "40/7200:20/3600:900+30"]
+[UTCDate "2024.11.27"]
+[UTCTime "09:01:25"]
+[Variant "Standard"]
+
+1."""
+
+
+OUTPUT_DIR = "games_o3/"
+PLIES_FILE = "plies.jsonl"
+
+def setup_directory(output_dir=OUTPUT_DIR):
+    dir_name = os.path.join(output_dir, "game" + str(uuid.uuid4()))
+    if get_game_store() is None: # with a game store, the game is a row of the store (see game_store.py)
+        os.makedirs(dir_name, exist_ok=True)
+    return dir_name
+
+# log.txt, session.txt and plies.jsonl are buffered until the end of the game (see game_logger.py)
+def log_msg(dir_name, message, level=INFO):
+    get_logger(dir_name).log(message, level)
+
+def log_enabled(dir_name, level):
+    return get_logger(dir_name).is_enabled(level)
+
+def record_session(dir_name, prompt, response, system_role_message = None):
+    get_logger(dir_name).session(prompt, response, system_role_message)
+
+# Stockfish binary (eg "./stockfish/stockfish/stockfish-ubuntu-x86-64-avx2" on Linux)
+STOCKFISH_PATH = os.getenv("STOCKFISH_PATH", "/opt/homebrew/bin/stockfish")
+
+@dataclass
+class ChessEngineConfig:
+    skill_level: int
+    engine_depth: int = 20
+    engine_time: int = None
+    random_engine: bool = False
+    engine_path: str = STOCKFISH_PATH
+    engine_hash: int = 16 # MB
+    engine_threads: int = 1
+    ponder_moves: int = 0 # likely moves of GPT whose replies are searched while GPT thinks (see ponder.py), 0: no pondering
+
+@dataclass
+class GPTConfig:
+    temperature: float = 0
+    max_tokens: int = 4
+    chat_gpt: bool = False
+    system_role_message: str = None
+    model_gpt: str = "gpt-3.5-turbo-instruct"
+    use_deepseek: bool = False
+    base_url: str = None  # Only needed for non-OpenAI APIs or a local server (replay_server.py); default: $OPENAI_BASE_URL or OpenAI
+    oseries : bool = False
+    reasoning_effort: str = "low"
+    prompt_strategy: str = "full" # "full", "window" or "compressed" (see prompt_strategy.py)
+    prompt_window: int = 20 # number of plies kept by the "window" strategy
+    cache_path: Optional[str] = None # SQLite cache of the temperature 0 responses (see llm_cache.py), None: no cache
+
+# the client of the provider, shared by all the games of the process (see client_registry.py)
+def create_ai_client(gpt_config: GPTConfig) -> OpenAI:
+    return get_client(*credentials(gpt_config.use_deepseek, gpt_config.base_url))
+
+def save_metainformation_experiment(dir_name, chess_config: ChessEngineConfig, gpt_config: GPTConfig, base_pgn, nmove, white_piece, engine_parameters):
+    with io.StringIO() as metainformation_file:
+        # Basic model info
+        metainformation_file.write(f"model_gpt: {gpt_config.model_gpt}\n")
+        metainformation_file.write(f"use_deepseek: {gpt_config.use_deepseek}\n")
+        metainformation_file.write(f"base_url: {gpt_config.base_url if gpt_config.base_url else 'None'}\n")
+
+        # Chess engine configuration
+        metainformation_file.write(f"skill_level: {chess_config.skill_level}\n")
+        metainformation_file.write(f"random_engine: {chess_config.random_engine}\n")
+        metainformation_file.write(f"white_piece: {white_piece}\n")
+        metainformation_file.write(f"engine_depth: {chess_config.engine_depth}\n")
+        metainformation_file.write(f"engine_time: {chess_config.engine_time}\n")
+
+        # Game configuration
+        metainformation_file.write(f"base_pgn: {base_pgn}\n")
+        metainformation_file.write(f"nmove: {nmove}\n")
+        metainformation_file.write(f"engine_parameters: {engine_parameters}\n")
+
+        # Model parameters
+        metainformation_file.write(f"temperature: {gpt_config.temperature}\n")
+        metainformation_file.write(f"max_tokens: {gpt_config.max_tokens}\n")
+        metainformation_file.write(f"chat_gpt: {gpt_config.chat_gpt}\n")
+        metainformation_file.write(f"system_role_message: {gpt_config.system_role_message if gpt_config.system_role_message else 'None'}\n")
+        metainformation_file.write(f"reasoning_effort: {gpt_config.reasoning_effort}\n")
+        metainformation_file.write(f"prompt_strategy: {gpt_config.prompt_strategy}\n")
+        metainformation_file.write(f"prompt_window: {gpt_config.prompt_window}\n")
+
+        logger = get_logger(dir_name)
+        logger.write("metainformation.txt", metainformation_file.getvalue())
+        logger.metadata.update(asdict(chess_config), **asdict(gpt_config), white_piece=white_piece, nmove=nmove,
+                               base_pgn=base_pgn, engine_parameters=str(engine_parameters))
+
+
+
+
+# based on https://github.com/official-stockfish/Stockfish/issues/3635#issuecomment-1159552166
+def skill_to_elo(n):
+    correspondence_table = {
+        0: 1347,
+        1: 1490,
+        2: 1597,
+        3: 1694,
+        4: 1785,
+        5: 1871,
+        6: 1954,
+        7: 2035,
+        8: 2113,
+        9: 2189,
+        10: 2264,
+        11: 2337,
+        12: 2409,
+        13: 2480,
+        14: 2550,
+        15: 2619,
+        16: 2686,
+        17: 2754,
+        18: 2820,
+        19: 2886,
+        20: 3000, # rough estimate
+    }
+
+    if n in correspondence_table:
+        return correspondence_table[n]
+    else:
+        raise ValueError("Input should be between 0 and 19 inclusive.")
+
+
+
+
+# Initial prompt of the game: a natural language opening for DeepSeek/o-series, the PGN headers otherwise
+def initial_pgn(gpt_config: GPTConfig, base_pgn, nmove, white_piece):
+    if gpt_config.use_deepseek or gpt_config.oseries:
+        return ("1. " if nmove != 1 else "") + ("Let's play a chess game. You start!" if white_piece and nmove == 1 else "") # TODO: black piece
+    return base_pgn
+
+# Which endpoint to call and with which arguments, for the prompt: a string (completion) or messages (chat)
+# returns (kind, kwargs) with kind in "responses" (o-series), "chat" or "completions"
+def model_request(gpt_config: GPTConfig, prompt, model=None):
+    model = model or gpt_config.model_gpt
+    if gpt_config.chat_gpt:
+        if gpt_config.oseries:
+            return "responses", dict(
+                model=model,                    # "o3"
+                reasoning={"effort": gpt_config.reasoning_effort},
+                input=prompt
+                # max_tokens=max_tokens,
+                #previous_response_id=previous_response_id
+            )
+        return "chat", dict(model=model,
+                            messages=prompt,
+                            temperature=gpt_config.temperature,
+                            max_tokens=gpt_config.max_tokens)
+    return "completions", dict(model=model,
+                               prompt=prompt,
+                               temperature=gpt_config.temperature,
+                               max_tokens=gpt_config.max_tokens)
+
+def model_endpoint(ai_client, kind):
+    if kind == "responses":
+        return ai_client.responses.create
+    if kind == "chat":
+        return ai_client.chat.completions.create
+    return ai_client.completions.create
+
+# calls go through the scheduler of the provider (budgets, retries, see request_scheduler.py); cache hits do not
+def call_model(ai_client, kind, kwargs, cache=None):
+    create = scheduled(ai_client, model_endpoint(ai_client, kind))
+    if cache is not None:
+        return cache.call(ai_client, kind, kwargs, create)
+    return create(**kwargs)
+
+def response_text(gpt_config: GPTConfig, response):
+    if gpt_config.chat_gpt:
+        if gpt_config.oseries:
+            return response.output_text.strip()
+        return response.choices[0].message.content
+    return response.choices[0].text # completion
+
+# Extract the SAN move out of the raw response (and log it)
+def extract_san(gpt_config: GPTConfig, resp, response, dir_name):
+    if gpt_config.chat_gpt:
+        if gpt_config.use_deepseek or gpt_config.oseries:
+            # First try to get the move directly from DeepSeek's response
+            san_move = extract_move_deepseek(resp)
+            if not gpt_config.oseries: # TODO: summary
+                reasoning_content = response.choices[0].message.reasoning_content  # Log reasoning content
+                log_msg(dir_name, f"DeepSeek response: {resp}, \nExtracted move: {san_move}\nReasoning: {reasoning_content}")  # Log reasoning content
+        else:
+            san_move = extract_move_chatgpt(resp)
+        log_msg(dir_name, "SAN MOVE: " + resp + " " + str(san_move))
+    else:
+        san_move = resp.strip().split()[0]
+    return san_move
+
+# Move of the opponent (Stockfish or random engine), in UCI notation
+def engine_move(stockfish, board, chess_config: ChessEngineConfig):
+    if chess_config.random_engine:
+        # random move: choose a random move from the list of legal moves
+        legal_moves = board.legal_moves
+        # pick a random one among legal_moves
+        return random.choice(list(legal_moves)).uci()
+    if chess_config.engine_time is None:
+        return stockfish.get_best_move()
+    return stockfish.get_best_move_time(chess_config.engine_time)
+
+# (move, seconds spent searching it), timed where the search runs (eg in the engine thread of async games)
+def timed_engine_move(stockfish, board, chess_config: ChessEngineConfig):
+    start = time.perf_counter()
+    uci_move = engine_move(stockfish, board, chess_config)
+    return uci_move, time.perf_counter() - start
+
+# (move, seconds, pondered): the reply searched while GPT was thinking if GPT played one of the candidates of the
+# ponderer (the seconds are then the wait for the end of its search), otherwise a search of the engine of the game
+def timed_engine_reply(stockfish, board, chess_config: ChessEngineConfig, ponderer=None):
+    if ponderer is not None:
+        start = time.perf_counter()
+        uci_move = ponderer.reply(board)
+        if uci_move is not None:
+            return uci_move, time.perf_counter() - start, True
+    return timed_engine_move(stockfish, board, chess_config) + (False,)
+
+# Token counts (prompt, completion, reasoning) reported by the API, None when not reported
+# (usage.input_tokens/output_tokens for the responses endpoint of the o-series)
+def response_usage(response):
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None, None, None
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    if prompt_tokens is None:
+        prompt_tokens = getattr(usage, "input_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if completion_tokens is None:
+        completion_tokens = getattr(usage, "output_tokens", None)
+    details = getattr(usage, "completion_tokens_details", None) or getattr(usage, "output_tokens_details", None)
+    return prompt_tokens, completion_tokens, getattr(details, "reasoning_tokens", None)
+
+# Per-ply events, one JSON record per line in plies.jsonl (see analyze_plies.py)
+def record_ply(dir_name, event):
+    get_logger(dir_name).write(PLIES_FILE, json.dumps(event) + "\n")
+
+def record_llm_ply(dir_name, gpt_config: GPTConfig, ply, kwargs, response, resp, san_move, legal, api_seconds):
+    prompt_tokens, completion_tokens, reasoning_tokens = response_usage(response)
+    record_ply(dir_name, {
+        "ply": ply,
+        "player": "llm",
+        "model": kwargs["model"],
+        "reasoning_effort": gpt_config.reasoning_effort if gpt_config.oseries else None,
+        "api_seconds": round(api_seconds, 4),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "reasoning_tokens": reasoning_tokens,
+        "response": resp,
+        "move": san_move,
+        "legal": legal,
+    })
+
+def record_engine_ply(dir_name, ply, san_move, engine_seconds, pondered=False):
+    record_ply(dir_name, {"ply": ply, "player": "engine", "engine_seconds": round(engine_seconds, 4), "move": san_move, "pondered": pondered})
+
+# size: (number of messages, characters, tokens) of the request, see prompt_strategy.prompt_size
+def log_request_size(dir_name, size):
+    log_msg(dir_name, "REQUEST SIZE: {} messages, {} chars, ~{} tokens".format(*size))
+
+def is_draw(board):
+    return board.is_stalemate() or board.is_insufficient_material() or board.is_fivefold_repetition() or board.is_seventyfive_moves()
+
+# Add the last exchange (GPT's response, then the engine's move) to the chat transcript
+def append_chat_turn(transcript: ChatTranscript, board, resp, gpt_config: GPTConfig, pgn, nmove, white_piece, dir_name):
+    nmessages = len(transcript) # only the new messages are logged
+    if gpt_config.use_deepseek or gpt_config.oseries:
+        # For DeepSeek, use a more natural language prompt
+        if nmove == 1 and white_piece is False:
+            resp = "The chess game has started and you have black pieces. I play first with the move 1." + pgn + " It's now your turn!"
+        if nmove != 1 and white_piece is False:
+            resp = ""
+        transcript.append("assistant", resp)
+        san_move = extract_move_deepseek(resp)
+
+        last_move_str = move_str(board)[1]
+
+        transcript.append("user", last_move_str)
+        log_msg(dir_name, f"DeepSeek response: {resp}, extracted move: {san_move}")
+    else:
+        # ChatGPT: only the two new moves, GPT's own move (as assistant) and the reply of the engine (as user)
+        if resp is not None:
+            transcript.add_move(board, "assistant", back=2)
+        transcript.add_move(board, "user")
+
+    log_msg(dir_name, str(transcript.messages[nmessages:]))
+
+# Write the final PGN of the game (with players, Elo and the possible illegal move) into the game's directory
+def save_game(board, dir_name, chess_config: ChessEngineConfig, gpt_config: GPTConfig, white_piece, unknown_san):
+    model_gpt = gpt_config.model_gpt
+    skill_level = chess_config.skill_level
+    random_engine = chess_config.random_engine
+
+    game = chess.pgn.Game.from_board(board)
+    if random_engine and white_piece:
+        game.headers["Event"] = "{} vs {}".format(model_gpt, "RANDOM chess engine")
+        game.headers["White"] = "{}".format(model_gpt)
+        game.headers["Black"] = "{}".format("RANDOM chess engine")
+        game.headers["WhiteElo"] = "?"
+        game.headers["BlackElo"] = "?"
+    elif random_engine and not white_piece:
+        game.headers["Event"] = "{} vs {}".format("RANDOM chess engine", model_gpt)
+        game.headers["White"] = "{}".format("RANDOM chess engine")
+        game.headers["Black"] = "{}".format(model_gpt)
+        game.headers["WhiteElo"] = "?"
+        game.headers["BlackElo"] = "?"
+    elif white_piece:
+        game.headers["Event"] = "{} vs Stockfish".format(model_gpt)
+        game.headers["White"] = "{}".format(model_gpt)
+        game.headers["Black"] = "Stockfish"
+        game.headers["WhiteElo"] = "?"
+        game.headers["BlackElo"] = str(skill_to_elo(skill_level))
+    else:
+        game.headers["Event"] = "{} vs Stockfish".format(model_gpt)
+        game.headers["White"] = "Stockfish"
+        game.headers["Black"] = "{}".format(model_gpt)
+        game.headers["WhiteElo"] = str(skill_to_elo(skill_level))
+        game.headers["BlackElo"] = "?"
+
+    if unknown_san is not None:
+        game.headers["UnknownSAN"] = unknown_san
+
+
+
+    # export game as PGN string
+    pgn_final = game.accept(chess.pgn.StringExporter())
+
+    # At the end of play_game(), write the PGN to the game.pgn file inside the game's directory
+    logger = get_logger(dir_name)
+    logger.write("game.pgn", pgn_final + "\n")
+    logger.metadata.update(result=game.headers["Result"], unknown_san=unknown_san, nplies=len(board.move_stack))
+
+
+# (Re)configure a Stockfish process for a new game: engine options, depth, skill level, and a fresh start position
+# (which sends `ucinewgame`, so nothing from a previous game is kept)
+def configure_engine(stockfish, chess_config: ChessEngineConfig):
+    parameters = stockfish.get_parameters()
+    if parameters["Hash"] != chess_config.engine_hash or parameters["Threads"] != chess_config.engine_threads:
+        stockfish.update_engine_parameters({"Hash": chess_config.engine_hash, "Threads": chess_config.engine_threads})
+    stockfish.set_depth(chess_config.engine_depth)
+    # stockfish.set_elo_rating(engine_elo)
+    stockfish.set_skill_level(chess_config.skill_level)
+    stockfish.set_position([])
+
+def new_engine(chess_config: ChessEngineConfig):
+    stockfish = Stockfish(chess_config.engine_path, depth=chess_config.engine_depth)
+    configure_engine(stockfish, chess_config)
+    return stockfish
+
+# Ponderer of a game (see ponder.py) on an engine of its own, from engine_pool if given; None without pondering.
+# executor: runs the searches of the ponderer (a thread of its own if None)
+def new_ponderer(chess_config: ChessEngineConfig, engine_pool=None, executor=None):
+    if chess_config.ponder_moves <= 0 or chess_config.random_engine:
+        return None
+    stockfish = new_engine(chess_config) if engine_pool is None else engine_pool.checkout(chess_config)
+    return Ponderer(stockfish, lambda engine: engine_move(engine, None, chess_config), chess_config.ponder_moves, executor=executor)
+
+def close_ponderer(ponderer, engine_pool=None):
+    if ponderer is None:
+        return
+    ponderer.close()
+    if engine_pool is not None:
+        engine_pool.checkin(ponderer.stockfish, broken=ponderer.broken)
+
+@contextmanager
+def pondering(chess_config: ChessEngineConfig, engine_pool=None):
+    ponderer = new_ponderer(chess_config, engine_pool)
+    try:
+        yield ponderer
+    finally:
+        close_ponderer(ponderer, engine_pool)
+
+
+# Checkpoint of the game after a ply (see checkpoint.py, only what changed since the previous one is saved);
+# llm_to_move: the next ply is GPT's
+def checkpoint_game(checkpointer: Checkpointer, chess_config: ChessEngineConfig, gpt_config: GPTConfig, base_pgn, nmove, white_piece, board,
+                    pgn, n, resp, transcript: ChatTranscript, llm_to_move, finished=False):
+    if not CHECKPOINTS:
+        return
+    dir_name = checkpointer.dir_name
+    if finished: # the files of the game are written (or stored) before it is marked as finished
+        close_logger(dir_name)
+    checkpointer.save({
+        "chess_config": asdict(chess_config),
+        "gpt_config": asdict(gpt_config),
+        "base_pgn": base_pgn,
+        "nmove": nmove,
+        "white_piece": white_piece,
+        "moves": [move.uci() for move in board.move_stack],
+        "fen": board.fen(),
+        "pgn": pgn,
+        "n": n,
+        "resp": resp,
+        "transcript": transcript.messages,
+        "transcript_sans": transcript.sans,
+        "llm_to_move": llm_to_move,
+        "finished": finished,
+        "files": {} if finished else logged_sizes(dir_name),
+    })
+
+# board of a checkpoint (see checkpoint_game)
+def restore_board(dir_name, state):
+    board = chess.Board()
+    for uci in state["moves"]:
+        board.push_uci(uci)
+    if board.fen() != state["fen"]:
+        raise ValueError(f"checkpoint of {dir_name}: moves do not lead to {state['fen']}")
+    return board
+
+def restore_transcript(messages, sans, model):
+    transcript = ChatTranscript(messages[0]["content"], model)
+    for message in messages[1:]:
+        transcript.append(message["role"], message["content"])
+    transcript.sans = list(sans)
+    return transcript
+
+
+# TODO: chess engine: SF, random, Leela, etc.
+
+# ELO: Elo rating of the SF engine
+# RANDOM_ENGINE: if True, GPT plays against a random engine (not Stockfish)
+# model_gpt: GPT model to use
+# nmove = number of move when the game starts:
+# dir_name = game folder to write into (a fresh one under games_o3/ by default)
+# engine_pool = EnginePool (see engine_pool.py) to borrow a running Stockfish from, instead of starting a new process
+# ai_client = OpenAI client (or a stand-in with the same endpoints, see bench.py); created from gpt_config if None
+# state = checkpoint of the game to go on with (see resume_game), None for a new game
+def play_game(chess_config: ChessEngineConfig, gpt_config: GPTConfig, base_pgn=BASE_PGN, nmove=1, white_piece=True, dir_name=None, engine_pool=None, ai_client=None, state=None):
+# def play_game(skill_level, base_pgn=BASE_PGN, nmove=1, random_engine = False, model_gpt = "gpt-3.5-turbo-instruct", white_piece=True, engine_depth=20, engine_time=None, temperature=0, max_tokens=4, chat_gpt=False, system_role_message = None):
+    if dir_name is None:
+        dir_name = setup_directory()
+    try:
+        with pondering(chess_config, engine_pool) as ponderer:
+            if engine_pool is None:
+                return play_game_with_engine(new_engine(chess_config), chess_config, gpt_config, base_pgn, nmove, white_piece, dir_name, ai_client, state, ponderer)
+            with engine_pool.engine(chess_config) as stockfish:
+                return play_game_with_engine(stockfish, chess_config, gpt_config, base_pgn, nmove, white_piece, dir_name, ai_client, state, ponderer)
+    finally:
+        close_logger(dir_name)
+
+# Goes on with the game of dir_name from its last checkpoint (see checkpoint.py): the board, the Stockfish position,
+# the PGN and the transcript are rebuilt, and the game is played to the end as play_game would have.
+# Returns the final PGN, or None if the game was already finished.
+def resume_game(dir_name, engine_pool=None, ai_client=None):
+    state = load_checkpoint(dir_name)
+    if state is None:
+        raise ValueError(f"no checkpoint in {dir_name}")
+    if state["finished"]:
+        return None
+    return play_game(ChessEngineConfig(**state["chess_config"]), GPTConfig(**state["gpt_config"]), state["base_pgn"], state["nmove"],
+                     state["white_piece"], dir_name, engine_pool, ai_client, state)
+
+# Requests of the game core (see game_plies) to the driver that plays it (play_game_with_engine, or the async
+# driver of async_game.py): the core decides what happens in the game, the driver only performs the I/O
+@dataclass
+class ModelCall:
+    kind: str # endpoint, see model_request
+    kwargs: dict
+
+@dataclass
+class EngineCall:
+    fn: object # blocking Stockfish call, fn(*args)
+    args: tuple = ()
+
+# stockfish: a Stockfish process already configured for chess_config (see configure_engine)
+# state: checkpoint of the game to go on with (see resume_game), None for a new game
+# ponderer: searches the replies to the likely moves of GPT during its requests (see pondering), None: no pondering
+def play_game_with_engine(stockfish, chess_config: ChessEngineConfig, gpt_config: GPTConfig, base_pgn=BASE_PGN, nmove=1, white_piece=True, dir_name=None, ai_client=None, state=None, ponderer=None):
+    # Create AI client at the start of the function
+    if ai_client is None:
+        ai_client = create_ai_client(gpt_config)
+    cache = get_cache(gpt_config.cache_path) if gpt_config.cache_path else None
+
+    if dir_name is None:
+        dir_name = setup_directory()
+
+    plies = game_plies(stockfish, chess_config, gpt_config, base_pgn, nmove, white_piece, dir_name, state, ponderer)
+    result = None
+    while True:
+        try:
+            call = plies.send(result)
+        except StopIteration as stop:
+            return stop.value
+        if isinstance(call, ModelCall):
+            result = call_model(ai_client, call.kind, call.kwargs, cache)
+        else:
+            result = call.fn(*call.args)
+
+# The game itself, shared by the sync and async drivers: a generator that yields a ModelCall or an EngineCall
+# whenever it needs a response of GPT or the result of a Stockfish call, is sent back the result, and returns
+# the final PGN (None if the first move of GPT is an unknown SAN)
+def game_plies(stockfish, chess_config: ChessEngineConfig, gpt_config: GPTConfig, base_pgn, nmove, white_piece, dir_name, state=None, ponderer=None):
+
+    # Initialize pgn differently for DeepSeek
+    pgn = initial_pgn(gpt_config, base_pgn, nmove, white_piece)
+
+    skill_level = chess_config.skill_level
+
+    chat_gpt = gpt_config.chat_gpt
+    system_role_message = gpt_config.system_role_message
+    model_gpt = gpt_config.model_gpt
+
+    engine_parameters = yield EngineCall(stockfish.get_parameters)
+    # on resume, what was logged after the checkpoint is cut off (it is played again)
+    if state is None or "metainformation.txt" not in restore_files(dir_name, state["files"]):
+        save_metainformation_experiment(dir_name, chess_config, gpt_config, pgn, nmove, white_piece, engine_parameters)
+
+    board = chess.Board()
+    if state is not None:
+        board = restore_board(dir_name, state)
+        yield EngineCall(stockfish.set_position, (state["moves"],))
+    elif nmove > 1: # if nmove > 1, we need to load the PGN
+        # load a PGN file
+        g = chess.pgn.read_game(io.StringIO(base_pgn))
+        board = g.end().board()
+        yield EngineCall(stockfish.set_position, ([str(m) for m in g.mainline_moves()],))
+
+    n = nmove
+
+    unknown_san = None # can be the case that GPT plays an unknown SAN (invalid move)
+    resp = None # last response of GPT (none yet if GPT plays black)
+
+    prompt_strategy = make_prompt_strategy(gpt_config, base_pgn, board)
+
+    # Initialize the chat transcript outside the conditional block
+    transcript = ChatTranscript(system_role_message, model_gpt)
+
+    if state is not None:
+        pgn, n, resp = state["pgn"], state["n"], state["resp"]
+        transcript = restore_transcript(state["transcript"], state["transcript_sans"], model_gpt)
+        llm_to_move = state["llm_to_move"]
+        log_msg(dir_name, f"Resumed at ply {len(board.move_stack) + 1}")
+    else:
+        llm_to_move = False
+
+        if len(board.move_stack) == 0:
+            transcript.append("user", pgn)
+        else:
+            # Get the last move in SAN notation directly from the move stack
+            transcript.append("user", move_str(board)[1])
+
+    checkpointer = Checkpointer(dir_name)
+    def checkpoint(llm_to_move, finished=False):
+        checkpoint_game(checkpointer, chess_config, gpt_config, base_pgn, nmove, white_piece, board, pgn, n, resp, transcript, llm_to_move, finished)
+
+    # If GPT plays as white, it should make the first move.
+    if white_piece and state is None:
+
+
+        # Ensure the last message is a user message
+        if chat_gpt:
+            # Set the last message to user if it's chat_gpt
+            transcript.replace_last("user", pgn)
+        prompt = prompt_strategy.build(pgn, transcript, board)
+        log_request_size(dir_name, prompt_strategy.size(prompt, transcript))
+        kind, kwargs = model_request(gpt_config, prompt, model="deepseek-reasoner" if gpt_config.use_deepseek else model_gpt)
+        if ponderer is not None:
+            ponderer.start(board)
+        start = time.perf_counter()
+        response = yield ModelCall(kind, kwargs)
+        api_seconds = time.perf_counter() - start
+        resp = response_text(gpt_config, response)
+
+        record_session(dir_name, prompt if isinstance(prompt, str) else pgn, resp)
+
+        san_move = extract_san(gpt_config, resp, response, dir_name)
+        ply = len(board.move_stack) + 1
+
+        try:
+            move = board.push_san(san_move)
+        except Exception:
+            log_msg(dir_name, "unknown san: {}".format(san_move))
+            record_llm_ply(dir_name, gpt_config, ply, kwargs, response, resp, san_move, False, api_seconds)
+            # perhaps add a PGN comment with the unknown SAN
+            unknown_san = san_move
+            checkpoint(False, finished=True)
+            return
+
+        record_llm_ply(dir_name, gpt_config, ply, kwargs, response, resp, san_move, True, api_seconds)
+        prompt_strategy.add_last_move(board)
+        uci_move = move.uci()
+        pgn += f" {san_move}"
+
+        yield EngineCall(stockfish.make_moves_from_current_position, ([f"{uci_move}"],))
+        log_msg(dir_name, move_str(board)[1])
+        log_msg(dir_name, pgn, DEBUG)
+        checkpoint(False)
+
+    while True:
+
+        if not llm_to_move: # a game resumed before a move of GPT goes straight to it
+            uci_move, engine_seconds, pondered = yield EngineCall(timed_engine_reply, (stockfish, board, chess_config, ponderer))
+
+            move = chess.Move.from_uci(uci_move)
+
+            san_move = board.san(move)
+            board.push(move)
+            record_engine_ply(dir_name, len(board.move_stack), san_move, engine_seconds, pondered)
+            prompt_strategy.add_last_move(board)
+            pgn += f" {san_move}"
+
+
+            yield EngineCall(stockfish.make_moves_from_current_position, ([f"{uci_move}"],))
+            log_msg(dir_name, move_str(board)[1])
+            log_msg(dir_name, pgn, DEBUG)
+
+            if board.is_checkmate():
+                log_msg(dir_name, "Stockfish" + str(skill_to_elo(skill_level)) + "ELO won!")
+                break
+
+            if is_draw(board):
+                log_msg(dir_name, "Draw!")
+                break
+
+            if white_piece:
+                n += 1
+                pgn += f" {n}."
+
+
+            if chat_gpt:
+                append_chat_turn(transcript, board, resp, gpt_config, pgn, nmove, white_piece, dir_name)
+
+            checkpoint(True)
+        llm_to_move = False
+
+        prompt = prompt_strategy.build(pgn, transcript, board)
+        log_request_size(dir_name, prompt_strategy.size(prompt, transcript))
+        kind, kwargs = model_request(gpt_config, prompt)
+        if ponderer is not None:
+            ponderer.start(board)
+        start = time.perf_counter()
+        response = yield ModelCall(kind, kwargs)
+        api_seconds = time.perf_counter() - start
+        resp = response_text(gpt_config, response)
+
+        record_session(dir_name, prompt if isinstance(prompt, str) else pgn, resp)
+
+        san_move = extract_san(gpt_config, resp, response, dir_name)
+        ply = len(board.move_stack) + 1
+
+        try:
+            move = board.push_san(san_move)
+        except Exception:
+            log_msg(dir_name, "unknown san: {}".format(san_move))
+            record_llm_ply(dir_name, gpt_config, ply, kwargs, response, resp, san_move, False, api_seconds)
+            # perhaps add a PGN comment with the unknown SAN
+            unknown_san = san_move
+            break
+
+        record_llm_ply(dir_name, gpt_config, ply, kwargs, response, resp, san_move, True, api_seconds)
+
+        prompt_strategy.add_last_move(board)
+        uci_move = move.uci()
+        pgn += f" {san_move}"
+
+        yield EngineCall(stockfish.make_moves_from_current_position, ([f"{uci_move}"],))
+        log_msg(dir_name, move_str(board)[1])
+        if log_enabled(dir_name, DEBUG): # an extra round-trip to Stockfish
+            log_msg(dir_name, (yield EngineCall(stockfish.get_board_visual)), DEBUG)
+
+        if board.is_checkmate():
+            log_msg(dir_name, model_gpt + " won!")
+            break
+
+        if is_draw(board):
+            log_msg(dir_name, "Draw!")
+            break
+
+        if not white_piece:
+            n += 1
+            pgn += f" {n}."
+
+        checkpoint(False)
+
+
+    if ponderer is not None:
+        log_msg(dir_name, ponderer.summary())
+    save_game(board, dir_name, chess_config, gpt_config, white_piece, unknown_san)
+    checkpoint(False, finished=True)
+
+    return pgn
+
+BASE_PGN_HEADERS =  """[Event "FIDE World Championship Match 2024"]
+[Site "Los Angeles, USA"]
+[Date "2024.12.01"]
+[Round "5"]
+[White "Carlsen, Magnus"]
+[Black "Nepomniachtchi, Ian"]
+[Result "1-0"]
+[WhiteElo "2885"]
+[WhiteTitle "GM"]
+[WhiteFideId "1503014"]
+[BlackElo "2812"]
+[BlackTitle "GM"]
+[BlackFideId "4168119"]
+[TimeControl "40/7200:20/3600:900+30"]
+[UTCDate "2024.11.27"]
+[UTCTime "09:01:25"]
+[Variant "Standard"]
+"""
+
+# generate a random PGN with the first 10 random moves of a random game
+# ply = half move
+def mk_randomPGN(max_plies = 40):
+    board = chess.Board()
+
+    i = 0
+    while i < max_plies:
+        legal_moves = list(board.legal_moves)
+        uci_move = random.choice(legal_moves).uci()
+        move = chess.Move.from_uci(uci_move)
+        board.push(move)
+        i = i + 1
+
+    game = chess.pgn.Game.from_board(board)
+
+    current_move = round(len(list(game.mainline_moves())) / 2) + 1
+    pgn = BASE_PGN_HEADERS + '\n' + str(game.mainline_moves()) + " " + str(current_move) + "."
+
+    return pgn
+
+
+
+BASE_PGN_HEADERS_ALTERED =  """[Event "Chess tournament"]
+[Site "Rennes FRA"]
+[Date "2023.12.09"]
+[Round "7"]
+[White "MVL, Magnus"]
+[Black "Ivanchuk, Ian"]
+[Result "1-0"]
+[WhiteElo "2737"]
+[BlackElo "2612"]
+
+1."""
@@ -0,0 +1,102 @@
+# Buffered writer of the text files of a game directory (metainformation.txt, log.txt, session.txt, game.pgn, plies.jsonl).
+# Lines are kept in memory and appended to the files at the end of the game (close_logger), or when
+# `flush_interval` seconds have passed since the last flush, instead of reopening a file for every line:
+# with hundreds of games in flight, the filesystem is not hit on every ply.
+#
+# With a game store (set_game_store, see game_store.py), nothing is written to the directory: the files of
+# the game, with its metadata, become one row of the store when the game ends.
+#
+# Verbosity: messages below the level of the logger are dropped (and costly ones, such as the board of
+# Stockfish, should not even be computed: see is_enabled). The level is INFO by default, DEBUG with
+# GAME_LOG_LEVEL=DEBUG.
+
+import atexit
+import logging
+import os
+import time
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+
+LOG_LEVEL = logging.getLevelName(os.getenv("GAME_LOG_LEVEL", "INFO").upper())
+FLUSH_INTERVAL = 5.0 # seconds
+
+LOG_FILE = "log.txt"
+SESSION_FILE = "session.txt"
+
+
+class GameLogger:
+
+    def __init__(self, dir_name, level=LOG_LEVEL, flush_interval=FLUSH_INTERVAL, store=None):
+        self.dir_name = dir_name
+        self.level = level
+        self.flush_interval = flush_interval
+        self.store = store
+        self.metadata = {} # typed columns of the game for the store (configuration, result)
+        self.sizes = {} # file name -> bytes written so far, flushed or still buffered (see checkpoint.py)
+        self._buffers = {} # file name -> pending chunks of text
+        self._last_flush = time.monotonic()
+
+    def is_enabled(self, level):
+        return level >= self.level
+
+    def write(self, file_name, text):
+        self._buffers.setdefault(file_name, []).append(text)
+        self.sizes[file_name] = self.sizes.get(file_name, 0) + len(text.encode())
+        if self.store is None and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def log(self, message, level=INFO):
+        if self.is_enabled(level):
+            self.write(LOG_FILE, message + "\n")
+
+    def session(self, prompt, response, system_role_message=None):
+        text = "SYSTEM: " + system_role_message + "\n" if system_role_message is not None else ""
+        self.write(SESSION_FILE, text + "PROMPT: " + prompt + "\n" + "RESPONSE: " + response + "\n\n")
+
+    def flush(self):
+        if self.store is not None: # the whole game is stored at once by close
+            return
+        for file_name, chunks in self._buffers.items():
+            if chunks:
+                with open(os.path.join(self.dir_name, file_name), "a", encoding="utf-8") as f:
+                    f.write("".join(chunks))
+                chunks.clear()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self.store is None:
+            self.flush()
+            return
+        self.store.add_game(self.dir_name, self.metadata, {file_name: "".join(chunks) for file_name, chunks in self._buffers.items()})
+        self._buffers.clear()
+
+
+# loggers of the games in progress in this process, by directory
+_loggers = {}
+_store = None
+
+# games of this process go to `store` (a game_store.GameStore) instead of directories; None: directories
+def set_game_store(store):
+    global _store
+    _store = store
+
+def get_game_store():
+    return _store
+
+def get_logger(dir_name):
+    logger = _loggers.get(dir_name)
+    if logger is None:
+        logger = _loggers[dir_name] = GameLogger(dir_name, store=_store)
+    return logger
+
+# end of the game: writes everything that is still buffered
+def close_logger(dir_name):
+    logger = _loggers.pop(dir_name, None)
+    if logger is not None:
+        logger.close()
+
+@atexit.register
+def close_all_loggers():
+    for dir_name in list(_loggers):
+        close_logger(dir_name)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+
+# Single-file game store (SQLite): one row per game instead of one directory of text files per game.
+# The row holds typed columns mirroring ChessEngineConfig/GPTConfig (one column per field), the game
+# settings, the result, and the text of each file of the game directory (metainformation.txt, log.txt,
+# session.txt, game.pgn, plies.jsonl), so that the directory layout can always be exported back.
+# A game is identified by its directory: its root (eg games_o3) and its name (game_id), since the same name
+# can be found under several roots (eg a tournament job played into two output directories).
+#
+# Games are written to the store instead of directories once set_game_store(GameStore(path)) has been
+# called in the process (see the --store option of tournament.py and async_game.py). The checkpoints of the
+# games in progress (see checkpoint.py) are then kept in the store: the first checkpoint of a game in the
+# checkpoints table, the following ones (what changed at each ply) in the checkpoint_records table.
+#
+#   python3 game_store.py import games.sqlite ../games_o3 ../games.tar.gz
+#   python3 game_store.py export games.sqlite exported/ --where "model_gpt = 'gpt-4o'"
+#
+# and from a notebook:  read_games("games.sqlite", where="skill_level = 5")
+
+import argparse
+import dataclasses
+import glob
+import io
+import json
+import os
+import sqlite3
+import tarfile
+import threading
+import time
+import typing
+from collections import defaultdict
+
+import chess.pgn
+
+from game import ChessEngineConfig, GPTConfig
+from game_logger import LOG_FILE, SESSION_FILE, set_game_store
+
+GAME_STORE_PATH = "games.sqlite"
+
+SQL_TYPES = {bool: "INTEGER", int: "INTEGER", float: "REAL", str: "TEXT"}
+
+# Optional[int] -> INTEGER, etc.
+def sql_type(annotation):
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    return SQL_TYPES.get(args[0] if args else annotation, "TEXT")
+
+CONFIG_COLUMNS = {field.name: sql_type(field.type) for cls in (ChessEngineConfig, GPTConfig) for field in dataclasses.fields(cls)}
+GAME_COLUMNS = {
+    "white_piece": "INTEGER",
+    "nmove": "INTEGER",
+    "base_pgn": "TEXT",
+    "engine_parameters": "TEXT",
+    "result": "TEXT",
+    "unknown_san": "TEXT",
+    "nplies": "INTEGER",
+}
+# file of the game directory -> column
+FILE_COLUMNS = {
+    "metainformation.txt": "metainformation",
+    LOG_FILE: "log",
+    SESSION_FILE: "session",
+    "game.pgn": "pgn",
+    "plies.jsonl": "plies",
+}
+COLUMNS = {**CONFIG_COLUMNS, **GAME_COLUMNS, **{column: "TEXT" for column in FILE_COLUMNS.values()}}
+
+
+# metainformation.txt as a dict of typed values; multi-line values (base_pgn, system_role_message)
+# go on until the next known key
+def parse_metainformation(text):
+    values = {}
+    key = None
+    for line in text.splitlines():
+        name, sep, value = line.partition(": ")
+        if sep and name in COLUMNS:
+            key = name
+            values[key] = value
+        elif key is not None:
+            values[key] += "\n" + line
+    return {key: typed_value(COLUMNS[key], value) for key, value in values.items()}
+
+def typed_value(column_type, value):
+    if value in ("None", ""):
+        return None
+    if column_type == "INTEGER":
+        if value in ("True", "False"):
+            return int(value == "True")
+        return int(value)
+    if column_type == "REAL":
+        return float(value)
+    return value
+
+# (root, game_id) of a game directory
+def game_key(dir_name):
+    dir_name = os.path.normpath(dir_name)
+    return os.path.dirname(dir_name), os.path.basename(dir_name)
+
+# result, unknown SAN and number of plies of a PGN
+def pgn_summary(pgn):
+    game = chess.pgn.read_game(io.StringIO(pgn)) if pgn else None
+    if game is None:
+        return {}
+    return {"result": game.headers.get("Result"), "unknown_san": game.headers.get("UnknownSAN"),
+            "nplies": len(list(game.mainline_moves()))}
+
+
+class GameStore:
+
+    def __init__(self, path=GAME_STORE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL") # tournament workers write concurrently
+        self._db.execute("PRAGMA synchronous=NORMAL") # no disk sync per commit (one checkpoint per ply), safe against a crash of the process
+        for table, columns in (("games", "game_id TEXT, root TEXT, created REAL"),
+                               ("checkpoints", "game_id TEXT, root TEXT, finished INTEGER, state TEXT, updated REAL")):
+            self._create_table(table, columns)
+        self._db.execute("CREATE TABLE IF NOT EXISTS checkpoint_records (root TEXT, game_id TEXT, seq INTEGER, record TEXT, "
+                         "PRIMARY KEY (root, game_id, seq))")
+        # new fields of the configuration classes become new columns
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(games)")}
+        for column, column_type in COLUMNS.items():
+            if column not in existing:
+                self._db.execute(f"ALTER TABLE games ADD COLUMN {column} {column_type}")
+        for column in ("model_gpt", "skill_level", "root"):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS games_{column} ON games ({column})")
+
+    # tables keyed by (root, game_id); those of older stores, keyed by game_id alone, are rebuilt with their rows
+    def _create_table(self, table, columns):
+        create = f"CREATE TABLE IF NOT EXISTS {table} ({columns}, PRIMARY KEY (root, game_id))"
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE") # one process rebuilds the table
+            try:
+                key = [row[1] for row in self._db.execute(f"PRAGMA table_info({table})") if row[5]]
+                if key == ["game_id"]:
+                    old_columns = [(row[1], row[2]) for row in self._db.execute(f"PRAGMA table_info({table})")]
+                    self._db.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+                    self._db.execute(create)
+                    existing = {row[1] for row in self._db.execute(f"PRAGMA table_info({table})")}
+                    for column, column_type in old_columns:
+                        if column not in existing:
+                            self._db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                    names = ", ".join(column for column, _ in old_columns)
+                    self._db.execute(f"INSERT INTO {table} ({names}) SELECT {names} FROM {table}_old")
+                    self._db.execute(f"DROP TABLE {table}_old")
+                else:
+                    self._db.execute(create)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    # dir_name: game directory the game would have been written to (its root and its name identify the game)
+    # metadata: column -> value; files: file name -> text
+    def add_game(self, dir_name, metadata, files):
+        row = {column: value for column, value in metadata.items() if column in COLUMNS}
+        for file_name, text in files.items():
+            if file_name in FILE_COLUMNS:
+                row[FILE_COLUMNS[file_name]] = text
+        row.update({key: value for key, value in pgn_summary(row.get("pgn")).items() if row.get(key) is None})
+        root, game_id = game_key(dir_name)
+        row.update(game_id=game_id, root=root, created=time.time())
+        names = list(row)
+        with self._lock:
+            self._db.execute(f"INSERT OR REPLACE INTO games ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                             [row[name] for name in names])
+
+    # file name -> text of the game stored for dir_name, None if there is none
+    def game_files(self, dir_name):
+        rows = self.query(f"SELECT {', '.join(FILE_COLUMNS.values())} FROM games WHERE root = ? AND game_id = ?", game_key(dir_name))
+        if not rows:
+            return None
+        return {file_name: text for file_name, text in zip(FILE_COLUMNS, rows[0]) if text is not None}
+
+    # appends a checkpoint to those of the game of dir_name (see checkpoint.save_checkpoint)
+    def save_checkpoint(self, dir_name, record, new=False):
+        root, game_id = game_key(dir_name)
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                if new:
+                    self._db.execute("DELETE FROM checkpoint_records WHERE root = ? AND game_id = ?", (root, game_id))
+                    self._db.execute("INSERT OR REPLACE INTO checkpoints (game_id, root, finished, state, updated) VALUES (?, ?, ?, ?, ?)",
+                                     (game_id, root, int(record["finished"]), json.dumps(record), time.time()))
+                else:
+                    self._db.execute("INSERT INTO checkpoint_records (root, game_id, seq, record) SELECT ?, ?, COALESCE(MAX(seq), 0) + 1, ? "
+                                     "FROM checkpoint_records WHERE root = ? AND game_id = ?", (root, game_id, json.dumps(record), root, game_id))
+                    if "finished" in record:
+                        self._db.execute("UPDATE checkpoints SET finished = ?, updated = ? WHERE root = ? AND game_id = ?",
+                                         (int(record["finished"]), time.time(), root, game_id))
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    # checkpoints of the game of dir_name, in order (empty if it has none)
+    def load_checkpoint(self, dir_name):
+        key = game_key(dir_name)
+        rows = self.query("SELECT state FROM checkpoints WHERE root = ? AND game_id = ?", key)
+        if not rows:
+            return []
+        records = self.query("SELECT record FROM checkpoint_records WHERE root = ? AND game_id = ? ORDER BY seq", key)
+        return [json.loads(rows[0][0])] + [json.loads(record) for (record,) in records]
+
+    # directories (root/game_id) of the games with a checkpoint that are not finished
+    def unfinished_games(self):
+        return [os.path.join(root, game_id) for game_id, root in self.query("SELECT game_id, root FROM checkpoints WHERE finished = 0 ORDER BY updated")]
+
+    def add_files(self, dir_name, files):
+        metadata = parse_metainformation(files.get("metainformation.txt", ""))
+        self.add_game(dir_name, metadata, files)
+
+    # game directories (glob patterns of game roots) or .tar.gz archives of game directories
+    def import_sources(self, sources):
+        with self._lock:
+            self._db.execute("BEGIN") # a single transaction: one commit for all the games
+            try:
+                ngames = self._import_sources(sources)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        return ngames
+
+    def _import_sources(self, sources):
+        ngames = 0
+        for source in sources:
+            if source.endswith((".tar.gz", ".tgz")):
+                ngames += self._import_archive(source)
+                continue
+            for dir_name in sorted(glob.glob(os.path.join(source, "*"))):
+                files = {}
+                for file_name in FILE_COLUMNS:
+                    path = os.path.join(dir_name, file_name)
+                    if os.path.exists(path):
+                        with open(path, encoding="utf-8", errors="replace") as f:
+                            files[file_name] = f.read()
+                if files:
+                    self.add_files(dir_name, files)
+                    ngames += 1
+        return ngames
+
+    def _import_archive(self, path):
+        games = defaultdict(dict)
+        with tarfile.open(path, "r|gz") as archive:
+            for member in archive:
+                file_name = os.path.basename(member.name)
+                if member.isfile() and file_name in FILE_COLUMNS:
+                    games[os.path.dirname(member.name)][file_name] = \
+                        archive.extractfile(member).read().decode("utf-8", errors="replace")
+        for dir_name, files in games.items():
+            self.add_files(dir_name, files)
+        return len(games)
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    # writes the games back as directories, under their root (output_dir/<root>/<game_id>/game.pgn, ...)
+    def export(self, output_dir, where=None, params=()):
+        columns = ["root", "game_id"] + list(FILE_COLUMNS.values())
+        rows = self.query(f"SELECT {', '.join(columns)} FROM games" + (f" WHERE {where}" if where else ""), params)
+        for row in rows:
+            dir_name = os.path.join(output_dir, export_root(row[0]), row[1])
+            os.makedirs(dir_name, exist_ok=True)
+            for file_name, text in zip(FILE_COLUMNS, row[2:]):
+                if text is not None:
+                    with open(os.path.join(dir_name, file_name), "w") as f:
+                        f.write(text)
+        return len(rows)
+
+    def __len__(self):
+        return self.query("SELECT COUNT(*) FROM games")[0][0]
+
+    def close(self):
+        self._db.close()
+
+
+# root of a game as a relative path (an absolute root, or one going up with "..", stays under the export directory)
+def export_root(root):
+    return os.path.join("", *[part for part in (root or "").replace(os.sep, "/").split("/") if part not in ("", ".", "..")])
+
+# pandas DataFrame of the games (without the text of the files unless asked for)
+def read_games(path=GAME_STORE_PATH, where=None, columns=None):
+    import pandas as pd
+    columns = columns or ["game_id", "root", "created"] + list(CONFIG_COLUMNS) + list(GAME_COLUMNS)
+    with sqlite3.connect(path) as db:
+        return pd.read_sql_query(f"SELECT {', '.join(columns)} FROM games" + (f" WHERE {where}" if where else ""), db)
+
+# writes the games of this process to the store at `path` (instead of game directories)
+def use_game_store(path=GAME_STORE_PATH):
+    store = GameStore(path)
+    set_game_store(store)
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite store of games")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="add game directories or archives to the store")
+    import_parser.add_argument("store")
+    import_parser.add_argument("sources", nargs="+", help="game roots (glob patterns) or .tar.gz archives")
+    export_parser = subparsers.add_parser("export", help="write games of the store as game directories")
+    export_parser.add_argument("store")
+    export_parser.add_argument("output_dir")
+    export_parser.add_argument("--where", default=None, help="SQL condition on the games, eg \"model_gpt = 'gpt-4o'\"")
+    args = parser.parse_args()
+
+    store = GameStore(args.store)
+    start = time.monotonic()
+    if args.command == "import":
+        ngames = store.import_sources(args.sources)
+        print(f"{ngames} games imported in {time.monotonic() - start:.1f}s ({len(store)} games in {args.store})")
+    else:
+        ngames = store.export(args.output_dir, args.where)
+        print(f"{ngames} games exported to {args.output_dir}")
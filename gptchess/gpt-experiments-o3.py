@@ -1,5 +1,7 @@
-from openai import OpenAI
-client = OpenAI()                     # uses OPENAI_API_KEY
+import os
+from client_registry import get_client
+from request_scheduler import get_scheduler
+client = get_client(os.getenv("OPENAI_API_KEY"))   # pooled client, retried by the request scheduler
 
 prompt = """
 Instructions:
@@ -11,7 +13,7 @@ Instructions:
 1. e4
 """
 
-resp = client.responses.create(
+resp = get_scheduler(client.base_url).call(client.responses.create, dict(
     model="o3",
     # reasoning={"effort": "low", "summary": "detailed"},
     reasoning={"effort": "low"},
@@ -23,6 +25,6 @@ resp = client.responses.create(
     ],
     # input="1.",                       # user prompt
     # max_tokens=6                      # ≤ 6 tokens is plenty for one SAN move
-)
+))
 print(resp.output_text.strip())
 # print(resp.summary) # → e4
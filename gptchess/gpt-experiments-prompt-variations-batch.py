@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+# Prompt-variation grid of gpt-experiments-prompt-variations-generic.py run as one batch job (see batch_jobs.py)
+# instead of a long loop of synchronous calls: the grid is compiled into batch_input.jsonl, submitted, polled
+# until done, and the moves are joined back onto the grid rows, saved as
+# positions_prompt_variations/<uuid>/prompt_variations_results.csv as the synchronous script does.
+# The job (batch id, grid) is kept in the same directory, so a job that outlives the script can be resumed.
+#
+# eg  python3 gpt-experiments-prompt-variations-batch.py --position "1. e4 d5 2. exd5 e5 3. dxe6 Qe7 4."
+#     python3 gpt-experiments-prompt-variations-batch.py --resume positions_prompt_variations/<uuid>
+#
+# Offline, with the local stand-in of the batch endpoints and replay_server.py answering the requests:
+#     OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_KEY=replay python3 gpt-experiments-prompt-variations-batch.py --local batch_local
+
+import argparse
+import json
+import os
+from dataclasses import asdict
+
+import pandas as pd
+
+from batch_jobs import LocalBatchClient, completion_requests, write_jsonl, submit_batch, wait_batch, batch_texts, POLL_SECONDS
+from client_registry import get_client
+from parsing_moves_gpt import extract_move_chatgpt
+from prompt_variations import GPTConfig, grid_cells, new_results_dir, save_results
+
+PGN_POSITION = "1. e4 d5 2. exd5 e5 3. dxe6 Qe7 4. Nf3 a5 5. d4 Ra6 6. Bxa6 Nd7 7."
+RESULTS = ["1-0", "0-1", "1/2-1/2", ""]
+NAMES = ["Carlsen, Magnus", "Nepomniachtchi, Ian", "Kramnik, Vladimir"]
+ELOS = [1400, 2900]
+INCLUDE_TITLE = [True, False]
+
+JOB_FILE = "batch_job.json"
+GRID_FILE = "grid.csv"
+
+
+def batch_client(local_dir=None):
+    ai_client = get_client(os.getenv("OPENAI_KEY"))
+    return LocalBatchClient(local_dir, ai_client) if local_dir else ai_client
+
+def move_of(text):
+    if text is None: # failed request
+        return None
+    try:
+        return extract_move_chatgpt(text)
+    except (IndexError, UnboundLocalError): # empty completion
+        return None
+
+def submit(args):
+    gpt_config = GPTConfig(model_gpt=args.model, temperature=args.temperature, max_tokens=args.max_tokens)
+    rows, prompts = grid_cells(args.position, args.results, args.names, args.elos, INCLUDE_TITLE)
+    dir_name = new_results_dir()
+    pd.DataFrame(rows).to_csv(os.path.join(dir_name, GRID_FILE), index=False)
+    path = write_jsonl(os.path.join(dir_name, "batch_input.jsonl"), completion_requests(
+        prompts, model=gpt_config.model_gpt, temperature=gpt_config.temperature, max_tokens=gpt_config.max_tokens))
+    batch = submit_batch(batch_client(args.local), path)
+    with open(os.path.join(dir_name, JOB_FILE), "w") as f:
+        json.dump({"batch_id": batch.id, "local": args.local, "gpt_config": asdict(gpt_config), "pgn_position": args.position}, f)
+    print(f"{len(prompts)} requests submitted as batch {batch.id}, job in {dir_name}")
+    return dir_name
+
+def collect(dir_name, poll_seconds=POLL_SECONDS):
+    with open(os.path.join(dir_name, JOB_FILE)) as f:
+        job = json.load(f)
+    ai_client = batch_client(job["local"])
+    batch = wait_batch(ai_client, job["batch_id"], poll_seconds)
+    df = pd.read_csv(os.path.join(dir_name, GRID_FILE), keep_default_na=False) # Result "" is a grid value
+    df["Move"] = [move_of(text) for text in batch_texts(ai_client, batch, len(df))]
+    print(df.head())
+    save_results(df, dir_name, GPTConfig(**job["gpt_config"]), job["pgn_position"])
+    print(f"{df['Move'].notna().sum()}/{len(df)} moves ({batch.status}). Saved to {dir_name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the prompt-variation grid of a position as one batch job")
+    parser.add_argument("--position", default=PGN_POSITION, help="moves of the position, after the PGN headers")
+    parser.add_argument("--results", nargs="+", default=RESULTS, help="Result headers ('' for none)")
+    parser.add_argument("--names", nargs="+", default=NAMES)
+    parser.add_argument("--elos", nargs="+", type=int, default=ELOS)
+    parser.add_argument("--model", default="gpt-3.5-turbo-instruct")
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--max-tokens", type=int, default=5)
+    parser.add_argument("--local", default=None, help="directory of the local stand-in of the batch endpoints (requests are run with $OPENAI_BASE_URL)")
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="seconds between two polls of the batch")
+    parser.add_argument("--resume", default=None, help="job directory of a batch already submitted")
+    args = parser.parse_args()
+
+    dir_name = args.resume or submit(args)
+    collect(dir_name, args.poll)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
-import os, itertools, random, pandas as pd
-from dataclasses import dataclass
-from openai import OpenAI
+import os, itertools, pandas as pd
+from collections import Counter
 from parsing_moves_gpt import extract_move_chatgpt
+from llm_cache import LLMCache
+from client_registry import get_client
+from batched_completions import complete_batch
 
 # --------------------------------------------------------------------------- #
 #  OpenAI client
 # --------------------------------------------------------------------------- #
-client = OpenAI(api_key=os.getenv("OPENAI_KEY"))
+client = get_client(os.getenv("OPENAI_KEY"))   # pooled client, retried by the request scheduler
+cache = LLMCache()   # T=0 cells of the grid are served from the cache on reruns
 
 # --------------------------------------------------------------------------- #
 #  Minimal PGN prompt with only the two ELO headers
@@ -19,16 +22,19 @@ def mk_chess_prompt_elo_only(white_elo: int, black_elo: int) -> str:
     return f"{pgn_headers}\n\n{moves_so_far}"
 
 # --------------------------------------------------------------------------- #
-#  Single call to GPT that returns the first move in SAN
+#  Empirical move distribution of many prompts with the same parameters:
+#  n completions per prompt (n of the request), several prompts per request
 # --------------------------------------------------------------------------- #
-def play_game(prompt: str, temperature: float, max_tokens: int, model: str = "gpt-3.5-turbo-instruct") -> str:
-    resp = client.completions.create(
-        model=model,
-        prompt=prompt,
-        temperature=temperature,
-        max_tokens=max_tokens,
-    )
-    return extract_move_chatgpt(resp.choices[0].text)
+def sampled_move(text: str):
+    try:
+        return extract_move_chatgpt(text)
+    except (IndexError, UnboundLocalError):   # empty completion, or no move after the move number
+        return None
+
+def sample_moves(prompts: list, temperature: float, max_tokens: int, n: int = 1,
+                 model: str = "gpt-3.5-turbo-instruct") -> list:
+    texts = complete_batch(client, prompts, model=model, temperature=temperature, max_tokens=max_tokens, n=n, cache=cache)
+    return [Counter(sampled_move(text) for text in choices) for choices in texts]
 
 # --------------------------------------------------------------------------- #
 #  Experimental grid
@@ -36,24 +42,38 @@ def play_game(prompt: str, temperature: float, max_tokens: int, model: str = "gp
 elos          = [1000, 1400, 1800, 2200, 2600, 2900]
 temperatures  = [round(x, 1) for x in (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)]
 max_token_set = [5, 10]
+samples       = int(os.getenv("SAMPLES", "20"))   # completions per cell with T > 0 (a T=0 cell has a single answer)
 
 rows = []
+distribution = []
 
-for white_elo, black_elo, T, max_tok in itertools.product(elos, elos, temperatures, max_token_set):
-    prompt = mk_chess_prompt_elo_only(white_elo, black_elo)
-    move   = play_game(prompt, temperature=T, max_tokens=max_tok)
-    rows.append({
-        "WhiteElo":   white_elo,
-        "BlackElo":   black_elo,
-        "Temperature": T,
-        "MaxTokens":   max_tok,
-        "Move":        move,
-    })
-    print(f"{white_elo}-{black_elo} | T={T} | max_tok={max_tok} → {move}")
+# one batch per (temperature, max_tokens): the parameters are shared by all the prompts of a request
+for T, max_tok in itertools.product(temperatures, max_token_set):
+    n         = samples if T > 0 else 1
+    elo_pairs = list(itertools.product(elos, elos))
+    prompts   = [mk_chess_prompt_elo_only(white_elo, black_elo) for white_elo, black_elo in elo_pairs]
+    counts    = sample_moves(prompts, temperature=T, max_tokens=max_tok, n=n)
+    for (white_elo, black_elo), moves in zip(elo_pairs, counts):
+        cell = {
+            "WhiteElo":   white_elo,
+            "BlackElo":   black_elo,
+            "Temperature": T,
+            "MaxTokens":   max_tok,
+        }
+        move, count = moves.most_common(1)[0]
+        rows.append(dict(cell, Move=move, MoveFrequency=count / n, Samples=n))
+        distribution += [dict(cell, Move=m, Count=c, Frequency=c / n, Samples=n) for m, c in moves.most_common()]
+        print(f"{white_elo}-{black_elo} | T={T} | max_tok={max_tok} → {move} ({count}/{n})")
 
 # --------------------------------------------------------------------------- #
 #  Save as CSV
 # --------------------------------------------------------------------------- #
-df = pd.DataFrame(rows)
+df = pd.DataFrame(rows).sort_values(["WhiteElo", "BlackElo", "Temperature", "MaxTokens"], ignore_index=True) # grid order
 df.to_csv("elo_only_with_gpt_params.csv", index=False)
 print("Saved → elo_only_with_gpt_params.csv")
+
+# one row per (cell, move) with its frequency among the samples of the cell
+df_distribution = pd.DataFrame(distribution).sort_values(
+    ["WhiteElo", "BlackElo", "Temperature", "MaxTokens", "Count"], ascending=[True] * 4 + [False], kind="stable", ignore_index=True)
+df_distribution.to_csv("elo_only_move_distribution.csv", index=False)
+print("Saved → elo_only_move_distribution.csv")
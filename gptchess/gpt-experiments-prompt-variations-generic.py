@@ -5,40 +5,26 @@ import random
 from stockfish import Stockfish
 
 import openai
-from openai import OpenAI
 
 
 import chess
 import chess.pgn
 import os
 
-from dataclasses import dataclass
-
 from parsing_moves_gpt import extract_move_chatgpt
+from llm_cache import LLMCache
+from request_scheduler import scheduled
+from client_registry import get_client
+from batched_completions import complete_batch
+from prompt_variations import GPTConfig, mk_chess_prompt, grid_cells, new_results_dir, save_results
 
 import uuid
 
-client = OpenAI(api_key=os.getenv('OPENAI_KEY'))
-
-
+client = get_client(os.getenv('OPENAI_KEY')) # pooled client, retried by the request scheduler
+cache = LLMCache() # temperature 0 responses are reused from one run of the grid to the next
 
 
-@dataclass
-class GPTConfig:
-    temperature: float = 0
-    max_tokens: int = 4
-    chat_gpt: bool = False
-    system_role_message: str = None
-    model_gpt: str = "gpt-3.5-turbo-instruct"
 
-def save_metainformation_experiment(dir_name, gpt_config: GPTConfig, base_pgn):
-    with open(os.path.join(dir_name, "metainformation.txt"), "w") as metainformation_file:
-        metainformation_file.write(f"model_gpt: {gpt_config.model_gpt}\n")
-        metainformation_file.write(f"base_pgn: {base_pgn}\n")
-        metainformation_file.write(f"temperature: {gpt_config.temperature}\n")
-        metainformation_file.write(f"max_tokens: {gpt_config.max_tokens}\n")
-        metainformation_file.write(f"chat_gpt: {gpt_config.chat_gpt}\n")
-        metainformation_file.write(f"system_role_message: {gpt_config.system_role_message if gpt_config.system_role_message else 'None'}\n")
 
  
 def play_game(gpt_config: GPTConfig, base_prompt=""):
@@ -50,12 +36,12 @@ def play_game(gpt_config: GPTConfig, base_prompt=""):
     model_gpt = gpt_config.model_gpt       
 
  
-    response = client.completions.create(model=model_gpt,
+    response = cache.call(client, "completions", dict(model=model_gpt,
     prompt=base_prompt,
     temperature=temperature,
     max_tokens=max_tokens,
     # logprobs=1
-    )
+    ), scheduled(client, client.completions.create))
 
 
     resp = response.choices[0].text # completion 
@@ -65,57 +51,13 @@ def play_game(gpt_config: GPTConfig, base_prompt=""):
 
  
     return move
-      
-import random
-
-def mk_chess_prompt(pgn_position, result="1-0", black_name=None, white_name=None, black_elo=None, white_elo=None,
-                    include_black_title=True, include_white_title=True):
-    # List of possible player names
-    names = ["Nepomniachtchi, Ian", "Kramnik, Vladimir", "Kasparov, Gary", "Giraud, Thibaut", "Louapre, David"]
-
-    # Randomly choose names if not specified, ensuring they are not the same
-    if not black_name:
-        black_name = random.choice(names)
-    if not white_name:
-        white_name = random.choice([name for name in names if name != black_name])
-
-    # Randomly assign Elo ratings if not specified
-    if not black_elo:
-        black_elo = random.choice(range(1000, 2901, 100))
-    if not white_elo:
-        white_elo = random.choice(range(1000, 2901, 100))
-
-    # Optional GM titles
-    black_title = "[BlackTitle \"GM\"]" if include_black_title else ""
-    white_title = "[WhiteTitle \"GM\"]" if include_white_title else ""
-    result_header = ""
-    if result != '':
-        result_header = f"[Result \"{result}\"]"
-
-    # Construct the PGN header with the configurable options
-    pgn_headers = f"""[Event "FIDE World Championship Match 2024"]
-[Site "Los Angeles, USA"]
-[Date "2024.12.01"]
-[Round "5"]
-[White "{white_name}"]
-[Black "{black_name}"]
-{result_header}
-[WhiteElo "{white_elo}"]
-{white_title}
-[BlackElo "{black_elo}"]
-{black_title}
-[TimeControl "40/7200:20/3600:900+30"]
-[UTCDate "2024.11.27"]
-[UTCTime "09:01:25"]
-[Variant "Standard"]
-"""
-
-    return pgn_headers + '\n' + pgn_position
-
-
-
-
 
+# moves of a whole grid: the prompts are sent several per request (see batched_completions)
+def probe_moves(gpt_config: GPTConfig, prompts):
+    texts = complete_batch(client, prompts, model=gpt_config.model_gpt, temperature=gpt_config.temperature,
+                           max_tokens=gpt_config.max_tokens, cache=cache)
+    return [extract_move_chatgpt(choices[0]) for choices in texts]
+      
 gpt_config = GPTConfig(
     model_gpt="gpt-3.5-turbo-instruct",
     temperature=0.0,
@@ -184,56 +126,19 @@ elos = [1400, 2900]
 # include_title = [True, False]
 include_title = [True, False]
 
-# Create DataFrame
-df = pd.DataFrame(columns=["Result", "WhiteName", "BlackName", "WhiteElo", "BlackElo", "IncludeWhiteTitle", "IncludeBlackTitle", "Move"])
-
-data = []  # List to collect all row data
-
-
-# Generate configurations and populate the list
-# black elo = white elo to simplify 
-for result, white_elo, include_white_title, include_black_title in itertools.product(
-    results, elos, include_title, include_title):
-    for white_name in names:
-        for black_name in [name for name in names if name != white_name]:
-            prompt = mk_chess_prompt(pgn_position, result=result, black_name=black_name, white_name=white_name,
-                                     black_elo=white_elo, white_elo=white_elo,
-                                     include_black_title=include_black_title, include_white_title=include_white_title)
-            config = {
-                "Result": result,
-                "WhiteName": white_name,
-                "BlackName": black_name,
-                "WhiteElo": white_elo,
-                "BlackElo": white_elo,
-                "IncludeWhiteTitle": include_white_title,
-                "IncludeBlackTitle": include_black_title,
-                "Move": play_game(gpt_config, base_prompt=prompt)  # Using the generated prompt in play_game
-            }
-            data.append(config)
-            print("new data",config)
+rows, prompts = grid_cells(pgn_position, results, names, elos, include_title)
 
-# Convert list of dictionaries to DataFrame
-df = pd.DataFrame(data)
+for config, move in zip(rows, probe_moves(gpt_config, prompts)):
+    config["Move"] = move
+    print("new data",config)
 
-
-# Explicitly convert boolean columns if needed
-df['IncludeWhiteTitle'] = df['IncludeWhiteTitle'].astype(bool)
-df['IncludeBlackTitle'] = df['IncludeBlackTitle'].astype(bool)
+# Convert list of dictionaries to DataFrame
+df = pd.DataFrame(rows)
 
 print(df.head())
 
-folder_name = "positions_prompt_variations"
-
-# get a unique identifier
-hash_pgn = folder_name + "/" + str(uuid.uuid4())
-
-# create a directory with hash_pgn as the name
-os.mkdir(hash_pgn)
-
-# save the CSV file in the directory
-df.to_csv(f"{hash_pgn}/prompt_variations_results.csv", index=False)
-
-save_metainformation_experiment(hash_pgn, gpt_config, pgn_position)
+hash_pgn = new_results_dir()
+save_results(df, hash_pgn, gpt_config, pgn_position)
 
 print("Saved to", hash_pgn)
 
@@ -5,7 +5,6 @@ import random
 from stockfish import Stockfish
 
 import openai
-from openai import OpenAI
 
 
 import chess
@@ -15,10 +14,15 @@ import os
 from dataclasses import dataclass
 
 from parsing_moves_gpt import extract_move_chatgpt
+from llm_cache import LLMCache
+from request_scheduler import scheduled
+from client_registry import get_client
+from batched_completions import complete_batch
 
 import uuid
 
-client = OpenAI(api_key=os.getenv('OPENAI_KEY'))
+client = get_client(os.getenv('OPENAI_KEY')) # pooled client, retried by the request scheduler
+cache = LLMCache() # temperature 0 responses are reused from one run of the grid to the next
 
 # TODO: The 'openai.organization' option isn't read in the client API. You will need to pass it when you instantiate the client, e.g. 'OpenAI(organization="")'
 # openai.organization = ""
@@ -69,10 +73,10 @@ def play_game(gpt_config: GPTConfig, base_prompt=""):
 
 
 
-    response = client.completions.create(model=model_gpt,
+    response = cache.call(client, "completions", dict(model=model_gpt,
     prompt=base_prompt,
     temperature=temperature,
-    max_tokens=max_tokens)
+    max_tokens=max_tokens), scheduled(client, client.completions.create))
 
 
     resp = response.choices[0].text # completion
@@ -81,6 +85,12 @@ def play_game(gpt_config: GPTConfig, base_prompt=""):
 
     return move
 
+# moves of a whole grid: the prompts are sent several per request (see batched_completions)
+def probe_moves(gpt_config: GPTConfig, prompts):
+    texts = complete_batch(client, prompts, model=gpt_config.model_gpt, temperature=gpt_config.temperature,
+                           max_tokens=gpt_config.max_tokens, cache=cache)
+    return [extract_move_chatgpt(choices[0]) for choices in texts]
+
 import random
 
 def mk_chess_prompt(result="1-0", black_name=None, white_name=None, black_elo=None, white_elo=None,
@@ -173,6 +183,7 @@ df = pd.DataFrame(columns=col_index)   # Pyright is satisfied
 # df = pd.DataFrame(columns=["Result", "WhiteName", "BlackName", "WhiteElo", "BlackElo", "IncludeWhiteTitle", "IncludeBlackTitle", "Move"])
 
 data = []  # List to collect all row data
+prompts = []  # prompt of each row, sent in batches once the grid is built
 
 
 # Generate configurations and populate the list
@@ -192,10 +203,13 @@ for result, white_elo, include_white_title, include_black_title in itertools.pro
                 "BlackElo": white_elo,
                 "IncludeWhiteTitle": include_white_title,
                 "IncludeBlackTitle": include_black_title,
-                "Move": play_game(gpt_config, base_prompt=prompt)  # Using the generated prompt in play_game
             }
             data.append(config)
-            print("new data", data)
+            prompts.append(prompt)
+
+for config, move in zip(data, probe_moves(gpt_config, prompts)):
+    config["Move"] = move
+    print("new data", config)
 
 # Convert list of dictionaries to DataFrame
 df = pd.DataFrame(data)
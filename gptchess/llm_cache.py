@@ -0,0 +1,146 @@
+# On-disk cache of LLM responses (SQLite), shared by play_game and the prompt-variation scripts.
+# Only deterministic requests (temperature 0) are cached: re-running a grid or replaying an opening then
+# costs no API call. The key is a hash of the whole request (endpoint, base_url, model, prompt or messages,
+# temperature, max_tokens, reasoning effort), so any change of the prompt is a new entry.
+# The least recently used entries are evicted when the cache grows over `max_bytes`.
+#
+#   cache = LLMCache()
+#   response = cache.call(client, "completions", dict(model=..., prompt=..., temperature=0.0, max_tokens=5),
+#                         client.completions.create)
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from openai.types import Completion
+from openai.types.chat import ChatCompletion
+from openai.types.responses import Response
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+# response type of each endpoint (see game.model_request), to rebuild responses read from the cache
+RESPONSE_TYPES = {
+    "completions": Completion,
+    "chat": ChatCompletion,
+    "responses": Response,
+}
+
+# size of the cache is recomputed from the database every EVICTION_CHECK insertions (other processes may write to it)
+EVICTION_CHECK = 100
+
+
+def cacheable(kind, kwargs):
+    return kind in RESPONSE_TYPES and kwargs.get("temperature") == 0 and kwargs.get("n", 1) == 1
+
+def request_key(kind, kwargs, base_url=None):
+    request = dict(kwargs, endpoint=kind, base_url=str(base_url or ""))
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class LLMCache:
+
+    def __init__(self, path=LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # one connection shared by the threads of the process (async games, engine threads)
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL") # tournament workers read and write concurrently
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            model TEXT,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._nbytes = self._size()
+        self._ninserts = 0
+
+    def _size(self):
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT kind, response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        kind, response = row
+        return RESPONSE_TYPES[kind].model_validate_json(response)
+
+    def put(self, key, kind, model, response):
+        data = response.model_dump_json()
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (key, kind, model, data, len(data), now, now))
+            self._nbytes += len(data)
+            self._ninserts += 1
+            if self._ninserts % EVICTION_CHECK == 0:
+                self._nbytes = self._size()
+            if self._nbytes > self.max_bytes:
+                self._evict()
+
+    # removes the least recently used entries, down to 90% of max_bytes
+    def _evict(self):
+        target = self.max_bytes * 0.9
+        self._nbytes = self._size()
+        while self._nbytes > target:
+            rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 1000").fetchall()
+            if not rows:
+                break
+            evicted = []
+            for key, size in rows:
+                if self._nbytes <= target:
+                    break
+                evicted.append((key,))
+                self._nbytes -= size
+            self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    # create(**kwargs) is the endpoint to call (see game.model_endpoint) when the response is not cached
+    def call(self, ai_client, kind, kwargs, create):
+        if not cacheable(kind, kwargs):
+            return create(**kwargs)
+        key = request_key(kind, kwargs, getattr(ai_client, "base_url", None))
+        response = self.get(key)
+        if response is None:
+            response = create(**kwargs)
+            self.put(key, kind, kwargs.get("model"), response)
+        return response
+
+    # same as call, for the endpoints of AsyncOpenAI
+    async def call_async(self, ai_client, kind, kwargs, create):
+        if not cacheable(kind, kwargs):
+            return await create(**kwargs)
+        key = request_key(kind, kwargs, getattr(ai_client, "base_url", None))
+        response = self.get(key)
+        if response is None:
+            response = await create(**kwargs)
+            self.put(key, kind, kwargs.get("model"), response)
+        return response
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+# caches already opened by this process, by path
+_caches = {}
+
+def get_cache(path=LLM_CACHE_PATH):
+    if path not in _caches:
+        _caches[path] = LLMCache(path)
+    return _caches[path]
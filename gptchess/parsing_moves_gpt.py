@@ -45,12 +45,13 @@ def extract_move_deepseek_withGPT4(resp_str):
     Returns the move in standard algebraic notation (e.g., 'e4', 'Nf3', 'O-O').
     """
     try:
-        from openai import OpenAI
         import os
+        from client_registry import get_client
         
-        client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        if not client.api_key:
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable not set")
+        client = get_client(api_key) # shared from one extraction to the next
         
         prompt = f"""From the following text, extract the most relevant chess move in standard algebraic notation (e.g., 'e4', 'Nf3', 'O-O'). 
         There can be multiple moves in the text, so extract the last one or the one that is played or retained.
@@ -61,12 +62,13 @@ def extract_move_deepseek_withGPT4(resp_str):
         
         Input: {resp_str}"""
         
-        response = client.chat.completions.create(
+        from request_scheduler import get_scheduler
+        response = get_scheduler(client.base_url).call(client.chat.completions.create, dict(
             model="gpt-4",
             messages=[{"role": "user", "content": prompt}],
             temperature=0,
             max_tokens=10
-        )
+        ))
         
         move = response.choices[0].message.content.strip()
         
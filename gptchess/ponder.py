@@ -0,0 +1,118 @@
+# Pondering: while the request of GPT is in flight (seconds, minutes for o3 or deepseek-reasoner), a second engine
+# guesses its move and searches the replies in advance instead of sitting idle. The candidates are the top moves of
+# the engine for GPT's side (searched at a lower depth); the reply to each of them is searched, in order, in a
+# background thread (or in the executor of the Stockfish calls of async games). When GPT plays one of the
+# candidates, its reply is served at once (after waiting for the end of its search if it is the one being
+# searched); otherwise the engine of the game searches as usual.
+# The replies are searched from the moves of the game (so that repetitions are seen), by an engine configured
+# as the one of the game (skill level, depth, hash): a served reply is a move the engine could have played.
+#
+#   ponderer = Ponderer(stockfish, search, ncandidates=3)   # search(stockfish): best move (UCI) of the engine
+#   ponderer.start(board)            # before the request: GPT to move on board
+#   reply = ponderer.reply(board)    # after GPT's move: UCI reply, None if the move was not searched
+#   ponderer.close()
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+# depth of the search of the candidates (multipv), capped by the depth of the game
+CANDIDATE_DEPTH = 8
+
+
+@dataclass
+class PonderJob:
+    replies: dict = field(default_factory=dict) # FEN after a candidate -> reply (UCI)
+    searching: Optional[str] = None # FEN after the candidate being searched
+    stopped: bool = False
+
+
+class Ponderer:
+
+    # stockfish: an engine of its own, only used by the searches of the ponderer
+    # executor: runs the searches (one at a time), eg the executor of the Stockfish calls of async games; a thread of its own if None
+    def __init__(self, stockfish, search, ncandidates=3, candidate_depth=CANDIDATE_DEPTH, executor=None):
+        self.stockfish = stockfish
+        self.search = search
+        self.ncandidates = ncandidates
+        self.depth = int(stockfish.depth)
+        self.candidate_depth = min(candidate_depth, self.depth)
+        self.broken = False # the engine failed: no more pondering
+        self.stats = {"hits": 0, "misses": 0}
+        self._job = None
+        self._future = None
+        self._own_executor = executor is None
+        self._executor = ThreadPoolExecutor(max_workers=1) if executor is None else executor
+        self._cond = threading.Condition()
+
+    # starts pondering on `board` (GPT to move); the search of the previous position, if still running, is let finish first
+    def start(self, board):
+        if self.broken:
+            return
+        job = self._job = PonderJob()
+        moves = [move.uci() for move in board.move_stack]
+        # the previous search was submitted first: it is running (or done) when this one waits for it
+        self._future = self._executor.submit(self._ponder, self._future, moves, board.copy(), job)
+
+    def _ponder(self, previous, moves, board, job):
+        if previous is not None:
+            previous.result()
+        try:
+            if job.stopped:
+                return
+            self.stockfish.set_position(moves)
+            self.stockfish.set_depth(self.candidate_depth)
+            candidates = [top["Move"] for top in self.stockfish.get_top_moves(self.ncandidates)]
+            self.stockfish.set_depth(self.depth)
+            for candidate in candidates:
+                board.push_uci(candidate)
+                fen = board.fen()
+                with self._cond:
+                    if job.stopped:
+                        return
+                    job.searching = fen
+                self.stockfish.set_position(moves + [candidate])
+                reply = self.search(self.stockfish)
+                with self._cond:
+                    job.replies[fen] = reply
+                    job.searching = None
+                    self._cond.notify_all()
+                board.pop()
+        except Exception:
+            self.broken = True
+        finally:
+            self.stockfish.set_depth(self.depth)
+            with self._cond:
+                job.searching = None
+                self._cond.notify_all()
+
+    # reply to the last move on `board` (GPT's), None if it was not among the candidates searched (or being searched)
+    def reply(self, board):
+        job, self._job = self._job, None
+        if job is None:
+            return None
+        fen = board.fen()
+        with self._cond:
+            job.stopped = True # the other candidates are not searched
+            while job.searching == fen:
+                self._cond.wait()
+            reply = job.replies.get(fen)
+        self.stats["hits" if reply is not None else "misses"] += 1
+        return reply
+
+    # waits for the search in progress, so that the engine can be reused; the ponderer is not used afterwards
+    def close(self):
+        job, self._job = self._job, None
+        if job is not None:
+            with self._cond:
+                job.stopped = True
+        if self._future is not None:
+            self._future.result()
+            self._future = None
+        if self._own_executor:
+            self._executor.shutdown()
+
+    def summary(self):
+        nplies = self.stats["hits"] + self.stats["misses"]
+        return f"PONDER: {self.stats['hits']}/{nplies} engine replies served from pondering"
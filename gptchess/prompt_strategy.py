@@ -0,0 +1,126 @@
+# How the game so far is turned into a prompt (completion mode) or a list of messages (chat mode).
+# The prompt grows with the game, so late plies cost the most tokens and have the worst latency:
+#
+#   "full"        the whole history, as always done (PGN string / whole chat transcript)
+#   "window"      only the last `prompt_window` plies, plus the FEN of the position (so nothing is lost but the history)
+#   "compressed"  PGN headers plus a compact movetext ("1.e4 e5 2.Nf3"), in a single message in chat mode
+#
+# Selected with GPTConfig(prompt_strategy=..., prompt_window=...).
+
+import re
+
+from transcript import ChatTranscript, count_tokens, move_str, MESSAGE_OVERHEAD_TOKENS
+
+PROMPT_STRATEGIES = ("full", "window", "compressed")
+
+
+# PGN tags of the base prompt, or the free-text prompt without its trailing "1."
+def prompt_prefix(base_pgn):
+    tags = [line for line in base_pgn.splitlines() if line.startswith("[")]
+    if tags:
+        return "\n".join(tags) + "\n"
+    return re.sub(r"1\.\s*$", "", base_pgn)
+
+# Movetext of `sans`, played from a position where it is `white_to_move` at move `number`;
+# ends with the next move number when White is to move, like the PGN prompts of play_game
+def movetext(sans, number=1, white_to_move=True, compact=False):
+    sep = "" if compact else " "
+    parts = []
+    for i, san in enumerate(sans):
+        if white_to_move:
+            parts.append(f"{number}.{sep}{san}")
+        else:
+            parts.append(f"{number}...{sep}{san}" if i == 0 else san)
+            number += 1
+        white_to_move = not white_to_move
+    if white_to_move:
+        parts.append(f"{number}.")
+    return " ".join(parts)
+
+# (number of messages, characters, estimated tokens) of a prompt or a list of messages
+def prompt_size(prompt, model=None):
+    if isinstance(prompt, str):
+        return 1, len(prompt), count_tokens(prompt, model)
+    nchars = sum(len(m["content"] or "") for m in prompt)
+    ntokens = sum(count_tokens(m["content"], model) + MESSAGE_OVERHEAD_TOKENS for m in prompt)
+    return len(prompt), nchars, ntokens
+
+
+class FullHistory:
+
+    def __init__(self, gpt_config, base_pgn, board):
+        self.gpt_config = gpt_config
+        self.prefix = prompt_prefix(base_pgn)
+        # SAN of every move of the game, kept up to date with add_last_move
+        replay = board.root()
+        self.start = (replay.fullmove_number, replay.turn)
+        self.sans = []
+        for move in board.move_stack:
+            self.sans.append(replay.san(move))
+            replay.push(move)
+
+    def add_last_move(self, board):
+        self.sans.append(move_str(board)[0])
+
+    # prompt (completion mode) or messages (chat mode) to send
+    def build(self, pgn, transcript: ChatTranscript, board):
+        if self.gpt_config.chat_gpt:
+            return self.chat_messages(transcript, board)
+        return self.completion_prompt(pgn, board)
+
+    def completion_prompt(self, pgn, board):
+        return pgn
+
+    def chat_messages(self, transcript: ChatTranscript, board):
+        return transcript.messages
+
+    def size(self, prompt, transcript: ChatTranscript):
+        if prompt is transcript.messages:
+            return transcript.size()
+        return prompt_size(prompt, self.gpt_config.model_gpt)
+
+
+class SlidingWindow(FullHistory):
+
+    def __init__(self, gpt_config, base_pgn, board):
+        super().__init__(gpt_config, base_pgn, board)
+        self.window = gpt_config.prompt_window
+
+    def window_start(self, board):
+        moves = [board.pop() for _ in range(min(self.window, len(board.move_stack)))]
+        fen, number, white_to_move = board.fen(), board.fullmove_number, board.turn
+        for move in reversed(moves):
+            board.push(move)
+        return fen, number, white_to_move, len(moves)
+
+    def completion_prompt(self, pgn, board):
+        fen, number, white_to_move, nplies = self.window_start(board)
+        sans = self.sans[len(self.sans) - nplies:]
+        return self.prefix + f'[SetUp "1"]\n[FEN "{fen}"]\n\n' + movetext(sans, number, white_to_move)
+
+    def chat_messages(self, transcript: ChatTranscript, board):
+        # system message and instructions, then the last plies and the current position
+        recent = transcript.messages[max(2, len(transcript.messages) - self.window):]
+        return transcript.messages[:2] + recent + [{"role": "user", "content": f"Current position (FEN): {board.fen()}"}]
+
+
+class CompressedMovetext(FullHistory):
+
+    def completion_prompt(self, pgn, board):
+        return self.prefix + "\n" + movetext(self.sans, *self.start, compact=True)
+
+    def chat_messages(self, transcript: ChatTranscript, board):
+        # whole history in one message instead of one message per ply
+        if len(self.sans) == 0:
+            return transcript.messages[:2]
+        return transcript.messages[:2] + [{"role": "user", "content": "Moves so far: " + movetext(self.sans, *self.start, compact=True)}]
+
+
+def make_prompt_strategy(gpt_config, base_pgn, board):
+    if gpt_config.prompt_strategy == "full":
+        return FullHistory(gpt_config, base_pgn, board)
+    if gpt_config.prompt_strategy == "window":
+        return SlidingWindow(gpt_config, base_pgn, board)
+    if gpt_config.prompt_strategy == "compressed":
+        return CompressedMovetext(gpt_config, base_pgn, board)
+    raise ValueError(f"unknown prompt strategy {gpt_config.prompt_strategy!r}, should be one of {PROMPT_STRATEGIES}")
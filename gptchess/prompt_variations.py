@@ -0,0 +1,114 @@
+# Grid of PGN-header variations (result, player names, Elo, GM titles) on a given position, shared by
+# gpt-experiments-prompt-variations-generic.py (synchronous calls) and gpt-experiments-prompt-variations-batch.py
+# (batch job). Results are saved as positions_prompt_variations/<uuid>/prompt_variations_results.csv along
+# with the metainformation.txt of the experiment.
+
+import itertools
+import os
+import random
+import uuid
+
+from dataclasses import dataclass
+
+RESULTS_DIR = "positions_prompt_variations"
+GRID_COLUMNS = ["Result", "WhiteName", "BlackName", "WhiteElo", "BlackElo", "IncludeWhiteTitle", "IncludeBlackTitle"]
+
+
+@dataclass
+class GPTConfig:
+    temperature: float = 0
+    max_tokens: int = 4
+    chat_gpt: bool = False
+    system_role_message: str = None
+    model_gpt: str = "gpt-3.5-turbo-instruct"
+
+def save_metainformation_experiment(dir_name, gpt_config: GPTConfig, base_pgn):
+    with open(os.path.join(dir_name, "metainformation.txt"), "w") as metainformation_file:
+        metainformation_file.write(f"model_gpt: {gpt_config.model_gpt}\n")
+        metainformation_file.write(f"base_pgn: {base_pgn}\n")
+        metainformation_file.write(f"temperature: {gpt_config.temperature}\n")
+        metainformation_file.write(f"max_tokens: {gpt_config.max_tokens}\n")
+        metainformation_file.write(f"chat_gpt: {gpt_config.chat_gpt}\n")
+        metainformation_file.write(f"system_role_message: {gpt_config.system_role_message if gpt_config.system_role_message else 'None'}\n")
+
+
+def mk_chess_prompt(pgn_position, result="1-0", black_name=None, white_name=None, black_elo=None, white_elo=None,
+                    include_black_title=True, include_white_title=True):
+    # List of possible player names
+    names = ["Nepomniachtchi, Ian", "Kramnik, Vladimir", "Kasparov, Gary", "Giraud, Thibaut", "Louapre, David"]
+
+    # Randomly choose names if not specified, ensuring they are not the same
+    if not black_name:
+        black_name = random.choice(names)
+    if not white_name:
+        white_name = random.choice([name for name in names if name != black_name])
+
+    # Randomly assign Elo ratings if not specified
+    if not black_elo:
+        black_elo = random.choice(range(1000, 2901, 100))
+    if not white_elo:
+        white_elo = random.choice(range(1000, 2901, 100))
+
+    # Optional GM titles
+    black_title = "[BlackTitle \"GM\"]" if include_black_title else ""
+    white_title = "[WhiteTitle \"GM\"]" if include_white_title else ""
+    result_header = ""
+    if result != '':
+        result_header = f"[Result \"{result}\"]"
+
+    # Construct the PGN header with the configurable options
+    pgn_headers = f"""[Event "FIDE World Championship Match 2024"]
+[Site "Los Angeles, USA"]
+[Date "2024.12.01"]
+[Round "5"]
+[White "{white_name}"]
+[Black "{black_name}"]
+{result_header}
+[WhiteElo "{white_elo}"]
+{white_title}
+[BlackElo "{black_elo}"]
+{black_title}
+[TimeControl "40/7200:20/3600:900+30"]
+[UTCDate "2024.11.27"]
+[UTCTime "09:01:25"]
+[Variant "Standard"]
+"""
+
+    return pgn_headers + '\n' + pgn_position
+
+
+# rows (GRID_COLUMNS) and prompts of the grid; black elo = white elo to simplify
+def grid_cells(pgn_position, results, names, elos, include_title):
+    rows, prompts = [], []
+    for result, white_elo, include_white_title, include_black_title in itertools.product(
+        results, elos, include_title, include_title):
+        for white_name in names:
+            for black_name in [name for name in names if name != white_name]:
+                rows.append({
+                    "Result": result,
+                    "WhiteName": white_name,
+                    "BlackName": black_name,
+                    "WhiteElo": white_elo,
+                    "BlackElo": white_elo,
+                    "IncludeWhiteTitle": include_white_title,
+                    "IncludeBlackTitle": include_black_title,
+                })
+                prompts.append(mk_chess_prompt(pgn_position, result=result, black_name=black_name, white_name=white_name,
+                                               black_elo=white_elo, white_elo=white_elo,
+                                               include_black_title=include_black_title,
+                                               include_white_title=include_white_title))
+    return rows, prompts
+
+# new positions_prompt_variations/<uuid> directory
+def new_results_dir(folder_name=RESULTS_DIR):
+    dir_name = os.path.join(folder_name, str(uuid.uuid4()))
+    os.makedirs(dir_name)
+    return dir_name
+
+# writes the CSV of the grid (a DataFrame with GRID_COLUMNS and Move) and the metainformation of the experiment
+def save_results(df, dir_name, gpt_config: GPTConfig, pgn_position):
+    df = df.copy()
+    df['IncludeWhiteTitle'] = df['IncludeWhiteTitle'].astype(bool)
+    df['IncludeBlackTitle'] = df['IncludeBlackTitle'].astype(bool)
+    df.to_csv(os.path.join(dir_name, "prompt_variations_results.csv"), index=False)
+    save_metainformation_experiment(dir_name, gpt_config, pgn_position)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+# Offline stand-in for the OpenAI API, serving the PROMPT/RESPONSE pairs recorded in the session.txt of
+# game directories (see record_session), so that the whole harness can be profiled and load-tested
+# without spending quota. It speaks the three endpoints used by play_game: /v1/completions,
+# /v1/chat/completions and /v1/responses, with a configurable synthetic latency.
+#
+# A request is answered with the recorded response of the same prompt; otherwise with the recorded response
+# of the same position (same moves so far, eg a chat request replaying a completion game); otherwise
+# (`--on-miss random`) with a random legal move, so that games always go on.
+#
+#   python3 replay_server.py --latency 0.8 --jitter 0.3 ../games.tar.gz ../games_gpt4o.tar.gz
+#   OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=replay python3 tournament.py
+#
+# or GPTConfig(base_url="http://127.0.0.1:8000/v1").
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import random
+import re
+import tarfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import chess
+
+SESSION_ENTRY = re.compile(r"^(?:SYSTEM: .*\n)?PROMPT: (.*?)\nRESPONSE: (.*?)(?=\n\n(?:SYSTEM|PROMPT): |\n*\Z)", re.S | re.M)
+SAN_TOKEN = re.compile(r"^(?:O-O(?:-O)?|[KQRBN]?[a-h]?[1-8]?x?[a-h][1-8](?:=[QRBN])?)[+#]?$")
+MOVE_NUMBER = re.compile(r"\d+\.(?:\.\.)?")
+
+
+# (prompt, response) pairs of a session.txt
+def parse_session(text):
+    return [(prompt, response) for prompt, response in SESSION_ENTRY.findall(text)]
+
+# moves played so far in a prompt (PGN tags and free text are ignored), as a tuple of SAN
+def prompt_moves(text):
+    board = chess.Board()
+    sans = []
+    for token in MOVE_NUMBER.sub(" ", text).split():
+        if not SAN_TOKEN.match(token):
+            continue
+        try:
+            board.push_san(token)
+        except ValueError:
+            continue
+        sans.append(token)
+    return tuple(sans)
+
+# text of a chat (messages) or responses (input) request, as the PGN of the game so far
+def request_text(messages):
+    if isinstance(messages, str):
+        return messages
+    return " ".join(m.get("content") or "" for m in messages if m.get("role") != "system")
+
+# session.txt contents of game directories (glob patterns of game roots) or of .tar.gz archives
+def iter_sessions(sources):
+    for source in sources:
+        if source.endswith((".tar.gz", ".tgz")):
+            with tarfile.open(source, "r|gz") as archive:
+                for member in archive:
+                    name = os.path.basename(member.name)
+                    if member.isfile() and name == "session.txt":
+                        yield archive.extractfile(member).read().decode("utf-8", errors="replace")
+            continue
+        for path in glob.glob(os.path.join(source, "*", "session.txt")):
+            with open(path, encoding="utf-8", errors="replace") as f:
+                yield f.read()
+
+
+class Recordings:
+
+    def __init__(self):
+        self.by_prompt = defaultdict(list)
+        self.by_moves = defaultdict(list)
+        self._cursors = {}
+        self._lock = threading.Lock()
+        self.stats = {"prompt": 0, "moves": 0, "miss": 0}
+
+    def add(self, prompt, response):
+        self.by_prompt[prompt.strip()].append(response)
+        self.by_moves[prompt_moves(prompt)].append(response)
+
+    def load(self, sources):
+        nsessions = 0
+        for session in iter_sessions(sources):
+            nsessions += 1
+            for prompt, response in parse_session(session):
+                self.add(prompt, response)
+        return nsessions
+
+    # successive lookups of the same prompt go through its recorded responses in turn
+    def _next(self, match, key, responses):
+        with self._lock:
+            self.stats[match] += 1
+            cursor = self._cursors.setdefault((match, key), itertools.count())
+            return responses[next(cursor) % len(responses)]
+
+    def lookup(self, text, on_miss="random"):
+        responses = self.by_prompt.get(text.strip())
+        if responses:
+            return self._next("prompt", text.strip(), responses)
+        moves = prompt_moves(text)
+        responses = self.by_moves.get(moves)
+        if responses:
+            return self._next("moves", moves, responses)
+        with self._lock:
+            self.stats["miss"] += 1
+        if on_miss != "random":
+            return None
+        board = chess.Board()
+        for san in moves:
+            board.push_san(san)
+        legal_moves = list(board.legal_moves)
+        return board.san(random.choice(legal_moves)) if legal_moves else ""
+
+
+def usage(prompt, text):
+    prompt_tokens, completion_tokens = len(prompt) // 4, max(1, len(text) // 4)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+def completion_body(model, prompt, text):
+    return {"id": "cmpl-" + uuid.uuid4().hex, "object": "text_completion", "created": int(time.time()), "model": model,
+            "choices": [{"text": text, "index": 0, "logprobs": None, "finish_reason": "stop"}],
+            "usage": usage(prompt, text)}
+
+def chat_body(model, prompt, text):
+    return {"id": "chatcmpl-" + uuid.uuid4().hex, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage(prompt, text)}
+
+def responses_body(model, prompt, text):
+    return {"id": "resp_" + uuid.uuid4().hex, "object": "response", "created_at": int(time.time()), "model": model,
+            "status": "completed", "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+            "output": [{"type": "message", "id": "msg_" + uuid.uuid4().hex, "status": "completed", "role": "assistant",
+                        "content": [{"type": "output_text", "text": text, "annotations": []}]}]}
+
+# path -> (field of the request holding the prompt, body of the response)
+ENDPOINTS = {
+    "/v1/completions": ("prompt", completion_body),
+    "/v1/chat/completions": ("messages", chat_body),
+    "/v1/responses": ("input", responses_body),
+}
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1" # keep-alive, as with the real API
+
+    def log_message(self, format, *args): # no access log on stderr
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/stats", "/v1/stats"):
+            self.send_json(200, self.server.recordings.stats)
+        else:
+            self.send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path not in ENDPOINTS:
+            self.send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        field, make_body = ENDPOINTS[self.path]
+        prompt = request_text(request.get(field) or "")
+        text = self.server.recordings.lookup(prompt, self.server.on_miss)
+        delay = self.server.latency + random.gauss(0, self.server.jitter) if self.server.jitter else self.server.latency
+        if delay > 0:
+            time.sleep(delay)
+        if text is None:
+            self.send_json(404, {"error": {"message": "no recorded response for this prompt", "type": "replay_miss"}})
+            return
+        self.send_json(200, make_body(request.get("model", "replay"), prompt, text))
+
+
+class ReplayServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    # latency, jitter: synthetic delay of every response (mean and standard deviation, in seconds)
+    # on_miss: "random" (random legal move) or "error" (404) for prompts that were not recorded
+    def __init__(self, recordings, host="127.0.0.1", port=8000, latency=0.0, jitter=0.0, on_miss="random"):
+        super().__init__((host, port), ReplayHandler)
+        self.recordings = recordings
+        self.latency = latency
+        self.jitter = jitter
+        self.on_miss = on_miss
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded GPT sessions as a local OpenAI API")
+    parser.add_argument("sources", nargs="+", help="game roots (glob patterns) or .tar.gz archives of games")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean delay of a response, in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the delay, in seconds")
+    parser.add_argument("--on-miss", choices=["random", "error"], default="random",
+                        help="answer to an unknown prompt: random legal move or 404")
+    args = parser.parse_args()
+
+    recordings = Recordings()
+    start = time.monotonic()
+    nsessions = recordings.load(args.sources)
+    print(f"{nsessions} sessions, {len(recordings.by_prompt)} prompts, {len(recordings.by_moves)} positions "
+          f"loaded in {time.monotonic() - start:.1f}s")
+
+    server = ReplayServer(recordings, args.host, args.port, args.latency, args.jitter, args.on_miss)
+    print(f"Serving on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
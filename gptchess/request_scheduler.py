@@ -0,0 +1,277 @@
+# Scheduler of the model calls, shared by every call site (play_game, async games, prompt-variation grids,
+# DeepSeek move extraction): one scheduler per provider (OpenAI, DeepSeek, or any other base_url) with a
+# requests-per-minute and a tokens-per-minute budget (token buckets), so that concurrent games stay under the
+# quota instead of hitting it all at once. Rate limits (429), timeouts, connection errors and 5xx are retried
+# with jittered exponential backoff (and Retry-After when the API sends one), instead of ending the game.
+# The budgets of a provider ($OPENAI_RPM/$OPENAI_TPM, $DEEPSEEK_RPM/$DEEPSEEK_TPM) are those of the quota: processes
+# sharing it (eg the workers of tournament.py) each get their share with set_process_share.
+#
+#   response = get_scheduler(client.base_url).call(client.completions.create, dict(model=..., prompt=..., max_tokens=5))
+#   response = await get_scheduler(client.base_url).call_async(client.chat.completions.create, kwargs)
+#   scheduler_stats()   # queue depth, requests in flight, retries, failures... per provider
+
+import asyncio
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from transcript import count_tokens, MESSAGE_OVERHEAD_TOKENS
+
+# status codes worth another try: timeout, conflict, rate limit, server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# completion tokens counted for a request without max_tokens (eg the reasoning of the o-series)
+DEFAULT_COMPLETION_TOKENS = 2000
+
+
+@dataclass
+class ProviderLimits:
+    requests_per_minute: Optional[float] = None # None: no budget
+    tokens_per_minute: Optional[float] = None
+    max_retries: int = 6
+    backoff_base: float = 1.0 # seconds, doubled at each retry
+    backoff_max: float = 60.0
+
+# number of processes sharing the quota of the providers (see set_process_share)
+_nprocesses = 1
+
+def env_limits(name, requests_per_minute, tokens_per_minute):
+    return ProviderLimits(requests_per_minute=float(os.getenv(f"{name}_RPM", requests_per_minute)) / _nprocesses,
+                          tokens_per_minute=float(os.getenv(f"{name}_TPM", tokens_per_minute)) / _nprocesses)
+
+# provider of a client's base_url: "openai", "deepseek", or the host of another server (no budget by default)
+def provider_name(base_url=None):
+    url = str(base_url or os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1")
+    host = url.split("://", 1)[-1].split("/", 1)[0]
+    if host == "api.openai.com":
+        return "openai"
+    if host == "api.deepseek.com":
+        return "deepseek"
+    return host
+
+def default_limits(provider):
+    if provider == "openai":
+        return env_limits("OPENAI", 3500, 90000)
+    if provider == "deepseek":
+        return env_limits("DEEPSEEK", 600, 1000000)
+    return ProviderLimits()
+
+
+class TokenBucket:
+
+    # capacity: burst size, one minute of budget by default
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # takes `amount` out of the bucket and returns the seconds to wait before using it; the level can go
+    # below 0, so that callers are served in their order of arrival instead of all retrying at once
+    def reserve(self, amount):
+        with self._lock:
+            self._refill()
+            self.level -= min(amount, self.capacity) # a request over the capacity waits for a full bucket
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    # gives back (amount > 0) or takes (amount < 0) the difference between the estimated and the actual cost
+    def adjust(self, amount):
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+    # after a 429: the API saw the quota as spent, so every caller waits for it to refill
+    def drain(self):
+        with self._lock:
+            self._refill()
+            self.level = min(self.level, 0.0)
+
+
+# estimated tokens of a request: prompt, messages (chat) or input (responses), plus the completion tokens
+def estimate_tokens(kwargs):
+    model = kwargs.get("model")
+    prompt = kwargs.get("prompt", kwargs.get("messages", kwargs.get("input", "")))
+    prompts = prompt if isinstance(prompt, list) else [prompt]
+    ntokens = 0
+    for item in prompts:
+        if isinstance(item, dict): # message
+            ntokens += count_tokens(item.get("content") or "", model) + MESSAGE_OVERHEAD_TOKENS
+        else:
+            ntokens += count_tokens(item, model)
+    nprompts = len(prompts) if "prompt" in kwargs else 1
+    completion_tokens = kwargs.get("max_tokens") or kwargs.get("max_output_tokens") or DEFAULT_COMPLETION_TOKENS
+    return ntokens + nprompts * kwargs.get("n", 1) * completion_tokens
+
+def response_tokens(response):
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+def is_retryable(error):
+    if getattr(error, "code", None) == "insufficient_quota": # a 429 that waiting does not solve
+        return False
+    if getattr(error, "status_code", None) in RETRYABLE_STATUS:
+        return True
+    # timeouts and connection errors of the OpenAI client (APIConnectionError, APITimeoutError)
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+# seconds asked by the API before the next try (Retry-After header), None if not given
+def retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after-ms")) / 1000
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+
+    def __init__(self, provider, limits: ProviderLimits = None):
+        self.provider = provider
+        self.limits = limits or default_limits(provider)
+        self.requests = TokenBucket(self.limits.requests_per_minute) if self.limits.requests_per_minute else None
+        self.tokens = TokenBucket(self.limits.tokens_per_minute) if self.limits.tokens_per_minute else None
+        self._lock = threading.Lock()
+        self.stats = {"queued": 0, "in_flight": 0, "requests": 0, "retries": 0, "failures": 0, "tokens": 0, "wait_seconds": 0.0}
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self.stats[name] += delta
+
+    # seconds to wait before sending a request of `ntokens` tokens
+    def _reserve(self, ntokens):
+        wait = self.requests.reserve(1) if self.requests else 0.0
+        if self.tokens:
+            wait = max(wait, self.tokens.reserve(ntokens))
+        return wait
+
+    # seconds to wait before retry number `attempt` (0 for the first retry), None: give up
+    def _backoff(self, error, attempt):
+        if attempt >= self.limits.max_retries or not is_retryable(error):
+            return None
+        if getattr(error, "status_code", None) == 429:
+            for bucket in (self.requests, self.tokens):
+                if bucket:
+                    bucket.drain()
+        delay = random.uniform(0, min(self.limits.backoff_max, self.limits.backoff_base * 2 ** attempt)) # full jitter
+        return max(delay, retry_after(error) or 0.0)
+
+    def _done(self, response, ntokens):
+        actual = response_tokens(response)
+        if actual is not None and self.tokens:
+            self.tokens.adjust(ntokens - actual)
+        self._count(requests=1, tokens=actual if actual is not None else ntokens)
+
+    def call(self, create, kwargs):
+        ntokens = estimate_tokens(kwargs)
+        attempt = 0
+        while True:
+            wait = self._reserve(ntokens)
+            if wait > 0:
+                self._count(queued=1, wait_seconds=wait)
+                time.sleep(wait)
+                self._count(queued=-1)
+            self._count(in_flight=1)
+            try:
+                response = create(**kwargs)
+            except Exception as e:
+                if self.tokens: # a failed request consumes no tokens
+                    self.tokens.adjust(ntokens)
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    self._count(failures=1)
+                    raise
+                self._count(retries=1)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                self._count(in_flight=-1)
+            self._done(response, ntokens)
+            return response
+
+    # same as call, for the endpoints of AsyncOpenAI
+    async def call_async(self, create, kwargs):
+        ntokens = estimate_tokens(kwargs)
+        attempt = 0
+        while True:
+            wait = self._reserve(ntokens)
+            if wait > 0:
+                self._count(queued=1, wait_seconds=wait)
+                await asyncio.sleep(wait)
+                self._count(queued=-1)
+            self._count(in_flight=1)
+            try:
+                response = await create(**kwargs)
+            except Exception as e:
+                if self.tokens: # a failed request consumes no tokens
+                    self.tokens.adjust(ntokens)
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    self._count(failures=1)
+                    raise
+                self._count(retries=1)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                self._count(in_flight=-1)
+            self._done(response, ntokens)
+            return response
+
+
+# schedulers of this process, by provider
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(base_url=None):
+    provider = provider_name(base_url)
+    with _schedulers_lock:
+        if provider not in _schedulers:
+            _schedulers[provider] = RequestScheduler(provider)
+        return _schedulers[provider]
+
+def set_limits(provider, limits: ProviderLimits):
+    with _schedulers_lock:
+        _schedulers[provider] = RequestScheduler(provider, limits)
+
+# this process is one of `nprocesses` sharing the quota: the default budgets of the providers are divided by nprocesses
+def set_process_share(nprocesses):
+    global _nprocesses
+    with _schedulers_lock:
+        _nprocesses = max(1, nprocesses)
+        _schedulers.clear()
+
+# create(**kwargs) of a client, through the scheduler of its provider (eg for LLMCache.call)
+def scheduled(ai_client, create):
+    scheduler = get_scheduler(getattr(ai_client, "base_url", None))
+    return lambda **kwargs: scheduler.call(create, kwargs)
+
+def scheduled_async(ai_client, create):
+    scheduler = get_scheduler(getattr(ai_client, "base_url", None))
+    return lambda **kwargs: scheduler.call_async(create, kwargs)
+
+def scheduler_stats():
+    with _schedulers_lock:
+        return {provider: dict(scheduler.stats) for provider, scheduler in _schedulers.items()}
+
+# requests waiting for the budget of their provider, all providers together
+def queue_depth():
+    return sum(stats["queued"] for stats in scheduler_stats().values())
+
+def format_scheduler_stats():
+    return "; ".join(f"{provider}: {s['requests']} requests, {s['retries']} retries, {s['failures']} failures, "
+                     f"{s['queued']} queued, {s['in_flight']} in flight, {s['wait_seconds']:.1f}s waited for the budget"
+                     for provider, s in scheduler_stats().items())
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# Resumes interrupted games (crash, timeout, Ctrl-C) from their last checkpoint (see checkpoint.py), one after
+# the other: each argument is a game directory, or a directory of games (eg games_o3/) whose unfinished
+# games are all resumed. With --store, the games are those of the game store (see game_store.py) the
+# interrupted run wrote to, and they go on in it: the arguments, if any, then only select among them.
+#
+# eg  python3 resume_games.py games_o3/game1b4e...
+#     python3 resume_games.py games_o3 --engine-path ./stockfish/stockfish/stockfish-ubuntu-x86-64-avx2
+#     python3 resume_games.py --store games.sqlite
+
+import argparse
+import os
+
+from checkpoint import load_checkpoint, save_checkpoint
+from game import resume_game
+from game_store import use_game_store
+
+
+# unfinished games of `paths`: game directories with a checkpoint, or directories of such games
+def unfinished_games(paths):
+    dir_names = []
+    for path in paths:
+        candidates = [path] if load_checkpoint(path) is not None else sorted(os.path.join(path, name) for name in os.listdir(path))
+        for dir_name in candidates:
+            state = load_checkpoint(dir_name)
+            if state is not None and not state["finished"]:
+                dir_names.append(dir_name)
+    return dir_names
+
+# unfinished games of the store, those of `paths` (game directories, or directories of games) only if any is given
+def unfinished_stored_games(store, paths):
+    dir_names = store.unfinished_games()
+    if not paths:
+        return dir_names
+    paths = [os.path.normpath(path) for path in paths]
+    return [dir_name for dir_name in dir_names if dir_name in paths or os.path.dirname(dir_name) in paths]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resume interrupted games from their last checkpoint")
+    parser.add_argument("paths", nargs="*", help="game directories, or directories of games")
+    parser.add_argument("--engine-path", default=None, help="Stockfish binary, if not the one the games were started with")
+    parser.add_argument("--store", default=None, help="SQLite game store the games were written to (see game_store.py)")
+    args = parser.parse_args()
+    if args.store is None and not args.paths:
+        parser.error("game directories are needed without --store")
+
+    if args.store is not None:
+        dir_names = unfinished_stored_games(use_game_store(args.store), args.paths)
+    else:
+        dir_names = unfinished_games(args.paths)
+    print(f"{len(dir_names)} unfinished games")
+    for dir_name in dir_names:
+        if args.engine_path is not None: # eg a game started on another machine
+            chess_config = load_checkpoint(dir_name)["chess_config"]
+            chess_config["engine_path"] = args.engine_path
+            save_checkpoint(dir_name, {"chess_config": chess_config}) # only what changed, see checkpoint.py
+        resume_game(dir_name)
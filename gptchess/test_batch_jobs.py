@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from openai.types import Completion
+
+from batch_jobs import LocalBatchClient, completion_requests, write_jsonl, submit_batch, wait_batch, batch_texts
+
+
+class FakeCompletions:
+
+    # answers ' <prompt>', fails on the prompt "fail"
+    def create(self, model, prompt, temperature, max_tokens):
+        if prompt == "fail":
+            raise ValueError("bad request")
+        return Completion.model_validate({"id": "cmpl", "object": "text_completion", "created": 0, "model": model,
+                                          "choices": [{"text": f" {prompt}", "index": 0, "finish_reason": "length"}]})
+
+
+class TestBatchJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.client = LocalBatchClient(os.path.join(self.dir.name, "batches"), SimpleNamespace(completions=FakeCompletions()))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def run_batch(self, prompts):
+        requests = completion_requests(prompts, model="gpt-3.5-turbo-instruct", temperature=0.0, max_tokens=5)
+        path = write_jsonl(os.path.join(self.dir.name, "batch_input.jsonl"), requests)
+        batch = submit_batch(self.client, path)
+        self.assertEqual(batch.status, "validating")
+        batch = wait_batch(self.client, batch.id, poll_seconds=0, verbose=False)
+        return batch, batch_texts(self.client, batch, len(prompts))
+
+    def test_round_trip(self):
+        prompts = [f"{i}." for i in range(30)]
+        batch, texts = self.run_batch(prompts)
+        self.assertEqual(batch.status, "completed")
+        self.assertEqual(batch.request_counts.completed, 30)
+        self.assertEqual(texts, [f" {prompt}" for prompt in prompts])
+
+    def test_failed_request(self):
+        batch, texts = self.run_batch(["1.", "fail", "2."])
+        self.assertEqual(batch.request_counts.failed, 1)
+        self.assertEqual(texts, [" 1.", None, " 2."])
+        # a finished batch is not run again
+        self.assertEqual(self.client.batches.retrieve(batch.id).output_file_id, batch.output_file_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+from openai.types import Completion
+
+from batched_completions import complete_batch, pack_prompts
+from llm_cache import LLMCache
+
+
+class FakeCompletions:
+
+    def __init__(self):
+        self.requests = []
+
+    # answers ' <prompt>' to each prompt, choices in reverse order as the API does not sort them
+    def create(self, model, prompt, temperature, max_tokens, n=1):
+        self.requests.append(prompt)
+        choices = [{"text": f" {p}#{j}" if n > 1 else f" {p}", "index": k * n + j, "finish_reason": "length"}
+                   for k, p in enumerate(prompt) for j in range(n)]
+        return Completion.model_validate({"id": "cmpl", "object": "text_completion", "created": 0, "model": model,
+                                          "choices": choices[::-1]})
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.completions = FakeCompletions()
+        self.base_url = "https://api.openai.com/v1/"
+
+
+class TestBatchedCompletions(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient()
+        self.prompts = [f"{i}." for i in range(45)]
+
+    def complete(self, **kwargs):
+        return complete_batch(self.client, self.prompts, model="gpt-3.5-turbo-instruct", temperature=0.0, max_tokens=5, **kwargs)
+
+    def test_order(self):
+        texts = self.complete(max_prompts=20)
+        self.assertEqual(texts, [[f" {p}"] for p in self.prompts])
+        self.assertEqual([len(request) for request in self.client.completions.requests], [20, 20, 5])
+
+    def test_token_budget(self):
+        packs = pack_prompts(["x" * 400] * 5, "gpt-3.5-turbo-instruct", max_tokens=5, max_request_tokens=250)
+        self.assertTrue(all(len(pack) <= 2 for pack in packs))
+        self.assertEqual(sum(packs, []), list(range(5)))
+        self.assertEqual(pack_prompts(["x" * 4000], "gpt-3.5-turbo-instruct", max_tokens=5, max_request_tokens=250), [[0]])
+
+    def test_n(self):
+        texts = complete_batch(self.client, ["1.", "2."], model="gpt-3.5-turbo-instruct", temperature=1.0, max_tokens=5, n=3)
+        self.assertEqual(texts, [[" 1.#0", " 1.#1", " 1.#2"], [" 2.#0", " 2.#1", " 2.#2"]])
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            cache = LLMCache(os.path.join(dir_name, "cache.sqlite"))
+            self.prompts = self.prompts[:10]
+            self.complete(cache=cache)
+            self.prompts += ["10.", "11."]
+            texts = self.complete(cache=cache)
+            self.assertEqual(texts[-1], [" 11."])
+            self.assertEqual(self.client.completions.requests[-1], ["10.", "11."]) # only the new cells are sent
+            # entries of the batched run are those of a single-prompt request
+            single = cache.call(self.client, "completions", dict(model="gpt-3.5-turbo-instruct", prompt="3.",
+                                temperature=0.0, max_tokens=5), self.client.completions.create)
+            self.assertEqual(single.choices[0].text, " 3.")
+            self.assertEqual(len(self.client.completions.requests), 2)
+            cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import json
+import os
+import tempfile
+import unittest
+
+import chess
+
+from checkpoint import Checkpointer, save_checkpoint, load_checkpoint, is_finished, logged_sizes, restore_files, checkpoint_path, CHECKPOINT_FILE
+from game import ChessEngineConfig, GPTConfig, checkpoint_game, restore_transcript
+from game_logger import get_logger, close_logger, set_game_store
+from game_store import GameStore
+from tournament import make_jobs, job_directory, job_state
+from transcript import ChatTranscript
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.dir_name = os.path.join(self.dir.name, "game")
+        os.makedirs(self.dir_name)
+
+    def tearDown(self):
+        close_logger(self.dir_name)
+        set_game_store(None)
+        self.dir.cleanup()
+
+    def test_save_load(self):
+        self.assertIsNone(load_checkpoint(self.dir_name))
+        self.assertFalse(is_finished(self.dir_name))
+        save_checkpoint(self.dir_name, {"moves": ["e2e4"], "pgn": "1. e4", "n": 1, "finished": False}, new=True)
+        save_checkpoint(self.dir_name, {"moves": ["e7e5"], "pgn": " e5 2.", "n": 2})
+        save_checkpoint(self.dir_name, {"finished": True})
+        self.assertEqual(load_checkpoint(self.dir_name), {"moves": ["e2e4", "e7e5"], "pgn": "1. e4 e5 2.", "n": 2, "finished": True})
+        self.assertTrue(is_finished(self.dir_name))
+        self.assertEqual(os.listdir(self.dir_name), [CHECKPOINT_FILE])
+        save_checkpoint(self.dir_name, {"moves": [], "finished": False}, new=True) # the game starts over
+        self.assertEqual(load_checkpoint(self.dir_name), {"moves": [], "finished": False})
+
+    def test_checkpointer(self):
+        checkpointer = Checkpointer(self.dir_name)
+        checkpointer.save({"moves": ["e2e4"], "transcript": [{"role": "user", "content": "1."}], "n": 1, "finished": False})
+        checkpointer.save({"moves": ["e2e4", "e7e5"], "transcript": [{"role": "user", "content": "1."}], "n": 2, "finished": False})
+        with open(checkpoint_path(self.dir_name)) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(records[1], {"moves": ["e7e5"], "n": 2}) # only what changed
+        with open(checkpoint_path(self.dir_name), "a") as f: # cut by a crash
+            f.write('{"moves": ["g1f3"')
+        state = load_checkpoint(self.dir_name)
+        self.assertEqual(state["moves"], ["e2e4", "e7e5"])
+        checkpointer = Checkpointer(self.dir_name) # resumed: saves the whole state again, then what changed
+        checkpointer.save(state)
+        checkpointer.save(dict(state, moves=["e2e4", "e7e5", "g1f3"]))
+        with open(checkpoint_path(self.dir_name)) as f:
+            self.assertEqual([json.loads(line) for line in f], [state, {"moves": ["g1f3"]}])
+
+    def test_restore_files(self):
+        logger = get_logger(self.dir_name)
+        logger.log("1. e4")
+        sizes = logged_sizes(self.dir_name)
+        self.assertEqual(sizes, {"log.txt": len("1. e4\n")})
+        self.assertEqual(os.listdir(self.dir_name), []) # still buffered
+        save_checkpoint(self.dir_name, sizes, new=True)
+        logger.log("1... e5") # played after the checkpoint
+        logger.write("game.pgn", "1. e4 e5\n")
+        close_logger(self.dir_name)
+        self.assertEqual(restore_files(self.dir_name, sizes), {"log.txt"})
+        get_logger(self.dir_name).log("1... c5")
+        close_logger(self.dir_name)
+        with open(os.path.join(self.dir_name, "log.txt")) as f:
+            self.assertEqual(f.read(), "1. e4\n1... c5\n")
+        self.assertEqual(sorted(os.listdir(self.dir_name)), [CHECKPOINT_FILE, "log.txt"])
+
+    def test_restore_lost_files(self):
+        logger = get_logger(self.dir_name)
+        logger.write("metainformation.txt", "model_gpt: gpt-4o\n")
+        logger.flush()
+        logger.log("1. e4")
+        sizes = logged_sizes(self.dir_name) # the process is then killed: log.txt was never written
+        logger._buffers.clear()
+        close_logger(self.dir_name)
+        self.assertEqual(restore_files(self.dir_name, sizes), {"metainformation.txt"})
+
+    def test_store(self):
+        store = GameStore(os.path.join(self.dir.name, "games.sqlite"))
+        set_game_store(store)
+        dir_name = os.path.join(self.dir.name, "stored")
+        logger = get_logger(dir_name)
+        logger.write("metainformation.txt", "model_gpt: gpt-4o\n")
+        logger.log("1. e4")
+        save_checkpoint(dir_name, {"files": logged_sizes(dir_name), "finished": False}, new=True)
+        logger.log("1... e5")
+        close_logger(dir_name) # eg Ctrl-C: the game is stored as it is
+        self.assertFalse(os.path.exists(dir_name))
+        self.assertEqual(store.unfinished_games(), [dir_name])
+        state = load_checkpoint(dir_name)
+        self.assertEqual(restore_files(dir_name, state["files"]), {"log.txt"}) # metainformation.txt is written again
+        close_logger(dir_name)
+        self.assertEqual(store.game_files(dir_name)["log.txt"], "1. e4\n")
+        save_checkpoint(dir_name, {"files": {}, "finished": True})
+        self.assertEqual(store.unfinished_games(), [])
+        self.assertTrue(is_finished(dir_name))
+
+    def test_checkpoint_game(self):
+        board = chess.Board()
+        board.push_san("e4")
+        transcript = ChatTranscript("You are a chess player", "gpt-4o")
+        transcript.append("user", "1.")
+        transcript.add_move(board, "assistant")
+        checkpointer = Checkpointer(self.dir_name)
+        checkpoint_game(checkpointer, ChessEngineConfig(skill_level=3), GPTConfig(chat_gpt=True), "1.", 1, True,
+                        board, "1. e4", 1, "e4", transcript, False)
+        state = load_checkpoint(self.dir_name)
+        self.assertEqual(ChessEngineConfig(**state["chess_config"]), ChessEngineConfig(skill_level=3))
+        self.assertEqual(state["moves"], ["e2e4"])
+        self.assertEqual(state["fen"], board.fen())
+        self.assertFalse(state["llm_to_move"])
+        self.assertFalse(state["finished"])
+        restored = restore_transcript(state["transcript"], state["transcript_sans"], "gpt-4o")
+        self.assertEqual(restored.messages, transcript.messages)
+        self.assertEqual(restored.sans, ["e4"])
+        self.assertEqual(restored.size(), transcript.size())
+        board.push_san("e5")
+        transcript.add_move(board, "user")
+        checkpoint_game(checkpointer, ChessEngineConfig(skill_level=3), GPTConfig(chat_gpt=True), "1.", 1, True,
+                        board, "1. e4 e5 2.", 2, "e4", transcript, True)
+        self.assertEqual(load_checkpoint(self.dir_name)["transcript"], transcript.messages)
+        with open(checkpoint_path(self.dir_name)) as f:
+            record = json.loads(f.readlines()[-1])
+        self.assertEqual(record["transcript"], transcript.messages[-1:]) # only the new message
+        self.assertNotIn("chess_config", record)
+
+    def test_job_state(self):
+        dir_name = os.path.join(self.dir.name, "job")
+        self.assertIsNone(job_state(dir_name))
+        with open(os.path.join(dir_name, "log.txt"), "w") as f: # stopped before its first checkpoint
+            f.write("1. e4\n")
+        self.assertIsNone(job_state(dir_name))
+        self.assertEqual(os.listdir(dir_name), []) # starts over
+        with open(os.path.join(dir_name, "game.pgn"), "w") as f: # finished without checkpoints
+            f.write("1. e4 e5 *\n")
+        self.assertTrue(job_state(dir_name)["finished"])
+        self.assertEqual(os.listdir(dir_name), ["game.pgn"])
+
+    def test_job_directory(self):
+        jobs = make_jobs([ChessEngineConfig(skill_level=3)], [GPTConfig()], repetitions=2)
+        self.assertEqual(job_directory(jobs[0], "games"), job_directory(make_jobs([ChessEngineConfig(skill_level=3)], [GPTConfig()], repetitions=2)[0], "games"))
+        self.assertEqual(len({job_directory(job, "games") for job in jobs}), len(jobs))
+
+
+if __name__ == "__main__":
+    unittest.main()
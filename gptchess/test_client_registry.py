@@ -0,0 +1,42 @@
+import asyncio
+import os
+import unittest
+
+from client_registry import PoolConfig, get_client, get_async_client, close_async_clients, credentials
+
+
+class TestClientRegistry(unittest.TestCase):
+
+    def test_shared(self):
+        client = get_client("key", "http://127.0.0.1:8000/v1")
+        self.assertIs(get_client("key", "http://127.0.0.1:8000/v1"), client)
+        self.assertIsNot(get_client("key", "https://api.deepseek.com"), client)
+        self.assertIsNot(get_client("other key", "http://127.0.0.1:8000/v1"), client)
+        self.assertEqual(client.max_retries, 0) # retried by the request scheduler
+
+    def test_pool(self):
+        pool = PoolConfig(max_connections=4, max_keepalive_connections=2, timeout=30, connect_timeout=3)
+        client = get_client("key", "http://127.0.0.1:8000/v1", pool)
+        self.assertIsNot(client, get_client("key", "http://127.0.0.1:8000/v1"))
+        self.assertEqual((client.timeout.read, client.timeout.connect), (30, 3))
+        self.assertEqual(pool.limits().max_connections, 4)
+
+    def test_async(self):
+        async def clients():
+            first = get_async_client("key", "http://127.0.0.1:8000/v1")
+            second = get_async_client("key", "http://127.0.0.1:8000/v1")
+            await close_async_clients()
+            return first, second
+        first, second = asyncio.run(clients())
+        self.assertIs(first, second)
+        self.assertIsNot(asyncio.run(clients())[0], first) # one client per event loop
+
+    def test_credentials(self):
+        os.environ.pop("DEEPSEEK_API_KEY", None)
+        with self.assertRaises(ValueError):
+            credentials(use_deepseek=True)
+        self.assertEqual(credentials(base_url="http://127.0.0.1:8000/v1")[1], "http://127.0.0.1:8000/v1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from game_logger import GameLogger, get_logger, close_logger, DEBUG, INFO
+
+
+class TestGameLogger(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.dir_name = self.dir.name
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def read(self, file_name):
+        with open(os.path.join(self.dir_name, file_name)) as f:
+            return f.read()
+
+    def test_buffered_until_close(self):
+        logger = get_logger(self.dir_name)
+        logger.log("1. e4")
+        logger.session("1.", " e4")
+        self.assertFalse(os.path.exists(os.path.join(self.dir_name, "log.txt")))
+        close_logger(self.dir_name)
+        self.assertEqual(self.read("log.txt"), "1. e4\n")
+        self.assertEqual(self.read("session.txt"), "PROMPT: 1.\nRESPONSE:  e4\n\n")
+        self.assertIsNot(get_logger(self.dir_name), logger) # a new game in the same directory gets a new logger
+        close_logger(self.dir_name)
+
+    def test_levels(self):
+        logger = GameLogger(self.dir_name, level=INFO)
+        self.assertFalse(logger.is_enabled(DEBUG))
+        logger.log("board", DEBUG)
+        logger.log("1. e4")
+        logger.flush()
+        self.assertEqual(self.read("log.txt"), "1. e4\n")
+
+    def test_flush_interval(self):
+        logger = GameLogger(self.dir_name, flush_interval=0)
+        logger.log("1. e4")
+        self.assertEqual(self.read("log.txt"), "1. e4\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from game import ChessEngineConfig, GPTConfig, save_metainformation_experiment, setup_directory
+from game_logger import get_logger, close_logger, set_game_store
+from game_store import GameStore, parse_metainformation
+
+METAINFORMATION = """model_gpt: gpt-4o
+use_deepseek: False
+base_url: None
+skill_level: 3
+white_piece: True
+engine_time: None
+base_pgn: [Event "?"]
+[White "gpt-4o"]
+
+1.
+temperature: 0.0
+"""
+
+PGN = """[Event "gpt-4o vs Stockfish"]
+[Result "0-1"]
+[UnknownSAN "Qxh9"]
+
+1. e4 e5 2. Nf3 0-1
+"""
+
+
+class TestGameStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = GameStore(os.path.join(self.dir.name, "games.sqlite"))
+
+    def tearDown(self):
+        set_game_store(None)
+        self.store.close()
+        self.dir.cleanup()
+
+    def test_parse_metainformation(self):
+        values = parse_metainformation(METAINFORMATION)
+        self.assertEqual(values["model_gpt"], "gpt-4o")
+        self.assertEqual(values["use_deepseek"], 0)
+        self.assertIsNone(values["base_url"])
+        self.assertIsNone(values["engine_time"])
+        self.assertEqual(values["skill_level"], 3)
+        self.assertEqual(values["base_pgn"], '[Event "?"]\n[White "gpt-4o"]\n\n1.')
+        self.assertEqual(values["temperature"], 0.0)
+
+    def test_export_round_trip(self):
+        files = {"metainformation.txt": METAINFORMATION, "game.pgn": PGN, "log.txt": "1. e4\n"}
+        self.store.add_files("games_o3/game1234", files)
+        self.assertEqual(self.store.query("SELECT game_id, root, skill_level, result, unknown_san, nplies FROM games"),
+                         [("game1234", "games_o3", 3, "0-1", "Qxh9", 3)])
+        output_dir = os.path.join(self.dir.name, "exported")
+        self.assertEqual(self.store.export(output_dir, where="model_gpt = ?", params=("gpt-4o",)), 1)
+        for file_name, text in files.items():
+            with open(os.path.join(output_dir, "games_o3", "game1234", file_name)) as f:
+                self.assertEqual(f.read(), text)
+        self.assertFalse(os.path.exists(os.path.join(output_dir, "games_o3", "game1234", "session.txt")))
+
+    def test_same_name_in_two_roots(self):
+        self.store.add_files("run1/game-1234", {"log.txt": "1. e4\n"})
+        self.store.add_files("/data/run2/game-1234", {"log.txt": "1. d4\n"})
+        self.store.save_checkpoint("run1/game-1234", {"moves": ["e2e4"], "finished": False}, new=True)
+        self.store.save_checkpoint("/data/run2/game-1234", {"moves": ["d2d4"], "finished": False}, new=True)
+        self.store.save_checkpoint("run1/game-1234", {"moves": ["e7e5"], "finished": True})
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store.game_files("run1/game-1234"), {"log.txt": "1. e4\n"})
+        self.assertEqual(self.store.load_checkpoint("run1/game-1234"), [{"moves": ["e2e4"], "finished": False}, {"moves": ["e7e5"], "finished": True}])
+        self.assertEqual(self.store.unfinished_games(), ["/data/run2/game-1234"])
+        output_dir = os.path.join(self.dir.name, "exported")
+        self.store.export(output_dir)
+        with open(os.path.join(output_dir, "data", "run2", "game-1234", "log.txt")) as f:
+            self.assertEqual(f.read(), "1. d4\n")
+
+    def test_store_keyed_by_name_only(self):
+        path = os.path.join(self.dir.name, "old.sqlite")
+        with sqlite3.connect(path) as db: # a store from before the (root, game_id) key
+            db.execute("CREATE TABLE games (game_id TEXT PRIMARY KEY, root TEXT, created REAL, log TEXT)")
+            db.execute("INSERT INTO games VALUES ('game1234', 'games_o3', 0, '1. e4\n')")
+        store = GameStore(path)
+        store.add_files("games_o4/game1234", {"log.txt": "1. d4\n"})
+        self.assertEqual(store.game_files("games_o3/game1234"), {"log.txt": "1. e4\n"})
+        self.assertEqual(len(store), 2)
+        store.close()
+
+    def test_game_written_to_store(self):
+        set_game_store(self.store)
+        dir_name = setup_directory(os.path.join(self.dir.name, "games"))
+        self.assertFalse(os.path.exists(dir_name))
+        chess_config, gpt_config = ChessEngineConfig(skill_level=5), GPTConfig(model_gpt="gpt-4o", chat_gpt=True)
+        save_metainformation_experiment(dir_name, chess_config, gpt_config, "1.", 1, False, {"Threads": 1})
+        get_logger(dir_name).write("game.pgn", PGN)
+        get_logger(dir_name).log("1. e4")
+        close_logger(dir_name)
+        self.assertFalse(os.path.exists(dir_name))
+        [(skill_level, chat_gpt, white_piece, log, nplies)] = self.store.query(
+            "SELECT skill_level, chat_gpt, white_piece, log, nplies FROM games WHERE game_id = ?", (os.path.basename(dir_name),))
+        self.assertEqual((skill_level, chat_gpt, white_piece, log, nplies), (5, 1, 0, "1. e4\n", 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
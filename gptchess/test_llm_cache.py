@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+from openai.types import Completion
+
+from llm_cache import LLMCache, request_key
+
+
+def completion(text):
+    return Completion.model_validate({"id": "cmpl", "object": "text_completion", "created": 0, "model": "gpt-3.5-turbo-instruct",
+                                      "choices": [{"text": text, "index": 0, "finish_reason": "length"}]})
+
+
+class TestLLMCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = LLMCache(os.path.join(self.dir.name, "cache.sqlite"))
+        self.ncalls = 0
+
+    def tearDown(self):
+        self.cache.close()
+        self.dir.cleanup()
+
+    def create(self, **kwargs):
+        self.ncalls += 1
+        return completion(" e4")
+
+    def request(self, prompt="1.", temperature=0.0):
+        return dict(model="gpt-3.5-turbo-instruct", prompt=prompt, temperature=temperature, max_tokens=5)
+
+    def test_hit(self):
+        first = self.cache.call(None, "completions", self.request(), self.create)
+        second = self.cache.call(None, "completions", self.request(), self.create)
+        self.assertEqual(self.ncalls, 1)
+        self.assertEqual(second.choices[0].text, first.choices[0].text)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_not_deterministic(self):
+        self.cache.call(None, "completions", self.request(temperature=0.7), self.create)
+        self.cache.call(None, "completions", self.request(temperature=0.7), self.create)
+        self.assertEqual(self.ncalls, 2)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_key(self):
+        self.assertEqual(request_key("completions", self.request()), request_key("completions", self.request()))
+        self.assertNotEqual(request_key("completions", self.request()), request_key("completions", self.request("1. e4")))
+        self.assertNotEqual(request_key("completions", self.request()),
+                            request_key("completions", self.request(), base_url="https://api.deepseek.com"))
+
+    def test_eviction(self):
+        self.cache.max_bytes = 3 * len(completion(" e4").model_dump_json())
+        for i in range(10):
+            self.cache.call(None, "completions", self.request(f"{i}."), self.create)
+        self.assertLessEqual(len(self.cache), 3)
+        self.cache.call(None, "completions", self.request("9."), self.create) # most recent entry is kept
+        self.assertEqual(self.ncalls, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+
+from ponder import Ponderer
+
+
+# stand-in for the Stockfish wrapper: the top moves are the legal moves in UCI order, the best move is the first one
+class FakeEngine:
+
+    def __init__(self, depth=10):
+        self.depth = str(depth)
+        self.board = chess.Board()
+        self.searches = []
+        self.positions = []
+        self.release = None # when set, searches wait for it
+
+    def set_position(self, moves=None):
+        self.positions.append(list(moves or []))
+        self.board = chess.Board()
+        for uci in moves or []:
+            self.board.push_uci(uci)
+
+    def set_depth(self, depth):
+        self.depth = str(depth)
+
+    def get_top_moves(self, num_top_moves):
+        return [{"Move": uci} for uci in sorted(move.uci() for move in self.board.legal_moves)[:num_top_moves]]
+
+    def best_move(self):
+        self.searches.append(self.board.fen())
+        if self.release is not None:
+            self.release.wait()
+        return sorted(move.uci() for move in self.board.legal_moves)[0]
+
+
+class TestPonderer(unittest.TestCase):
+
+    def play(self, ponderer, board, uci):
+        ponderer.start(board)
+        board.push_uci(uci)
+        return ponderer.reply(board)
+
+    def test_hit(self):
+        engine = FakeEngine()
+        ponderer = Ponderer(engine, FakeEngine.best_move, ncandidates=2)
+        board = chess.Board()
+        board.push_uci("e2e4")
+        board.push_uci("e7e5")
+        ponderer.start(board)
+        ponderer._future.result() # both candidates searched
+        board.push_uci("a2a3") # first candidate
+        self.assertEqual(ponderer.reply(board), "a7a5")
+        self.assertEqual(ponderer.stats, {"hits": 1, "misses": 0})
+        self.assertEqual(engine.depth, "10")
+        self.assertEqual(engine.positions[:2], [["e2e4", "e7e5"], ["e2e4", "e7e5", "a2a3"]]) # with the history of the game
+        ponderer.close()
+
+    def test_executor(self):
+        executor = ThreadPoolExecutor(max_workers=2)
+        ponderer = Ponderer(FakeEngine(), FakeEngine.best_move, ncandidates=2, executor=executor)
+        board = chess.Board()
+        ponderer.start(board)
+        ponderer._future.result()
+        board.push_uci("a2a3")
+        self.assertEqual(ponderer.reply(board), "a7a5")
+        ponderer.close()
+        executor.submit(int).result() # still usable by the games
+        executor.shutdown()
+
+    def test_miss(self):
+        ponderer = Ponderer(FakeEngine(), FakeEngine.best_move, ncandidates=2)
+        board = chess.Board()
+        self.assertIsNone(self.play(ponderer, board, "e2e4"))
+        self.assertIsNone(ponderer.reply(board)) # nothing pondered
+        self.assertEqual(ponderer.stats, {"hits": 0, "misses": 1})
+        ponderer.close()
+
+    def test_waits_for_search_in_progress(self):
+        engine = FakeEngine()
+        engine.release = threading.Event()
+        ponderer = Ponderer(engine, FakeEngine.best_move, ncandidates=3)
+        board = chess.Board()
+        ponderer.start(board)
+        while not engine.searches: # the reply to the first candidate is being searched
+            time.sleep(0.01)
+        board.push_uci("a2a3")
+        threading.Timer(0.1, engine.release.set).start()
+        self.assertEqual(ponderer.reply(board), "a7a5")
+        ponderer.close()
+        self.assertEqual(len(engine.searches), 1) # the other candidates are not searched
+
+    def test_broken_engine(self):
+        def search(engine):
+            raise RuntimeError("engine died")
+        ponderer = Ponderer(FakeEngine(), search, ncandidates=1)
+        board = chess.Board()
+        self.assertIsNone(self.play(ponderer, board, "a2a3"))
+        ponderer.close()
+        self.assertTrue(ponderer.broken)
+        ponderer.start(board) # no more pondering
+        self.assertIsNone(ponderer._future)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+import chess
+
+from game import GPTConfig, BASE_PGN, BASE_PGN_BLACK
+from prompt_strategy import make_prompt_strategy, movetext, prompt_prefix
+from transcript import ChatTranscript
+
+
+class TestPromptStrategy(unittest.TestCase):
+
+    def play(self, sans):
+        board = chess.Board()
+        for san in sans:
+            board.push_san(san)
+        return board
+
+    def test_movetext(self):
+        self.assertEqual(movetext(["e4", "e5", "Nf3"]), "1. e4 e5 2. Nf3")
+        self.assertEqual(movetext(["e4", "e5"], compact=True), "1.e4 e5 2.")
+        self.assertEqual(movetext(["Nc6", "Bb5"], number=2, white_to_move=False), "2... Nc6 3. Bb5")
+
+    def test_prompt_prefix(self):
+        self.assertTrue(prompt_prefix(BASE_PGN).endswith('[Variant "Standard"]\n'))
+        self.assertEqual(prompt_prefix("Play chess.\n1."), "Play chess.\n")
+
+    def test_full(self):
+        board = self.play(["e4", "e5"])
+        strategy = make_prompt_strategy(GPTConfig(), BASE_PGN, board)
+        board.push_san("Nf3")
+        strategy.add_last_move(board)
+        self.assertEqual(strategy.sans, ["e4", "e5", "Nf3"])
+        self.assertEqual(strategy.build("1. e4 e5 2. Nf3", None, board), "1. e4 e5 2. Nf3")
+
+    def test_window(self):
+        board = self.play(["e4", "e5", "Nf3", "Nc6", "Bb5", "a6", "Ba4"])
+        strategy = make_prompt_strategy(GPTConfig(prompt_strategy="window", prompt_window=4), BASE_PGN_BLACK, board)
+        prompt = strategy.build(None, None, board)
+        self.assertIn('[FEN "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2"]', prompt)
+        self.assertTrue(prompt.endswith("\n2... Nc6 3. Bb5 a6 4. Ba4"))
+
+    def test_compressed_chat(self):
+        board = self.play(["e4", "e5"])
+        gpt_config = GPTConfig(chat_gpt=True, prompt_strategy="compressed")
+        strategy = make_prompt_strategy(gpt_config, BASE_PGN, board)
+        transcript = ChatTranscript("You are a chess player.")
+        transcript.append("user", "1.")
+        messages = strategy.build(None, transcript, board)
+        self.assertEqual(messages[-1], {"role": "user", "content": "Moves so far: 1.e4 e5 2."})
+        self.assertEqual(strategy.size(messages, transcript)[0], 3)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            make_prompt_strategy(GPTConfig(prompt_strategy="summary"), BASE_PGN, chess.Board())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import threading
+import unittest
+
+from openai import OpenAI
+
+from replay_server import Recordings, ReplayServer, parse_session, prompt_moves
+
+SESSION = """PROMPT: [White "Carlsen, Magnus"]
+
+1.
+RESPONSE: 1. e4
+
+This is the King's pawn.
+
+PROMPT: [White "Carlsen, Magnus"]
+
+1. e4 e5 2.
+RESPONSE: 2. Nf3
+
+"""
+
+
+class TestReplayServer(unittest.TestCase):
+
+    def test_parse_session(self):
+        entries = parse_session(SESSION)
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0], ('[White "Carlsen, Magnus"]\n\n1.', "1. e4\n\nThis is the King's pawn."))
+        self.assertEqual(entries[1][1], "2. Nf3")
+
+    def test_prompt_moves(self):
+        self.assertEqual(prompt_moves('[Event "Los Angeles"]\n\n1. e4 e5 2.'), ("e4", "e5"))
+        self.assertEqual(prompt_moves("Moves so far: 1.e4 e5 2.Nf3"), ("e4", "e5", "Nf3"))
+
+    def test_endpoints(self):
+        recordings = Recordings()
+        for prompt, response in parse_session(SESSION):
+            recordings.add(prompt, response)
+        server = ReplayServer(recordings, port=0, on_miss="error")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            client = OpenAI(api_key="none", base_url=server.base_url, max_retries=0)
+            completion = client.completions.create(model="gpt-3.5-turbo-instruct", prompt='[White "Carlsen, Magnus"]\n\n1.')
+            self.assertEqual(completion.choices[0].text, "1. e4\n\nThis is the King's pawn.")
+            # same position as a recorded prompt
+            chat = client.chat.completions.create(model="gpt-4o", messages=[
+                {"role": "system", "content": "You are a chess player."},
+                {"role": "user", "content": "1. e4"},
+                {"role": "assistant", "content": "1... e5"}])
+            self.assertEqual(chat.choices[0].message.content, "2. Nf3")
+            response = client.responses.create(model="o3", input=[{"role": "user", "content": "1. e4 e5 2."}])
+            self.assertEqual(response.output_text, "2. Nf3")
+            self.assertEqual(recordings.stats, {"prompt": 1, "moves": 2, "miss": 0})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from request_scheduler import (ProviderLimits, RequestScheduler, TokenBucket, estimate_tokens, provider_name,
+                               is_retryable, default_limits, get_scheduler, set_process_share)
+from transcript import count_tokens
+
+
+class APIStatusError(Exception):
+
+    def __init__(self, status_code, code=None, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.code = code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class FlakyEndpoint:
+
+    # fails with the errors of `errors` first, then answers
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.ncalls = 0
+
+    def create(self, **kwargs):
+        self.ncalls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(text="e4", usage=SimpleNamespace(total_tokens=7))
+
+    async def create_async(self, **kwargs):
+        return self.create(**kwargs)
+
+
+def limits(**kwargs):
+    return ProviderLimits(**dict(dict(max_retries=3, backoff_base=0.001, backoff_max=0.01), **kwargs))
+
+
+class TestRequestScheduler(unittest.TestCase):
+
+    def test_provider(self):
+        self.assertEqual(provider_name("https://api.openai.com/v1/"), "openai")
+        self.assertEqual(provider_name("https://api.deepseek.com"), "deepseek")
+        self.assertEqual(provider_name("http://127.0.0.1:8000/v1"), "127.0.0.1:8000")
+
+    def test_bucket(self):
+        bucket = TokenBucket(per_minute=60, capacity=2)
+        self.assertEqual(bucket.reserve(1), 0.0)
+        self.assertEqual(bucket.reserve(1), 0.0)
+        self.assertAlmostEqual(bucket.reserve(1), 1.0, places=1) # 1 per second
+        self.assertAlmostEqual(bucket.reserve(1), 2.0, places=1) # in order of arrival
+
+    def test_estimate(self):
+        prompt_tokens = count_tokens("1. e4 e5 2.", "gpt-3.5-turbo-instruct")
+        self.assertEqual(estimate_tokens(dict(model="gpt-3.5-turbo-instruct", prompt="1. e4 e5 2.", max_tokens=5)), prompt_tokens + 5)
+        self.assertEqual(estimate_tokens(dict(model="gpt-3.5-turbo-instruct", prompt=["1. e4 e5 2."] * 2, max_tokens=5, n=2)),
+                         2 * (prompt_tokens + 2 * 5))
+
+    def test_retry(self):
+        scheduler = RequestScheduler("test", limits())
+        endpoint = FlakyEndpoint([APIStatusError(429), APIStatusError(503)])
+        response = scheduler.call(endpoint.create, dict(prompt="1.", max_tokens=5))
+        self.assertEqual(response.text, "e4")
+        self.assertEqual(endpoint.ncalls, 3)
+        self.assertEqual((scheduler.stats["retries"], scheduler.stats["requests"], scheduler.stats["tokens"]), (2, 1, 7))
+        self.assertEqual(scheduler.stats["in_flight"], 0)
+
+    def test_give_up(self):
+        scheduler = RequestScheduler("test", limits())
+        for errors, ncalls in (([APIStatusError(400)], 1), ([APIStatusError(429, code="insufficient_quota")], 1),
+                               ([APIStatusError(500)] * 5, 4)):
+            endpoint = FlakyEndpoint(errors)
+            with self.assertRaises(APIStatusError):
+                scheduler.call(endpoint.create, dict(prompt="1.", max_tokens=5))
+            self.assertEqual(endpoint.ncalls, ncalls)
+        self.assertEqual(scheduler.stats["failures"], 3)
+        self.assertFalse(is_retryable(ValueError("not an API error")))
+
+    def test_refund_failed_request(self):
+        scheduler = RequestScheduler("test", limits(tokens_per_minute=1000))
+        with self.assertRaises(APIStatusError):
+            scheduler.call(FlakyEndpoint([APIStatusError(400)]).create, dict(prompt="1.", max_tokens=500))
+        self.assertAlmostEqual(scheduler.tokens.level, 1000, places=0)
+
+    def test_process_share(self):
+        set_process_share(4)
+        try:
+            self.assertEqual(default_limits("openai").requests_per_minute, 3500 / 4)
+            self.assertEqual(get_scheduler("https://api.openai.com/v1").limits.tokens_per_minute, 90000 / 4)
+        finally:
+            set_process_share(1)
+        self.assertEqual(get_scheduler("https://api.openai.com/v1").limits.tokens_per_minute, 90000)
+
+    def test_async(self):
+        scheduler = RequestScheduler("test", limits(requests_per_minute=6000))
+        endpoint = FlakyEndpoint([APIStatusError(429, headers={"retry-after-ms": "5"})])
+
+        async def run():
+            return await asyncio.gather(*(scheduler.call_async(endpoint.create_async, dict(prompt="1.", max_tokens=5))
+                                          for _ in range(5)))
+        self.assertEqual([response.text for response in asyncio.run(run())], ["e4"] * 5)
+        self.assertEqual(scheduler.stats["requests"], 5)
+        self.assertEqual(scheduler.stats["queued"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+import chess
+
+from transcript import ChatTranscript, move_str
+
+
+class TestTranscript(unittest.TestCase):
+
+    def play(self, sans):
+        board = chess.Board()
+        for san in sans:
+            board.push_san(san)
+        return board
+
+    def test_move_str(self):
+        board = self.play(["e4", "e5", "Nf3"])
+        self.assertEqual(move_str(board), ("Nf3", "2. Nf3"))
+        self.assertEqual(move_str(board, back=2), ("e5", "1... e5"))
+        self.assertEqual(len(board.move_stack), 3) # the board is left untouched
+
+    def test_incremental(self):
+        transcript = ChatTranscript("You are a chess player.")
+        transcript.append("user", "1.")
+        board = self.play(["e4", "e5"])
+        transcript.add_move(board, "assistant", back=2)
+        transcript.add_move(board, "user")
+        board.push_san("Nf3")
+        board.push_san("Nc6")
+        transcript.add_move(board, "assistant", back=2)
+        transcript.add_move(board, "user")
+
+        self.assertEqual([m["content"] for m in transcript.messages[1:]], ["1.", "1. e4", "1... e5", "2. Nf3", "2... Nc6"])
+        self.assertEqual([m["role"] for m in transcript.messages[2:]], ["assistant", "user", "assistant", "user"])
+        self.assertEqual(transcript.sans, ["e4", "e5", "Nf3", "Nc6"])
+
+    def test_size(self):
+        transcript = ChatTranscript(None)
+        transcript.append("user", "1. e4")
+        transcript.replace_last("user", "1. d4 d5")
+        nmessages, nchars, ntokens = transcript.size()
+        self.assertEqual((nmessages, nchars), (2, len("1. d4 d5")))
+        self.assertGreater(ntokens, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
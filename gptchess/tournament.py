@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+# Tournament runner: plays a whole matrix of games (engine configs x GPT configs x colors x openings)
+# on a bounded process pool instead of one game per `python gpt-experiments.py` invocation.
+# Games mostly wait on the API and on Stockfish, so several of them can share the machine.
+# Each job plays in a directory of its own (named after the job), with a checkpoint after every ply (see
+# checkpoint.py): running the same tournament again skips the games already finished and resumes the
+# interrupted ones from their last ply. With --store, the games and their checkpoints are rows of the store
+# (see game_store.py): no directory is created.
+#
+# eg  python3 tournament.py --workers 8 --repetitions 10
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+
+from game import ChessEngineConfig, GPTConfig, play_game, resume_game, OUTPUT_DIR, STOCKFISH_PATH, BASE_PGN, BASE_PGN_BLACK
+from checkpoint import load_checkpoint
+from engine_pool import EnginePool
+from game_store import use_game_store
+from request_scheduler import set_process_share
+from game_logger import get_game_store
+
+
+@dataclass
+class TournamentJob:
+    chess_config: ChessEngineConfig
+    gpt_config: GPTConfig
+    white_piece: bool
+    base_pgn: str
+    nmove: int = 1
+    repetition: int = 0
+
+
+# openings: list of (base_pgn, nmove) pairs; None means BASE_PGN/BASE_PGN_BLACK depending on the color
+def make_jobs(chess_configs, gpt_configs, colors=(True, False), openings=None, repetitions=1):
+    jobs = []
+    for chess_config, gpt_config, white_piece in itertools.product(chess_configs, gpt_configs, colors):
+        starts = openings if openings is not None else [(BASE_PGN if white_piece else BASE_PGN_BLACK, 1)]
+        for (base_pgn, nmove), repetition in itertools.product(starts, range(repetitions)):
+            jobs.append(TournamentJob(chess_config, gpt_config, white_piece, base_pgn, nmove, repetition))
+    return jobs
+
+
+# each worker process keeps its Stockfish running from one game to the next
+_engine_pool = None
+
+# store_path: SQLite game store the games are written to (see game_store.py), instead of game directories
+# engines: Stockfish processes per worker, 2 when games ponder (see ponder.py)
+# nworkers: number of workers, which share the API budgets of the providers (see request_scheduler.py)
+def init_worker(engine_path=STOCKFISH_PATH, store_path=None, engines=1, nworkers=1):
+    global _engine_pool
+    _engine_pool = EnginePool(size=engines, path=engine_path)
+    set_process_share(nworkers)
+    if store_path is not None:
+        use_game_store(store_path)
+
+
+# directory of the game of a job: the same job (configs, color, opening, repetition) always plays in the same one
+def job_directory(job: TournamentJob, output_dir=OUTPUT_DIR):
+    key = hashlib.sha1(json.dumps(asdict(job), sort_keys=True).encode()).hexdigest()[:16]
+    return os.path.join(output_dir, "game-" + key)
+
+# whether the game of dir_name was played to the end: game.pgn is written at the end of the game (see save_game)
+def has_game_pgn(dir_name):
+    store = get_game_store()
+    if store is not None:
+        return "game.pgn" in (store.game_files(dir_name) or {})
+    return os.path.exists(os.path.join(dir_name, "game.pgn"))
+
+# checkpoint of the game of dir_name, None if the game starts over (its directory is then created again, unless
+# the games go to a game store)
+def job_state(dir_name):
+    state = load_checkpoint(dir_name)
+    if state is not None:
+        return state
+    if has_game_pgn(dir_name): # a finished game without checkpoint (eg GAME_CHECKPOINTS=0) is not played again
+        return {"finished": True}
+    if get_game_store() is None:
+        shutil.rmtree(dir_name, ignore_errors=True) # a game stopped before its first checkpoint starts over
+        os.makedirs(dir_name)
+    return None
+
+# status of the result: "done", "resumed" (finished from a checkpoint), "skipped" (finished by a previous run)
+def run_job(job: TournamentJob, output_dir=OUTPUT_DIR):
+    start = time.monotonic()
+    dir_name = job_directory(job, output_dir)
+    state = job_state(dir_name)
+    if state is not None and state["finished"]:
+        return {"dir_name": dir_name, "duration": 0.0, "error": None, "status": "skipped"}
+    error = None
+    try:
+        if state is None:
+            play_game(job.chess_config, job.gpt_config, base_pgn=job.base_pgn, nmove=job.nmove,
+                      white_piece=job.white_piece, dir_name=dir_name, engine_pool=_engine_pool)
+        else:
+            resume_game(dir_name, engine_pool=_engine_pool)
+    except Exception as e: # one broken game should not take the whole tournament down
+        error = repr(e)
+    status = "done" if state is None else "resumed"
+    return {"dir_name": dir_name, "duration": time.monotonic() - start, "error": error, "status": status}
+
+
+def games_per_hour(ngames, elapsed):
+    return ngames * 3600 / elapsed if elapsed > 0 else 0.0
+
+
+def run_tournament(jobs, max_workers=4, output_dir=OUTPUT_DIR, engine_path=STOCKFISH_PATH, store_path=None):
+    results = []
+    start = time.monotonic()
+    engines = 2 if any(job.chess_config.ponder_moves > 0 for job in jobs) else 1
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(engine_path, store_path, engines, max_workers)) as pool:
+        futures = {pool.submit(run_job, job, output_dir): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            result = future.result()
+            result["job"] = job
+            results.append(result)
+            elapsed = time.monotonic() - start
+            nplayed = sum(1 for r in results if r["status"] != "skipped")
+            status = "error: " + result["error"] if result["error"] else result["status"]
+            print(f"[{len(results)}/{len(jobs)}] {job.gpt_config.model_gpt} vs skill {job.chess_config.skill_level} "
+                  f"({'white' if job.white_piece else 'black'}) {status} in {result['duration']:.1f}s "
+                  f"-- {games_per_hour(nplayed, elapsed):.1f} games/hour")
+
+    elapsed = time.monotonic() - start
+    nerrors = sum(1 for r in results if r["error"])
+    nplayed = sum(1 for r in results if r["status"] != "skipped")
+    print(f"Tournament complete: {nplayed} games ({nerrors} errors, {len(results) - nplayed} already finished) in {elapsed / 60:.1f} min, "
+          f"{games_per_hour(nplayed, elapsed):.1f} games/hour")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a matrix of GPT vs Stockfish games in parallel")
+    parser.add_argument("--workers", type=int, default=4, help="number of games played at the same time")
+    parser.add_argument("--repetitions", type=int, default=1, help="number of games per configuration")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--engine-path", default=STOCKFISH_PATH, help="Stockfish binary (default: $STOCKFISH_PATH)")
+    parser.add_argument("--store", default=None, help="SQLite game store to write the games to, instead of --output-dir")
+    parser.add_argument("--ponder", type=int, default=0, help="number of likely GPT moves whose engine replies are searched while GPT thinks")
+    args = parser.parse_args()
+
+    chess_configs = [ChessEngineConfig(skill_level=skill, engine_depth=15, engine_path=args.engine_path, ponder_moves=args.ponder)
+                     for skill in (1, 3, 5)]
+    gpt_configs = [GPTConfig(model_gpt="gpt-3.5-turbo-instruct", temperature=0.0, max_tokens=5)]
+
+    jobs = make_jobs(chess_configs, gpt_configs, repetitions=args.repetitions)
+    run_tournament(jobs, max_workers=args.workers, output_dir=args.output_dir, engine_path=args.engine_path,
+                   store_path=args.store)
@@ -0,0 +1,76 @@
+# Chat transcript of a game, built incrementally: each ply appends its new user/assistant message(s)
+# instead of rebuilding (and resending twice) the whole move list.
+# The SAN history and the size of the transcript (messages, characters, tokens) are kept up to date as
+# messages are appended, so that the size of every request can be logged for free.
+
+try:
+    import tiktoken
+except ImportError: # optional: tokens are estimated from the number of characters without it
+    tiktoken = None
+
+# per-message tokens added by the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encodings = {}
+
+def count_tokens(text, model=None):
+    if not text:
+        return 0
+    if tiktoken is None:
+        return max(1, len(text) // 4) # usual rule of thumb: ~4 characters per token
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except (KeyError, TypeError):
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return len(_encodings[model].encode(text))
+
+# SAN and PGN move number ('4. a6' for White, '4... a6' for Black) of the move played `back` plies ago
+def move_str(board, back=1):
+    moves = [board.pop() for _ in range(back)]
+    try:
+        move = moves[-1]
+        san = board.san(move)
+        move_number = len(board.move_stack) // 2 + 1
+        number = f"{move_number}." if board.turn else f"{move_number}..."
+    finally:
+        for move in reversed(moves):
+            board.push(move)
+    return san, f"{number} {san}"
+
+
+class ChatTranscript:
+
+    def __init__(self, system_role_message=None, model=None):
+        self.model = model
+        self.messages = []
+        self.sans = [] # SAN of the moves added to the transcript
+        self.n_chars = 0
+        self.n_tokens = 0
+        self.append("system", system_role_message)
+
+    def _count(self, content, sign=1):
+        self.n_chars += sign * len(content or "")
+        self.n_tokens += sign * (count_tokens(content, self.model) + MESSAGE_OVERHEAD_TOKENS)
+
+    def append(self, role, content):
+        self.messages.append({"role": role, "content": content})
+        self._count(content)
+
+    def replace_last(self, role, content):
+        self._count(self.messages[-1]["content"], -1)
+        self.messages[-1] = {"role": role, "content": content}
+        self._count(content)
+
+    # adds the move played `back` plies ago on `board`, eg '12... Nf6'
+    def add_move(self, board, role, back=1):
+        san, content = move_str(board, back)
+        self.sans.append(san)
+        self.append(role, content)
+
+    # (number of messages, characters, estimated tokens) of the transcript, ie of the next request
+    def size(self):
+        return len(self.messages), self.n_chars, self.n_tokens
+
+    def __len__(self):
+        return len(self.messages)
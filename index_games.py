@@ -0,0 +1,208 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+
+from analyze_games import CSV_COLUMNS as ANALYSIS_COLUMNS, parse_metainformation, parse_pgn, make_row
+from pgn_scanner import scan_pgn, mainline_str
+
+# Incremental version of the games_db.csv of analysis.ipynb and of the games_analysis.csv of analyze_games.py:
+# a manifest (games_index.json) keeps, for every game folder already indexed, the mtime and a hash of its
+# game.pgn and metainformation.txt; only folders that are new or whose files changed are parsed again, and
+# their rows are appended to (or replaced in) the two CSV files, so refreshing after a night of new games
+# only reads the new games.
+#
+# eg  python3 index_games.py games games_o3
+#     python3 index_games.py games --rebuild
+
+GAMES_ROOTS = ['games']
+DB_CSV = 'games_db.csv'
+ANALYSIS_CSV = 'games_analysis.csv'
+MANIFEST = 'games_index.json'
+
+GAME_FILES = ['game.pgn', 'metainformation.txt']
+
+# columns of games_db.csv (after the unnamed index column of DataFrame.to_csv)
+DB_COLUMNS = [
+    'white',
+    'black',
+    'white_elo',
+    'black_elo',
+    'result',
+    'nmoves',
+    'nstarting_move',
+    'pgn_base',
+    'temperature',
+    'random_engine',
+    'has_illegal',
+    'illegal_move',
+    'folder_name',
+    'pgn_base_moves',
+    'base_pgn_prompt'
+]
+
+# (latest mtime, content hash) of the files of a game folder; None if it is not a complete game
+def folder_mtime(folder):
+    try:
+        return max(os.stat(os.path.join(folder, name)).st_mtime_ns for name in GAME_FILES)
+    except FileNotFoundError:
+        return None
+
+def folder_hash(folder):
+    h = hashlib.sha1()
+    for name in GAME_FILES:
+        with open(os.path.join(folder, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def db_row(folder):
+    with open(os.path.join(folder, 'game.pgn')) as f:
+        pgn = f.read()
+    with open(os.path.join(folder, 'metainformation.txt')) as f:
+        content = f.read()
+    return db_row_text(folder, pgn, content)
+
+# same values as the loop of analysis.ipynb
+def db_row_text(folder, pgn, content):
+    game = scan_pgn(pgn)
+    headers = game['headers']
+
+    match_nmove = re.search(r'nmove:(.*)', content)
+    nmove_value = int(match_nmove.group(1).strip()) if match_nmove else 1
+    match_random = re.search(r'random_engine:([\s\S]+?)(\n)', content, re.MULTILINE)
+    random_engine = 'True' in match_random.group(1) if match_random else False
+    match_temperature = re.search(r'temperature:([\s\S]+?)(\n)', content, re.MULTILINE)
+    temperature = match_temperature.group(1).strip() if match_temperature else 0.0
+    match_base = re.search(r'base_pgn:([\s\S]+?)(^\w+:)', content, re.MULTILINE)
+    pgn_base = match_base.group(1).strip() if match_base else ''
+
+    base = scan_pgn(pgn_base) if pgn_base else None
+    pgn_base_moves = mainline_str(base) if base is not None else ''
+    base_pgn_prompt = base is not None and base['base_prompt']
+
+    return [
+        headers.get('White', '?'),
+        headers.get('Black', '?'),
+        headers.get('WhiteElo', '?'),
+        headers.get('BlackElo', '?'),
+        game['result'] or '*',
+        game['nplies'],
+        nmove_value,
+        pgn_base,
+        temperature,
+        random_engine,
+        game['unknown_san'] is not None,
+        game['unknown_san'] or '',
+        folder,
+        pgn_base_moves,
+        base_pgn_prompt
+    ]
+
+def analysis_row(folder):
+    gpt_model, reasoning_effort = parse_metainformation(os.path.join(folder, 'metainformation.txt'))
+    return make_row(os.path.basename(folder), gpt_model, reasoning_effort, parse_pgn(os.path.join(folder, 'game.pgn')))
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(path, manifest):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+def read_csv_rows(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='') as f:
+        return list(csv.reader(f))[1:]
+
+# rows: key -> row of every folder to (re)write; removed: keys of the rows that go away
+# New folders only: their rows are appended to the file. Otherwise the file is rewritten without the old rows.
+def update_csv(path, header, rows, removed, key, indexed=False):
+    if not rows and not removed:
+        return
+    existing = [row[1:] if indexed else row for row in read_csv_rows(path)]
+    if existing and not removed and not any(key(row) in rows for row in existing):
+        with open(path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            for i, row in enumerate(rows.values(), start=len(existing)):
+                writer.writerow([i] + row if indexed else row)
+        return
+    kept = [row for row in existing if key(row) not in rows and key(row) not in removed]
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([''] + header if indexed else header)
+        for i, row in enumerate(kept + list(rows.values())):
+            writer.writerow([i] + row if indexed else row)
+    os.replace(tmp_path, path)
+
+
+def scan(roots, manifest):
+    changed, unchanged, seen = [], 0, set()
+    for root in roots:
+        for entry in os.scandir(root):
+            if not entry.is_dir():
+                continue
+            folder = os.path.join(root, entry.name)
+            mtime = folder_mtime(folder)
+            if mtime is None:
+                continue
+            seen.add(folder)
+            known = manifest.get(folder)
+            if known is not None and known['mtime'] == mtime:
+                unchanged += 1
+                continue
+            digest = folder_hash(folder)
+            if known is not None and known['hash'] == digest: # copied or touched, same content
+                known['mtime'] = mtime
+                unchanged += 1
+                continue
+            changed.append((mtime, folder, digest))
+    changed.sort() # by date, as analysis.ipynb
+    removed = {folder for folder in manifest if folder not in seen and os.path.dirname(folder) in roots}
+    return changed, unchanged, removed
+
+def main():
+    parser = argparse.ArgumentParser(description='Update games_db.csv and games_analysis.csv with new or changed game folders')
+    parser.add_argument('roots', nargs='*', default=GAMES_ROOTS, help='game roots (folders of game folders)')
+    parser.add_argument('--db', default=DB_CSV)
+    parser.add_argument('--analysis', default=ANALYSIS_CSV)
+    parser.add_argument('--manifest', default=MANIFEST)
+    parser.add_argument('--rebuild', action='store_true', help='ignore the manifest and parse every folder again')
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    roots = [os.path.normpath(root) for root in args.roots]
+    manifest = {} if args.rebuild else load_manifest(args.manifest)
+    changed, unchanged, removed = scan(roots, manifest)
+
+    db_rows, analysis_rows, errors = {}, {}, 0
+    for mtime, folder, digest in changed:
+        try:
+            db_rows[folder], analysis_rows[os.path.basename(folder)] = db_row(folder), analysis_row(folder)
+        except Exception as e: # a broken folder is retried at the next run
+            errors += 1
+            print(f'{folder}: {e!r}')
+            continue
+        manifest[folder] = {'mtime': mtime, 'hash': digest}
+    for folder in removed:
+        del manifest[folder]
+
+    update_csv(args.db, DB_COLUMNS, db_rows, removed, key=lambda row: row[DB_COLUMNS.index('folder_name')], indexed=True)
+    update_csv(args.analysis, ANALYSIS_COLUMNS, analysis_rows, {os.path.basename(folder) for folder in removed},
+               key=lambda row: row[0])
+    save_manifest(args.manifest, manifest)
+    print(f'{len(db_rows)} new or changed games, {unchanged} unchanged, {len(removed)} removed, {errors} errors '
+          f'in {time.monotonic() - start:.1f}s. {args.db} and {args.analysis} updated')
+
+if __name__ == '__main__':
+    main()
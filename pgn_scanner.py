@@ -0,0 +1,92 @@
+import re
+
+import chess
+import chess.pgn
+
+# Single pass over the text of a PGN, for statistics: headers (including the UnknownSAN header written by
+# play_game), SAN moves of the mainline, number of plies and result, without python-chess building the game
+# tree and replaying every move on a board. The board is only replayed when legality matters (replay).
+#
+#   summary = scan_pgn(text)
+#   summary['nplies'], summary['result'], summary['unknown_san'], summary['base_prompt']
+
+# the tokenizers of python-chess, so that both read the same moves
+TAG_REGEX = chess.pgn.TAG_REGEX
+MOVETEXT_REGEX = chess.pgn.MOVETEXT_REGEX
+COMMENT = re.compile(r'\{[^}]*\}?')
+
+# headers of the base PGN given to the models in most experiments
+BASE_PROMPT_HEADERS = {'Event': 'FIDE World Championship Match 2024', 'Site': 'Los Angeles, USA'}
+
+def is_base_prompt(headers):
+    return all(headers.get(name) == value for name, value in BASE_PROMPT_HEADERS.items())
+
+# headers, mainline SAN moves (variations, comments and NAGs are skipped), number of plies, result, UnknownSAN
+# header and base-prompt fingerprint of the first game of `text`
+def scan_pgn(text):
+    headers = {}
+    movetext = []
+    for line in text.splitlines():
+        if line.startswith('%'): # escaped line
+            continue
+        if not movetext:
+            match = TAG_REGEX.match(line)
+            if match:
+                headers[match.group(1)] = match.group(2)
+                continue
+            if not line.strip() or line.startswith('['):
+                continue
+        elif line.startswith('['):
+            break # next game
+        movetext.append(line)
+
+    sans = []
+    termination = None
+    depth = 0
+    for match in MOVETEXT_REGEX.finditer(COMMENT.sub(' ', '\n'.join(movetext))):
+        token = match.group(0)
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth = max(0, depth - 1)
+        elif depth:
+            continue
+        elif match.group(1):
+            sans.append(token)
+        elif match.group(7):
+            termination = token
+            break
+
+    return {
+        'headers': headers,
+        'sans': sans,
+        'nplies': len(sans),
+        'result': headers.get('Result', termination),
+        'unknown_san': headers.get('UnknownSAN'),
+        'base_prompt': is_base_prompt(headers),
+    }
+
+def start_board(headers):
+    return chess.Board(headers['FEN']) if 'FEN' in headers else chess.Board()
+
+# legal moves of the mainline; as python-chess, the moves after an illegal one are dropped
+def legal_moves(summary):
+    board = start_board(summary['headers'])
+    moves = []
+    for san in summary['sans']:
+        try:
+            moves.append(board.push_san(san))
+        except ValueError:
+            break
+    return moves
+
+# mainline as str(game.mainline_moves()) gives it (without comments and NAGs), eg '1. e4 e5 2. Nf3'
+def mainline_str(summary):
+    return start_board(summary['headers']).variation_san(legal_moves(summary))
+
+# board after the mainline; raises ValueError (chess.IllegalMoveError, ...) at the first illegal move
+def replay(summary):
+    board = start_board(summary['headers'])
+    for san in summary['sans']:
+        board.push_san(san)
+    return board